@@ -0,0 +1,133 @@
+"""
+Stock-risk analytics for every SKU, worked out in NumPy from the cleaned
+extract instead of in the workbook's formulas.
+
+    python3 read_file.py --exceptions
+
+analyze works out, for the whole extract at once and with the reporting
+week and weeks in month from the fiscal calendar:
+
+    Trending 2 Month RR        the datasheet's formula, monthly units
+    Average Prev 2 Month RR    the two full months before this one
+    Trend                      Trending against Average, 0.25 is 25% up
+    Weeks of Cover             WEEKS OH+OO, Units Avail + On Order over the
+                               run rate in weeks. A SKU that isn't selling
+                               has no end to its cover instead of 0
+    Stockout Risk              selling, with under STOCKOUT_WEEKS of cover
+    Overstock                  holding stock with over OVERSTOCK_WEEKS of
+                               cover, dead stock included
+
+On the first day of a fiscal month nothing has sold yet, so last month's
+units are the run rate (the datasheet shows #DIV/0! then). SKUs with text
+in the columns cover is worked out from aren't flagged, and without a
+Unit Cost a flagged SKU has no $ At Risk and is ranked last.
+
+exceptions ranks the flagged SKUs by the dollars involved: the sales the
+cover falls short of STOCKOUT_WEEKS by, or the cost of the stock beyond
+OVERSTOCK_WEEKS. They are written to "A764Y 10-12-2025 exceptions.csv"
+next to the workbook. STOCKOUT_WEEKS and OVERSTOCK_WEEKS can be set in the
+.env.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import read_file
+from report_spec import plan
+
+DEFAULT_STOCKOUT_WEEKS = 4
+DEFAULT_OVERSTOCK_WEEKS = 26
+
+# the datasheet turns a monthly run rate into weeks by multiplying by 4
+WEEKS_PER_MONTH = 4
+
+STOCKOUT = "Stockout risk"
+OVERSTOCK = "Overstock"
+
+
+def stockout_weeks():
+    return float(os.getenv("STOCKOUT_WEEKS", DEFAULT_STOCKOUT_WEEKS))
+
+
+def overstock_weeks():
+    return float(os.getenv("OVERSTOCK_WEEKS", DEFAULT_OVERSTOCK_WEEKS))
+
+
+def _numbers(values):
+    """A column as float64, NaN where it holds text or a blank."""
+    if values.dtype.kind in "iuf":
+        return values.to_numpy(dtype=np.float64)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def analyze(df, calendar):
+    """Run rates, cover and flags for every SKU in df (clean_spreadsheet's output), one row each."""
+    # the report spec's columns, by id
+    report = plan()
+    column = lambda id: df.iloc[:, report.position(id)]  # noqa: E731
+    number = lambda id: _numbers(column(id))  # noqa: E731
+    avail, on_order, cost = number("units_avail"), number("units_on_order"), number("unit_cost")
+    mtd, last_month, month_before = number("mtd_units"), number("month_1"), number("month_2")
+
+    reporting_week = calendar.get_reporting_week()
+    if reporting_week:
+        run_rate = ((mtd / reporting_week) * calendar.get_weeks_in_month() + last_month) / 2
+    else:
+        run_rate = last_month
+    average = (last_month + month_before) / 2
+    stock = avail + on_order
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where(average > 0, run_rate / average - 1, np.nan)
+        weekly = run_rate / WEEKS_PER_MONTH
+        cover = np.where(run_rate > 0, stock / weekly, np.inf)
+    known = ~np.isnan(stock + run_rate)
+    cover[~known] = np.nan
+
+    stockout = known & (run_rate > 0) & (cover < stockout_weeks())
+    overstock = known & (stock > 0) & (cover > overstock_weeks())
+    dollars = np.where(stockout, (stockout_weeks() * weekly - stock) * cost, 0.0)
+    dollars = np.where(overstock, (stock - overstock_weeks() * np.maximum(weekly, 0)) * cost, dollars)
+
+    return pd.DataFrame({
+        # the text columns' own arrays, turning Arrow strings into objects costs more than everything else here
+        "IM SKU#": column("sku").array,
+        "Product Description": column("description").array,
+        "Units Avail": avail,
+        "Units on Order": on_order,
+        "Unit Cost": cost,
+        "Trending 2 Month RR": run_rate,
+        "Average Prev 2 Month RR": average,
+        "Trend": trend,
+        "Weeks of Cover": cover,
+        "Stockout Risk": stockout,
+        "Overstock": overstock,
+        "$ At Risk": dollars,
+    })
+
+
+def exceptions(analysis):
+    """The flagged rows of analyze's table, largest $ At Risk first, with their rank and exception."""
+    stockout = analysis["Stockout Risk"].to_numpy()
+    flagged = np.flatnonzero(stockout | analysis["Overstock"].to_numpy())
+    # NaN, no Unit Cost, sorts last
+    order = flagged[np.argsort(-analysis["$ At Risk"].to_numpy()[flagged], kind="stable")]
+    ranked = analysis.drop(columns=["Stockout Risk", "Overstock"]).take(order).reset_index(drop=True)
+    ranked.insert(0, "Exception", pd.Categorical.from_codes(np.where(stockout[order], 0, 1), [STOCKOUT, OVERSTOCK]))
+    ranked.insert(0, "Rank", np.arange(1, len(ranked) + 1))
+    return ranked
+
+
+def exceptions_path(name=None):
+    return read_file.output_filename(name).replace(".xlsx", " exceptions.csv")
+
+
+def write_exceptions(df, name=None):
+    """Writes the ranked exceptions for df to their CSV file. Returns the ranked table."""
+    ranked = exceptions(analyze(df, read_file.cal))
+    path = exceptions_path(name)
+    ranked.to_csv(path, index=False)
+    stockouts = int((ranked["Exception"] == STOCKOUT).sum())
+    print(f"Wrote {len(ranked):,} exceptions ({stockouts:,} stockout risk, {len(ranked) - stockouts:,} overstock) to {path}")
+    return ranked
@@ -0,0 +1,112 @@
+"""
+Batch mode: builds many customer datasheets in parallel.
+
+The manifest is a JSON list with one job per datasheet:
+
+    [
+        {"raw_file": "A764Y.TXT", "name": "UAG"},
+        {"raw_file": "B112K.TXT", "name": "TAMCO", "logos": {"A1": "Logos/TAMCO.png", "A7": "Logos/Ingram Micro.png"}}
+    ]
+
+Raw files are relative to the manifest, logos and the finished datasheets
+are relative to the program folder like a normal run. "logos" is optional
+and defaults to read_file.LOGOS. The fiscal calendar and
+report date are set up once in the parent and handed to every worker, and a
+job that fails is reported without stopping the others.
+
+    python3 read_file.py --batch manifest.json [--workers N]
+"""
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import read_file
+from parse_cache import cached_clean_spreadsheet
+
+
+def load_manifest(path):
+    with open(path, "r") as file:
+        jobs = json.load(file)
+
+    for number, job in enumerate(jobs, start=1):
+        if "raw_file" not in job or "name" not in job:
+            raise ValueError(f"Job {number} in {path} needs a raw_file and a name")
+    return jobs
+
+
+def load_jobs(manifest_path):
+    """The manifest's jobs with raw files relative to the manifest made absolute."""
+    manifest_path = os.path.abspath(manifest_path)
+    jobs = load_manifest(manifest_path)
+    for job in jobs:
+        job["raw_file"] = os.path.join(os.path.dirname(manifest_path), job["raw_file"])
+    return jobs
+
+
+def init_worker(calendar):
+    # the calendar was built once in the parent, workers just take a copy
+    read_file.cal = calendar
+
+
+def run_job(job, use_cache=True, metrics="formulas", formats=("xlsx",), ingest=False):
+    """Builds one datasheet, adding it to the history with ingest. Returns a result dict instead of raising."""
+    result = {"name": job["name"], "raw_file": job["raw_file"], "ok": False, "error": None, "rows": 0, "times": {}}
+    try:
+        start = time.perf_counter()
+        # jobs already run side by side, each one parses in its own process
+        df = cached_clean_spreadsheet(job["raw_file"], use_cache, workers=1)
+        result["times"]["parse"] = time.perf_counter() - start
+
+        if ingest:
+            from history import ingest as add_to_history
+            add_to_history(df, job["name"], read_file.cal, job["raw_file"])
+
+        start = time.perf_counter()
+        if "xlsx" in formats:
+            read_file.write_equations(df, job["name"], job.get("logos", read_file.LOGOS), metrics)
+        exports = [output_format for output_format in formats if output_format != "xlsx"]
+        if exports:
+            from export import export, export_path
+            export(df, job["name"], exports)
+        result["times"]["write"] = time.perf_counter() - start
+
+        result["rows"] = len(df)
+        result["output"] = read_file.output_filename(job["name"]) if "xlsx" in formats else export_path(job["name"], exports[0])
+        result["ok"] = True
+    except Exception:
+        result["error"] = traceback.format_exc()
+    return result
+
+
+def print_report(results, elapsed):
+    print(f"\n{'Name':<20}{'Rows':>10}{'Parse':>9}{'Write':>9}  Status")
+    for result in results:
+        times = [f"{result['times'].get(stage, 0):>8.2f}s" for stage in ("parse", "write")]
+        status = result["output"] if result["ok"] else "FAILED"
+        print(f"{result['name']:<20}{result['rows']:>10,}{''.join(times)}  {status}")
+
+    failed = [result for result in results if not result["ok"]]
+    for result in failed:
+        print(f"\n{result['name']} ({result['raw_file']}) failed:\n{result['error']}")
+
+    print(f"{len(results) - len(failed)} of {len(results)} datasheets built in {elapsed:.2f}s")
+
+
+def run_batch(manifest_path, workers=None, use_cache=True, metrics="formulas", formats=("xlsx",), ingest=False):
+    jobs = load_jobs(manifest_path)
+    read_file.load_environment()
+
+    print(f"Building {len(jobs)} datasheets")
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(read_file.cal,)) as pool:
+        futures = {pool.submit(run_job, job, use_cache, metrics, formats, ingest): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            print(f"{'Finished' if result['ok'] else 'Failed'}: {result['name']}")
+
+    print_report(results, time.perf_counter() - start)
+    return results
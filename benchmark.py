@@ -0,0 +1,65 @@
+"""
+Benchmarks on synthetic raw extracts, each one lives in the benchmarks
+package next to this file.
+
+    python3 benchmark.py [rows]                   parser (benchmarks/parsing.py)
+    python3 benchmark.py --tokens [count]         numeric tokens (benchmarks/tokens.py)
+    python3 benchmark.py --write [rows]           filling the datasheet (benchmarks/writing.py)
+    python3 benchmark.py --suite [--sizes 1k,10k,100k,1m] [--save-baseline]
+                                                  parse, clean and write against a baseline (benchmarks/suite.py)
+    python3 benchmark.py --startup [rows]         imports and cold small runs (benchmarks/startup.py)
+    python3 benchmark.py --validate [rows]        validate's checks (benchmarks/validation.py)
+    python3 benchmark.py --analytics [rows]       the exceptions' analytics (benchmarks/stock_risk.py)
+
+Only the benchmark that runs is imported.
+"""
+import argparse
+
+from synthetic import parse_rows
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_SIZES = "1k,10k,100k"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks on synthetic raw extracts.")
+    parser.add_argument("rows", nargs="?", type=parse_rows, help="synthetic rows for the parser or --write benchmark")
+    parser.add_argument("--write", action="store_true", help="time filling the datasheet instead of parsing")
+    parser.add_argument("--tokens", action="store_true", help="time converting numeric tokens instead of parsing")
+    parser.add_argument("--startup", action="store_true",
+                        help="check nothing heavy loads before the menu and time small cold runs")
+    parser.add_argument("--validate", action="store_true", help="time validate's checks against parsing")
+    parser.add_argument("--analytics", action="store_true", help="time the stock-risk analytics on a million SKUs")
+    parser.add_argument("--suite", action="store_true", help="time parse, clean and write against the baseline")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated sizes for --suite (default {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=1, help="with --suite, --startup, --validate or --analytics, keep the best of this many runs")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file for --suite")
+    parser.add_argument("--save-baseline", action="store_true", help="with --suite, store these results as the baseline")
+    args = parser.parse_args()
+
+    if args.suite:
+        from benchmarks.suite import benchmark_suite
+        sizes = [parse_rows(size) for size in args.sizes.split(",")]
+        benchmark_suite(sizes, args.baseline, args.repeat, args.save_baseline)
+    elif args.startup:
+        from benchmarks.startup import benchmark_startup
+        benchmark_startup(args.rows or 1000, args.repeat)
+    elif args.analytics:
+        from benchmarks.stock_risk import benchmark_analytics
+        benchmark_analytics(args.rows or 1000000, args.repeat)
+    elif args.validate:
+        from benchmarks.validation import benchmark_validate
+        benchmark_validate(args.rows or 100000, args.repeat)
+    elif args.write:
+        from benchmarks.writing import benchmark_write
+        benchmark_write(args.rows or 500000)
+    elif args.tokens:
+        from benchmarks.tokens import benchmark_tokens
+        benchmark_tokens(args.rows or 1000000)
+    else:
+        from benchmarks.parsing import benchmark_parse
+        benchmark_parse(args.rows or 100000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmarks on synthetic raw extracts, one module per part of the program:
+
+    parsing      the columnar engine against parse_line_by_format
+    tokens       numeric token conversion, one at a time and by column
+    writing      filling the datasheet, to_excel against column_writer
+    suite        parse, clean and write at several sizes against a baseline
+    startup      imports before the menu and cold small-extract runs
+    validation   validate's checks against parsing
+    stock_risk   the exceptions' analytics on a million SKUs
+
+benchmark.py runs them from the command line. The helpers here time a
+call and keep the generated extracts, so every benchmark measures the
+same way.
+"""
+import gc
+import os
+import time
+
+from synthetic import write_synthetic_file
+
+# generated extracts are kept here so the suite doesn't rebuild them every run
+DATA_DIR = "benchmark_data"
+
+
+def timed(func, *args):
+    """func's result and the seconds it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def best_of(repeat, func, *args):
+    """timed for the quickest of repeat calls."""
+    return min((timed(func, *args) for _ in range(max(repeat, 1))), key=lambda result: result[1])
+
+
+def without_gc(func, *args):
+    """timed with the garbage collector kept from landing in the timing, like timeit."""
+    gc.collect()
+    gc.disable()
+    try:
+        return timed(func, *args)
+    finally:
+        gc.enable()
+
+
+def rate_line(label, count, seconds, unit="rows", width=22):
+    """One line of a benchmark's output: label, count per second and the seconds."""
+    return f"{label:<{width}}{count / seconds:>12,.0f} {unit}/s ({seconds:.3f}s)"
+
+
+def use_calendar_date():
+    # the month headers come from the report date, any date inside the default fiscal calendar will do
+    import read_file
+    read_file.cal.set_report_date(read_file.cal.FISCAL_PERIODS[-2][0].strftime("%m/%d/%Y"))
+
+
+def synthetic_file(rows):
+    """Path of a generated extract with rows lines, written the first time it is asked for."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(DATA_DIR, f"synthetic-{rows}.TXT"))
+    if not os.path.exists(path):
+        print(f"Generating {rows:,} synthetic rows")
+        write_synthetic_file(f"{path}.tmp", rows)
+        os.replace(f"{path}.tmp", path)
+    return path
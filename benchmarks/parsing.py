@@ -0,0 +1,38 @@
+"""
+Compares the columnar parse engine, single process, on the report spec's
+fields only and split across every core, against the line-by-line parser
+on a synthetic extract. Checks all of them produce the same DataFrame, then
+prints rows/second for each. tests/test_columnar_parse.py runs the same
+checks without the timings.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks import rate_line, timed
+from columnar_parse import parse_file, parse_file_parallel
+from read_file import read_rows
+from report_spec import plan
+from synthetic import write_synthetic_file
+
+
+def benchmark_parse(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.TXT")
+        write_synthetic_file(path, rows)
+
+        legacy, legacy_time = timed(read_rows, path)
+        columnar, columnar_time = timed(lambda path: parse_file(path, workers=1), path)
+        fields = plan().fields
+        kept, kept_time = timed(lambda path: parse_file(path, workers=1, keep=fields), path)
+        workers = os.cpu_count() or 1
+        parallel, parallel_time = timed(lambda path: parse_file_parallel(path, workers=workers), path)
+
+    pd.testing.assert_frame_equal(legacy, columnar)
+    pd.testing.assert_frame_equal(legacy[fields], kept)
+    pd.testing.assert_frame_equal(legacy, parallel)
+    print(f"Parsed {rows} rows, outputs match")
+    for label, seconds in [("parse_line_by_format:", legacy_time), ("columnar_parse:", columnar_time),
+                           (f"spec's {len(fields)} fields:", kept_time), (f"{workers} workers:", parallel_time)]:
+        print(rate_line(label, rows, seconds))
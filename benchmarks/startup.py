@@ -0,0 +1,82 @@
+"""
+Checks what a run loads before the menu: importing read_file must not pull
+in any of HEAVY_MODULES, and its slowest imports are listed from
+python -X importtime. Then times fresh interpreters building a small
+synthetic extract all the way to the saved workbook, once through
+small_extract and once through pandas. Exits with an error if a heavy
+module is loaded at startup.
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic_file
+
+# the program's modules sit one folder up
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules importing read_file must leave for later, the menu waits on everything it imports
+HEAVY_MODULES = ["pandas", "numpy", "xlsxwriter", "pyarrow", "dotenv"]
+IMPORT_TIME = re.compile(r"import time:\s+\d+ \|\s+(?P<cumulative>\d+) \| (?P<name>.+)")
+
+# a one-shot run after the menu, from a fresh interpreter: python -c COLD_BUILD RAW_PATH small|pandas
+COLD_BUILD = """
+import sys
+import read_file
+read_file.cal.set_report_date(read_file.cal.FISCAL_PERIODS[-2][0].strftime("%m/%d/%Y"))
+if sys.argv[2] == "small":
+    from small_extract import build_small
+    assert build_small(sys.argv[1], "Benchmark", logos={})
+else:
+    from history import ingest
+    from parse_cache import cached_clean_spreadsheet
+    df = cached_clean_spreadsheet(sys.argv[1], use_cache=False, workers=1)
+    ingest(df, "Benchmark", read_file.cal, sys.argv[1])
+    read_file.write_equations(df, "Benchmark", logos={})
+"""
+
+
+def import_times(module):
+    """Cumulative microseconds of every import python -X importtime sees when a fresh interpreter imports module."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, check=True, cwd=ROOT)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.fullmatch(line)
+        if match:
+            times[match["name"].strip()] = int(match["cumulative"])
+    return times
+
+
+def cold_build(path, engine):
+    """Seconds from starting a fresh interpreter to the saved workbook."""
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    with tempfile.TemporaryDirectory() as tmp:
+        # a history of its own, so the extract is ingested on every run
+        env["HISTORY_DB"] = os.path.join(tmp, "history.db")
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", COLD_BUILD, path, engine], cwd=tmp, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start
+
+
+def benchmark_startup(rows, repeat=1):
+    times = import_times("read_file")
+    print(f"import read_file: {times['read_file'] / 1000:.0f} ms, slowest imports:")
+    slowest = sorted((name for name in times if name != "read_file"), key=times.get, reverse=True)[:10]
+    for name in slowest:
+        print(f"  {name:<30}{times[name] / 1000:>8.1f} ms")
+
+    path = synthetic_file(rows)
+    print(f"\nFresh interpreter to saved workbook, {rows:,} rows, best of {repeat}")
+    for label, engine in [("small_extract:", "small"), ("pandas:", "pandas")]:
+        seconds = min(cold_build(path, engine) for _ in range(repeat))
+        print(f"{label:<30}{seconds:>8.2f}s")
+
+    loaded = [module for module in HEAVY_MODULES if module in times]
+    if loaded:
+        print(f"\nimport read_file loads {', '.join(loaded)} before the menu, import them where they're used")
+        sys.exit(1)
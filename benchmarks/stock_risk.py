@@ -0,0 +1,59 @@
+"""
+Times analytics' run rates, cover, flags and ranked exceptions on a
+cleaned extract of rows SKUs made straight from random numbers, then
+writing the exceptions CSV.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import read_file
+from analytics import analyze, exceptions
+from benchmarks import rate_line, timed, use_calendar_date
+from report_spec import plan
+
+
+def synthetic_clean(rows, seed=0):
+    """
+    clean_spreadsheet's columns for rows SKUs drawn at random, parsing a
+    million synthetic lines would take far longer than what is timed.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for index, dtype in enumerate(plan().dtypes):
+        if dtype == "int32":
+            columns[index] = rng.integers(-100, 900, rows, dtype=np.int32)
+        elif dtype == "float64":
+            columns[index] = rng.uniform(0, 5000, rows).round(2)
+        elif dtype == "category":
+            columns[index] = pd.Categorical(rng.choice(["A", "B", "CO"], rows))
+        else:
+            columns[index] = pd.Series(rng.integers(0, 999999, rows)).astype(str).str.zfill(read_file.ID_LENGTH).astype("str")
+    return pd.DataFrame(columns)
+
+
+def benchmark_analytics(rows, repeat=1):
+    df = synthetic_clean(rows)
+    use_calendar_date()
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analysis = analyze(df, read_file.cal)
+        analyzed = time.perf_counter()
+        ranked = exceptions(analysis)
+        end = time.perf_counter()
+        if best is None or end - start < best[1] + best[2]:
+            best = (ranked, analyzed - start, end - analyzed)
+
+    ranked, analyze_time, rank_time = best
+    with tempfile.TemporaryDirectory() as tmp:
+        _, write_time = timed(lambda path: ranked.to_csv(path, index=False), os.path.join(tmp, "exceptions.csv"))
+
+    print(f"{rows:,} SKUs, {len(ranked):,} exceptions, best of {repeat}")
+    for label, elapsed in [("analyze:", analyze_time), ("exceptions:", rank_time),
+                           ("total:", analyze_time + rank_time), ("write CSV:", write_time)]:
+        print(rate_line(label, rows, elapsed, unit="SKUs", width=14))
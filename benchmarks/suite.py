@@ -0,0 +1,94 @@
+"""
+Runs parse, clean and the full datasheet write on synthetic extracts of
+each size (kept in benchmark_data/) and compares rows/second per stage with
+a stored baseline. Stages more than TOLERANCE slower (and long enough to
+measure) are flagged and the run exits with an error. Saving stores the
+results as the new baseline.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import profiler
+import read_file
+from benchmarks import synthetic_file, use_calendar_date
+from parse_cache import cached_clean_spreadsheet
+
+# a stage is flagged once its rows/s drops this far below the baseline
+TOLERANCE = 0.15
+# stages quicker than this are too noisy to flag
+MIN_SECONDS = 0.05
+
+
+def time_pipeline(path, output_dir):
+    """Parses, cleans and writes the datasheet for path the way run_script does. Returns seconds per stage."""
+    profiler.start()
+    df = cached_clean_spreadsheet(path, use_cache=False, workers=1)
+    cwd = os.getcwd()
+    os.chdir(output_dir)
+    try:
+        read_file.write_equations(df, "Benchmark", logos={})
+    finally:
+        os.chdir(cwd)
+
+    seconds = {stage["name"]: stage["seconds"] for stage in profiler.summary()["stages"]}
+    # data, formulas, layout, images and save all count as writing the workbook
+    return {
+        # the checks on the parsed lines count as parsing
+        "parse": seconds.pop("parse") + seconds.pop("validate", 0),
+        "clean": seconds.pop("clean"),
+        "write": sum(seconds.values()),
+    }
+
+
+def run_suite(sizes, repeat=1):
+    """Best rows/s of every stage at every size, as {rows: {stage: rows/s}}."""
+    use_calendar_date()
+    results = {}
+    for rows in sizes:
+        path = synthetic_file(rows)
+        best = {}
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                for stage, seconds in time_pipeline(path, tmp).items():
+                    best[stage] = min(best.get(stage, seconds), seconds)
+        results[str(rows)] = {stage: rows / seconds for stage, seconds in best.items()}
+    return results
+
+
+def compare(results, baseline):
+    """Prints results against the baseline. Returns the number of stages that regressed."""
+    regressions = 0
+    print(f"\n{'Rows':>10}  {'Stage':<8}{'Rows/s':>12}{'Baseline':>12}{'Change':>9}")
+    for rows, stages in results.items():
+        for stage, rate in stages.items():
+            base = baseline.get(rows, {}).get(stage)
+            if base is None:
+                print(f"{int(rows):>10,}  {stage:<8}{rate:>12,.0f}{'-':>12}")
+                continue
+            change = rate / base - 1
+            flag = "  REGRESSION" if change < -TOLERANCE and int(rows) / rate >= MIN_SECONDS else ""
+            regressions += bool(flag)
+            print(f"{int(rows):>10,}  {stage:<8}{rate:>12,.0f}{base:>12,.0f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def benchmark_suite(sizes, baseline_path, repeat=1, save=False):
+    results = run_suite(sizes, repeat)
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)["results"]
+    regressions = compare(results, baseline)
+
+    if save:
+        with open(baseline_path, "w") as file:
+            json.dump({"python": sys.version.split()[0], "results": {**baseline, **results}}, file, indent=2)
+        print(f"Saved the baseline to {baseline_path}")
+    elif regressions:
+        print(f"{regressions} stages are more than {TOLERANCE:.0%} slower than the baseline")
+        sys.exit(1)
+    elif not baseline:
+        print("No baseline yet, save one with --save-baseline")
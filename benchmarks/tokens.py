@@ -0,0 +1,49 @@
+"""
+Checks and times converting numeric tokens: one at a time the way
+parse_line_by_format used to (pattern looked up on every call), with the
+compiled NUMBER pattern, and as a whole column with
+numeric.convert_column. Prints the cost per token of each.
+"""
+import random
+import re
+
+from benchmarks import without_gc
+from numeric import convert_column, convert_token, python_values
+from read_file import NUMBER, convert_accounting_number
+from synthetic import synthetic_line
+
+# tokens the numeric conversion has to get right besides the synthetic ones
+EDGE_TOKENS = ["-5-", "+3", "12-", "1.", ".5", "1.2.3", "007", "0.50-", "1234567890123456789", "3.14159265358979323",
+               "99999999999999999999-", "N", "MFG-1", "", "CO", "\u0663", "12\u00e9"]
+
+
+def per_call_pattern(tokens):
+    # what parse_line_by_format used to do, the pattern goes through re's cache on every call
+    return [convert_accounting_number(token) if re.fullmatch(NUMBER.pattern, token) else token for token in tokens]
+
+
+def compiled_pattern(tokens):
+    return [convert_token(token) for token in tokens]
+
+
+def benchmark_tokens(count):
+    """Cost per token of converting numeric tokens one at a time and as a whole column."""
+    rng = random.Random(0)
+    tokens = []
+    while len(tokens) < count:
+        tokens += synthetic_line(rng).split()[4:]
+    tokens = tokens[:count] + EDGE_TOKENS
+
+    legacy, legacy_time = without_gc(per_call_pattern, tokens)
+    compiled, compiled_time = without_gc(compiled_pattern, tokens)
+    converted, column_time = without_gc(convert_column, tokens)
+
+    # same values of the same types
+    expected = [(type(value), value) for value in legacy]
+    assert [(type(value), value) for value in compiled] == expected
+    assert [(type(value), value) for value in python_values(*converted)] == expected
+
+    print(f"Converted {len(tokens):,} tokens, outputs match")
+    for label, elapsed in [("re.fullmatch per call", legacy_time), ("compiled NUMBER", compiled_time),
+                           ("convert_column", column_time)]:
+        print(f"{label + ':':<24}{elapsed / len(tokens) * 1e9:>8,.0f} ns/token ({elapsed:.3f}s)")
@@ -0,0 +1,47 @@
+"""
+Times validate's checks against parsing on a synthetic extract with one
+line in BAD_LINE_EVERY made malformed, checks they find exactly those lines
+and prints the checks' share of the parse.
+"""
+import os
+import random
+import tempfile
+
+import read_file
+from benchmarks import best_of, rate_line
+from columnar_parse import parse_file
+from report_spec import plan
+from synthetic import synthetic_line
+from validate import invalid_rows
+
+# one synthetic line in this many is broken, cycling through BAD_LINES
+BAD_LINE_EVERY = 1000
+# ways a line goes bad: a SKU running into its delimiter, lost trailing fields, text in a number field
+BAD_LINES = [
+    lambda line: "1" + line.lstrip(),
+    lambda line: line[:read_file.DESC_2_START + read_file.LEN_DESC_2 + 20],
+    lambda line: line.rstrip().rsplit(" ", 1)[0] + " XYZ",
+]
+
+
+def benchmark_validate(rows, repeat=1):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.TXT")
+        bad = set()
+        with open(path, "w") as file:
+            for index in range(rows):
+                line = synthetic_line(rng).rstrip("\n")
+                if index % BAD_LINE_EVERY == BAD_LINE_EVERY - 1:
+                    line = BAD_LINES[len(bad) % len(BAD_LINES)](line)
+                    bad.add(index)
+                file.write(line + "\n")
+
+        # the fields the report spec reads, like a run parses them
+        df, parse_time = best_of(repeat, lambda path: parse_file(path, workers=1, keep=plan().fields), path)
+        reasons, validate_time = best_of(repeat, invalid_rows, df)
+
+    assert set(reasons.index) == bad, f"expected lines {sorted(bad)}, checks found {sorted(reasons.index)}"
+    print(f"Parsed {rows:,} rows, the checks found the {len(bad)} broken lines")
+    print(rate_line("parse:", rows, parse_time, width=10))
+    print(f"{rate_line('validate:', rows, validate_time, width=10)}, {validate_time / parse_time:.1%} of the parse")
@@ -0,0 +1,58 @@
+"""
+Times filling the datasheet: pandas' to_excel plus the separate column C
+and formula passes, against column_writer's single typed pass.
+"""
+import os
+import tempfile
+
+import pandas as pd
+import xlsxwriter
+
+import read_file
+from benchmarks import rate_line, timed, use_calendar_date
+from column_writer import WRITERS, write_columns
+from columnar_parse import parse_file
+from read_file import START_ROW
+from report_spec import plan
+from synthetic import write_synthetic_file
+
+
+def to_excel_fill(df, path, formulas=True):
+    """The datasheet fill write_equations used to do: to_excel, then column C and the formulas cell by cell."""
+    df = df.copy()
+    for index, header, _ in plan().formulas:
+        df.insert(index, header, '')
+
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        df.to_excel(writer, index=False, sheet_name="Sheet1", startrow=START_ROW)
+        worksheet = writer.sheets["Sheet1"]
+        for row, value in enumerate(df.iloc[:, 2], start=START_ROW + 1):
+            worksheet.write_string(row, 2, str(value))
+        for row in range(START_ROW + 1, START_ROW + 1 + len(df)) if formulas else []:
+            for index, _, formula_template in plan().formulas:
+                worksheet.write_formula(row, index, formula_template.format(row_num=row + 1))
+
+
+def column_writer_fill(df, path, formulas=True):
+    workbook = xlsxwriter.Workbook(path)
+    worksheet = workbook.add_worksheet("Sheet1")
+    if formulas:
+        write_columns(worksheet, df, START_ROW + 1)
+    else:
+        for col, column_type, (_, values) in zip(plan().data_columns, plan().writers, df.items()):
+            WRITERS[column_type](worksheet, col, values, START_ROW + 1)
+    workbook.close()
+
+
+def benchmark_write(rows):
+    use_calendar_date()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.TXT")
+        write_synthetic_file(path, rows)
+        df = read_file.clean_spreadsheet(parse_file(path))
+
+        print(f"Filled {rows} rows, including saving the workbook")
+        for formulas in [False, True]:
+            for label, fill in [("to_excel", to_excel_fill), ("column_writer", column_writer_fill)]:
+                _, elapsed = timed(fill, df, os.path.join(tmp, "sheet.xlsx"), formulas)
+                print(rate_line(f"{label} ({'data + formulas' if formulas else 'data only'}):", rows, elapsed, width=35))
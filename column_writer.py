@@ -0,0 +1,105 @@
+"""
+Writes the cleaned DataFrame into the datasheet one column at a time.
+
+Every column has a "write" type in the report spec that picks its writer
+in WRITERS, and the formula columns are written from their templates in
+the same pass. Cells are written without a format so they pick up the
+column formats the spec gives, and each cell is only written once.
+
+Values can be a Series or a plain list, pandas isn't needed to write a
+list (small_extract writes small reports without it).
+"""
+import math
+import sys
+
+from profiler import stage
+from report_spec import plan
+
+def pandas_na():
+    """pandas' NA, or None when pandas isn't loaded (and so can't have made one)."""
+    pandas = sys.modules.get("pandas")
+    return pandas.NA if pandas else None
+
+
+def _as_list(values):
+    return values if isinstance(values, list) else values.tolist()
+
+
+def row_count(df):
+    """Rows of df, a DataFrame or a list of columns."""
+    if isinstance(df, list):
+        return len(df[0]) if df else 0
+    return len(df)
+
+
+def write_general(worksheet, col, values, first_row):
+    """Writes each value by its own type, the same way pandas' to_excel does."""
+    na = pandas_na()
+    for row, value in enumerate(_as_list(values), start=first_row):
+        if isinstance(value, str):
+            # empty strings are left blank
+            if value:
+                worksheet.write_string(row, col, value)
+        elif value is None or value is na or value != value:
+            continue
+        elif isinstance(value, float) and math.isinf(value):
+            worksheet.write_string(row, col, "inf" if value > 0 else "-inf")
+        else:
+            worksheet.write_number(row, col, value)
+
+
+def write_text(worksheet, col, values, first_row):
+    for row, value in enumerate(_as_list(values), start=first_row):
+        worksheet.write_string(row, col, str(value))
+
+
+def write_numbers(worksheet, col, values, first_row):
+    """Integer columns go straight in, anything with blanks, text or inf goes through write_general."""
+    if isinstance(values, list) or values.dtype.kind not in "iu":
+        write_general(worksheet, col, values, first_row)
+        return
+    for row, value in enumerate(values.tolist(), start=first_row):
+        worksheet.write_number(row, col, value)
+
+
+WRITERS = {
+    "general": write_general,
+    "text": write_text,
+    "int": write_numbers,
+    "currency": write_numbers,
+}
+
+
+def write_formulas(worksheet, col, template, first_row, rows, cached=None):
+    """Writes template down the column, saved with its cached results when there are some."""
+    for offset in range(rows):
+        row = first_row + offset
+        # Excel rows are 1-indexed
+        formula = template.format(row_num=row + 1)
+        if cached is None:
+            worksheet.write_formula(row, col, formula)
+        else:
+            worksheet.write_formula(row, col, formula, None, cached[offset])
+
+
+def write_columns(worksheet, df, first_row, results=None, metrics="formulas"):
+    """
+    Writes df (clean_spreadsheet's output) and the formula columns from
+    sheet row first_row down. results are compute_metrics' results for the
+    "cached" and "values" metrics modes. df can also be the columns as a
+    list of lists.
+    """
+    report = plan()
+    columns = df if isinstance(df, list) else [values for _, values in df.items()]
+    rows = row_count(df)
+    with stage("data", rows=rows):
+        for col, column_type, values in zip(report.data_columns, report.writers, columns):
+            WRITERS[column_type](worksheet, col, values, first_row)
+
+    with stage("formulas", rows=rows):
+        for col, _, template in report.formulas:
+            if metrics == "values":
+                write_general(worksheet, col, results["columns"][col], first_row)
+            else:
+                cached = results["columns"][col] if metrics == "cached" else None
+                write_formulas(worksheet, col, template, first_row, rows, cached)
@@ -0,0 +1,379 @@
+"""
+Columnar parse engine for the raw fixed-width extracts.
+
+Instead of walking the file line by line through parse_line_by_format, the
+whole file is read into one buffer and laid out as a character matrix (one
+row per line, one ASCII code per column). The fixed-width segments are then
+sliced for every line at once, and the whitespace separated blocks are
+tokenized and converted with NumPy array operations (see numeric.py).
+Numeric columns go straight into int64/float64 arrays without becoming
+Python objects.
+
+Lines the bulk path can't reproduce exactly (non-ASCII or control
+characters, too few tokens, a dangling 'N' flag, text where a delimiter
+belongs) are handed to parse_line_by_format so the result always matches
+read_file.read_rows.
+
+Big files are memory-mapped and split into newline-aligned byte ranges
+that worker processes parse side by side (parse_file_parallel), the ranges
+are joined back in file order.
+
+Given keep, the fields the report spec reads (report_spec.ReportPlan.fields),
+only those columns are sliced, gathered and built, the tokens are still
+found on every line so the fields keep their numbers. A kept field no line
+reaches comes back empty instead of missing.
+"""
+import itertools
+import locale
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from read_file import LINE_FORMAT, DESC_2_START, LEN_DESC_2, parse_line_by_format
+from numeric import (OBJECT, INT, FLOAT, MISSING, SPACE, ROW_END, as_bytes, token_text, convert_tokens, set_cell,
+                     python_values)
+
+# bump when the parsed or cleaned output changes, so parse_cache entries from older versions are ignored
+PARSER_VERSION = 4
+
+# number of whitespace separated fields between the fixed-width start and the second description
+HEAD_FIELDS = 13 - sum(isinstance(part, int) for part in LINE_FORMAT)
+
+# lines are parsed in blocks so the character matrix stays a reasonable size
+CHUNK_LINES = 50000
+
+# files at least this big are split across worker processes when there's more than one core
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+# smallest byte range handed to a worker, smaller ranges cost more to ship back than to parse
+MIN_RANGE_BYTES = 4 * 1024 * 1024
+
+FLAG = ord("N")
+
+
+def read_lines(path):
+    """
+    Reads the raw file into a list of lines, with blank lines dropped and
+    leading whitespace removed the same way run_script always has.
+    """
+    with open(path, "r") as file:
+        text = file.read()
+    return _split_lines(text)
+
+
+def _split_lines(text):
+    return [line.lstrip() for line in text.split("\n") if line.strip()]
+
+
+def read_line_chunks(path, chunk_lines=CHUNK_LINES):
+    """
+    Same lines as read_lines, yielded in lists of at most chunk_lines so
+    the whole file never has to be in memory at once.
+    """
+    with open(path, "r") as file:
+        lines = (line.rstrip("\n").lstrip() for line in file if line.strip())
+        while True:
+            chunk = list(itertools.islice(lines, chunk_lines))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _char_matrix(lines, min_width):
+    """
+    Lays lines out as a zero padded (lines, width) matrix of ASCII codes.
+    Non-ASCII characters become '?' so columns still line up, those lines
+    are flagged and later parsed by parse_line_by_format instead.
+    """
+    text = "\n".join(lines)
+    if text.isascii():
+        non_ascii = np.zeros(len(lines), dtype=bool)
+    else:
+        non_ascii = np.array([not line.isascii() for line in lines], dtype=bool)
+
+    encoded = np.array(text.encode("ascii", "replace").split(b"\n"), dtype=bytes)
+    width = encoded.dtype.itemsize
+    matrix = np.zeros((len(lines), max(width, min_width)), dtype=np.uint8)
+    matrix[:, :width] = encoded.view(np.uint8).reshape(len(lines), width)
+    lengths = np.fromiter(map(len, lines), dtype=np.intp, count=len(lines))
+    return matrix, lengths, non_ascii
+
+
+def _tokenize(region, noise=""):
+    """
+    Finds the whitespace separated tokens in every row of an ASCII code
+    matrix, after removing every character in `noise`. Returns the flattened
+    character stream, the start and end of each token in it, the row each
+    token came from and the number of tokens per row.
+    """
+    n, width = region.shape
+    # a line break after every row keeps tokens from running into the next row
+    stream = np.full((n, width + 1), ROW_END, dtype=np.uint8)
+    stream[:, :width] = region
+    stream = stream.ravel()
+    if noise:
+        stream = stream[~np.isin(stream, [ord(c) for c in noise])]
+
+    edges = np.flatnonzero(np.diff(stream > SPACE, prepend=False))
+    starts, ends = edges[0::2], edges[1::2]
+    rows = np.searchsorted(np.flatnonzero(stream == ROW_END), starts)
+    return stream, starts, ends, rows, np.bincount(rows, minlength=n)
+
+
+def _text_column(values):
+    n = len(values)
+    return np.full(n, OBJECT, dtype=np.int8), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.float64), values
+
+
+def _missing_column(n):
+    return np.full(n, MISSING, dtype=np.int8), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.float64), np.empty(n, dtype=object)
+
+
+def _convert_kept(stream, starts, ends, fields, keep=None):
+    """
+    convert_tokens for the tokens whose field (in `fields`) is in keep, all
+    of them without keep. Returns the converted tokens and every token's
+    index into them, -1 for the ones skipped.
+    """
+    if keep is None:
+        return convert_tokens(stream, starts, ends), np.arange(len(starts))
+    needed = np.isin(fields, keep)
+    index = np.where(needed, np.cumsum(needed) - 1, -1)
+    return convert_tokens(stream, starts[needed], ends[needed]), index
+
+
+def _token_columns(converted, where, first=0, keep=None):
+    """
+    Gathers converted tokens into columns, `where` holds a token index per
+    cell or -1. Its columns are fields first onwards, the ones not in keep
+    are None.
+    """
+    columns = []
+    for j, col in enumerate(where.T, start=first):
+        if keep is not None and j not in keep:
+            columns.append(None)
+            continue
+        if not len(converted[0]):
+            columns.append(_missing_column(len(where)))
+            continue
+        kind = np.where(col >= 0, converted[0][col], MISSING).astype(np.int8)
+        columns.append((kind,) + tuple(values[col] for values in converted[1:]))
+    return columns
+
+
+def _parse_block(lines, format, keep=None):
+    """
+    Parses a list of left-stripped lines into columns of (kind, ints, floats,
+    objects) arrays, one entry per line. With keep, a sorted list of fields,
+    only those columns are returned, in that order.
+    """
+    tail_start = DESC_2_START + LEN_DESC_2
+    matrix, lengths, non_ascii = _char_matrix(lines, tail_start + 1)
+    n = len(lines)
+    columns = []
+    idx = 0
+    bad_delimiter = np.zeros(n, dtype=bool)
+
+    # deliniate the fixed-width fields
+    for part in format:
+        if isinstance(part, int):
+            if keep is None or len(columns) in keep:
+                text = np.char.strip(as_bytes(matrix[:, idx:idx + part])).astype(str).astype(object)
+                columns.append(_text_column(text))
+            else:
+                columns.append(None)
+            idx += part
+        elif isinstance(part, str):
+            if part and columns:
+                bad_delimiter |= (matrix[:, idx:idx + len(part)] != np.frombuffer(part.encode(), dtype=np.uint8)).any(axis=1)
+            idx += len(part)
+        else:
+            raise TypeError("Format list must contain only integers and strings.")
+
+    # whitespace separated fields up to the second description
+    stream, starts, ends, rows, _ = _tokenize(matrix[:, idx:DESC_2_START], "*")
+
+    same_row_prev = np.zeros(len(rows), dtype=bool)
+    same_row_prev[1:] = rows[1:] == rows[:-1]
+    same_row_next = np.zeros(len(rows), dtype=bool)
+    same_row_next[:-1] = same_row_prev[1:]
+    flag = (ends - starts == 1) & (stream[starts] == FLAG)
+    follows_flag = np.zeros(len(rows), dtype=bool)
+    follows_flag[1:] = flag[:-1]
+    follows_flag &= same_row_prev
+
+    kept = ~flag
+    kept_before = np.cumsum(kept) - kept
+    row_start = np.flatnonzero(~same_row_prev)
+    kept_rank = kept_before - np.repeat(kept_before[row_start], np.diff(np.append(row_start, len(rows))))
+    place = kept & (kept_rank < HEAD_FIELDS)
+
+    # only tokens landing in a kept field are converted
+    fields = np.where(place, len(columns) + kept_rank, -1)
+    converted, index = _convert_kept(stream, starts, ends, fields, keep)
+    # the 'N' flag is dropped and the token after it is kept as text
+    text = follows_flag & (index >= 0)
+    converted[0][index[text]] = OBJECT
+    converted[3][index[text]] = token_text(stream, starts[text], ends[text])
+
+    where = np.full((n, HEAD_FIELDS), -1, dtype=np.intp)
+    where[rows[place], kept_rank[place]] = index[place]
+    columns += _token_columns(converted, where, len(columns), keep)
+
+    # a flag the line parser reaches with nothing usable after it can't be matched here
+    fallback = np.bincount(rows[kept], minlength=n) < HEAD_FIELDS
+    reached = flag & (kept_rank < HEAD_FIELDS)
+    fallback |= np.bincount(rows[reached & (follows_flag | ~same_row_next)], minlength=n) > 0
+
+    # second description then the trailing numeric block
+    if keep is None or len(columns) in keep:
+        desc_2 = np.char.strip(as_bytes(matrix[:, DESC_2_START:tail_start])).astype(str).astype(object)
+        columns.append(_text_column(desc_2))
+    else:
+        columns.append(None)
+
+    stream, starts, ends, rows, counts = _tokenize(matrix[:, tail_start:], "*%`")
+    first = np.cumsum(counts) - counts
+    rank = np.arange(len(rows)) - first[rows]
+    converted, index = _convert_kept(stream, starts, ends, len(columns) + rank, keep)
+    where = np.full((n, max(int(counts.max()), 1)), -1, dtype=np.intp)
+    where[rows, rank] = index
+    columns += _token_columns(converted, where, len(columns), keep)
+    fallback |= counts == 0
+
+    # anything outside printable ASCII (tabs, unicode spaces, ...) goes through the line parser
+    inside = np.arange(matrix.shape[1]) < lengths[:, None]
+    fallback |= non_ascii | ((matrix < SPACE) & inside).any(axis=1)
+    # the line parser keeps text found in a delimiter with the field before it
+    fallback |= bad_delimiter
+
+    # lines the bulk path can't match exactly fall back to the line parser
+    for i in np.flatnonzero(fallback):
+        row = parse_line_by_format(lines[i], format)
+        while len(columns) < len(row):
+            columns.append(_missing_column(n) if keep is None or len(columns) in keep else None)
+        for j, column in enumerate(columns):
+            if column is None:
+                continue
+            if j < len(row):
+                set_cell(column, i, row[j])
+            else:
+                column[0][i] = MISSING
+
+    if keep is None:
+        return columns
+    return [columns[j] if j < len(columns) and columns[j] is not None else _missing_column(n) for j in keep]
+
+
+def _build_column(kind, ints, floats, objects):
+    """
+    Turns a parsed column into what pd.DataFrame(rows) would have inferred.
+    Purely numeric columns skip Python objects entirely.
+    """
+    if (kind == INT).all():
+        return ints
+    if ((kind == INT) | (kind == FLOAT) | (kind == MISSING)).all():
+        return np.where(kind == INT, ints, np.where(kind == FLOAT, floats, np.nan))
+
+    # anything mixed goes through pandas' own inference
+    return pd.Series(python_values(kind, ints, floats, objects), dtype=object).infer_objects()
+
+
+def _join_blocks(blocks, keep=None):
+    """
+    Joins parsed blocks, in order, into the DataFrame pd.DataFrame(rows)
+    would have built, or its keep columns when the blocks only hold those.
+    """
+    if not blocks:
+        return pd.DataFrame()
+    if keep is not None:
+        columns = [tuple(np.concatenate(parts) for parts in zip(*(block[k] for block in blocks))) for k in range(len(keep))]
+        return pd.DataFrame({j: _build_column(*column) for j, column in zip(keep, columns)})
+
+    # blocks can end up with different widths, line them up before joining
+    width = max(len(block) for block in blocks)
+    for block in blocks:
+        block += [_missing_column(len(block[0][0])) for _ in range(width - len(block))]
+    columns = [tuple(np.concatenate(parts) for parts in zip(*(block[j] for block in blocks))) for j in range(width)]
+
+    # drop trailing columns no line actually has, pd.DataFrame(rows) never creates them
+    while columns and (columns[-1][0] == MISSING).all():
+        columns.pop()
+
+    return pd.DataFrame({j: _build_column(*column) for j, column in enumerate(columns)})
+
+
+def _parse_blocks(lines, format, keep=None):
+    return [_parse_block(lines[start:start + CHUNK_LINES], format, keep) for start in range(0, len(lines), CHUNK_LINES)]
+
+
+def parse_lines(lines, format=LINE_FORMAT, keep=None):
+    """
+    Parses a list of already left-stripped lines into the same columns
+    parse_line_by_format produces, returned as a DataFrame. With keep, a
+    sorted list of fields, only those columns.
+    """
+    return _join_blocks(_parse_blocks(lines, format, keep), keep)
+
+
+def line_ranges(path, count):
+    """
+    Splits the file into at most count (start, end) byte ranges of about the
+    same size, each ending just after a newline so no line is cut in two.
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    bounds = [0]
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        for part in range(1, count):
+            newline = view.find(b"\n", max(size * part // count, bounds[-1]))
+            if newline < 0 or newline + 1 >= size:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_range(path, start, end, format, keep=None):
+    """Worker side of parse_file_parallel, parses the lines of one byte range."""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        # decoded the way open(path, "r") would, universal newlines included
+        text = view[start:end].decode(locale.getpreferredencoding(False))
+    return _parse_blocks(_split_lines(text.replace("\r\n", "\n").replace("\r", "\n")), format, keep)
+
+
+def parse_file_parallel(path, format=LINE_FORMAT, workers=None, keep=None):
+    """
+    Parses the raw file in worker processes. The file is memory-mapped and
+    split on line boundaries into a few byte ranges per worker, and every
+    worker maps and parses its own ranges, so only the parsed columns travel
+    between processes. Ranges are joined back in file order, the result is
+    the same as parse_file's.
+    """
+    workers = workers or os.cpu_count() or 1
+    count = max(1, min(workers * 4, os.path.getsize(path) // MIN_RANGE_BYTES))
+    ranges = line_ranges(path, count)
+    if len(ranges) < 2:
+        return parse_lines(read_lines(path), format, keep)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        parts = executor.map(_parse_range, *zip(*((path, start, end, format, keep) for start, end in ranges)))
+        blocks = [block for part in parts for block in part]
+    return _join_blocks(blocks, keep)
+
+
+def parse_file(path, format=LINE_FORMAT, workers=None, keep=None):
+    """
+    Reads and parses the whole raw file. Big files are parsed in parallel
+    when there's more than one core, workers=1 always parses in this process.
+    keep limits the columns as parse_lines does.
+    """
+    if workers is None:
+        workers = (os.cpu_count() or 1) if os.path.getsize(path) >= PARALLEL_MIN_BYTES else 1
+    if workers > 1:
+        return parse_file_parallel(path, format, workers, keep)
+    return parse_lines(read_lines(path), format, keep)
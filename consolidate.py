@@ -0,0 +1,188 @@
+"""
+Consolidated mode: one workbook with a sheet per customer and a rollup.
+
+    python3 read_file.py --consolidate manifest.json [--workers N]
+
+Takes the same manifest as --batch. Every raw file is parsed once, in
+worker processes side by side (through the parse cache, and into the
+history with --ingest, like a normal run), and the cleaned DataFrames come back here.
+Each customer gets a sheet named after it, laid out like its own datasheet
+with its logos, after a Rollup sheet that totals $ On Hand, $ On Order,
+$ MTD and the estimated monthly run rate per account and per SKU across
+every account. The rollup is worked out from the parsed data with
+compute_metrics and a groupby on SKU, not with formulas reaching across
+sheets. Cells that would show an Excel error on their sheet are left out
+of the totals.
+
+The workbook is named after the manifest, manifest.json gives
+"manifest 10-12-2025.xlsx". If any raw file fails nothing is written.
+"""
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import read_file
+from batch import init_worker, load_jobs
+from column_writer import write_general
+from metrics import compute_metrics
+from parse_cache import cached_clean_spreadsheet
+from report_spec import plan
+from styles import get_format
+
+ROLLUP_SHEET = "Rollup"
+
+# formula columns the rollup totals, by report spec id
+DOLLAR_COLUMNS = {"on_hand_dollars": "$ On Hand", "on_order_dollars": "$ On Order", "mtd_dollars": "$ MTD"}
+RUN_RATE = "$ Est. Monthly Run Rate"
+
+# Excel's limits on sheet names
+MAX_SHEET_NAME = 31
+SHEET_NAME_CHARS = set("[]:*?/\\")
+
+# Header, width, style of the rollup's SKU table columns from A. The account
+# table above it starts in column B, so both share the widths and formats.
+SKU_LAYOUT = [
+    ("IM SKU#", 9.17, "centered"),
+    ("Product Description", 64.17, "text"),
+    ("Accounts", 9.17, "dash"),
+] + [(header, 15.17, "currency") for header in [*DOLLAR_COLUMNS.values(), RUN_RATE]]
+ACCOUNT_HEADERS = ["Account", "SKUs", *DOLLAR_COLUMNS.values(), RUN_RATE]
+
+
+def check_sheet_names(jobs):
+    """Raises ValueError for a job name Excel won't take as a sheet name, before anything is parsed."""
+    seen = {ROLLUP_SHEET.lower()}
+    for job in jobs:
+        name = job["name"]
+        if not name or len(name) > MAX_SHEET_NAME or SHEET_NAME_CHARS & set(name):
+            raise ValueError(f"{name!r} can't be a sheet name, use up to {MAX_SHEET_NAME} characters and none of []:*?/\\")
+        if name.lower() in seen:
+            raise ValueError(f"Two sheets would be called {name!r}, sheet names have to differ (ignoring case)")
+        seen.add(name.lower())
+
+
+def parse_job(job, use_cache=True, ingest=False):
+    """
+    Worker: clean_spreadsheet's output for the job's raw file, added to the
+    history with ingest. Returns (df, None), or (None, the error) if it failed.
+    """
+    try:
+        # jobs already run side by side, each one parses in its own process
+        df = cached_clean_spreadsheet(job["raw_file"], use_cache, workers=1)
+        if ingest:
+            from history import ingest as add_to_history
+            add_to_history(df, job["name"], read_file.cal, job["raw_file"])
+        return df, None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def run_rate(mtd, results):
+    """The datasheet's $-EST MONTHLY RUN RATE for mtd dollars, None on the first day of the fiscal month."""
+    if results["reporting_week"] == 0:
+        return None
+    return mtd / results["reporting_week"] * results["weeks_in_month"]
+
+
+def account_dollars(df, results):
+    """$ columns of one account per row of df, error cells as NaN."""
+    report = plan()
+    dollars = pd.DataFrame({
+        "sku": df.iloc[:, report.position("sku")].astype(str).to_numpy(),
+        "description": df.iloc[:, report.position("description")].to_numpy(),
+    })
+    for id, header in DOLLAR_COLUMNS.items():
+        dollars[header] = pd.to_numeric(pd.Series(results["columns"][report.index(id)]), errors="coerce").to_numpy()
+    return dollars
+
+
+def rollup(accounts):
+    """
+    The account table and the SKU table of the Rollup sheet from accounts,
+    {name: (df, compute_metrics' results)}.
+    """
+    totals = []
+    frames = []
+    for name, (df, results) in accounts.items():
+        dollars = account_dollars(df, results)
+        sums = dollars[list(DOLLAR_COLUMNS.values())].sum()
+        totals.append({"Account": name, "SKUs": len(df), **sums, RUN_RATE: run_rate(sums["$ MTD"], results)})
+        frames.append(dollars.assign(account=name))
+
+    by_account = pd.DataFrame(totals, columns=ACCOUNT_HEADERS)
+    by_sku = pd.concat(frames, ignore_index=True).groupby("sku", sort=True).agg(
+        description=("description", "first"),
+        accounts=("account", "nunique"),
+        **{header: (header, "sum") for header in DOLLAR_COLUMNS.values()},
+    ).reset_index()
+    # every account shares the calendar, so any of them gives the weeks
+    results = next(iter(accounts.values()))[1]
+    by_sku[RUN_RATE] = [run_rate(mtd, results) for mtd in by_sku["$ MTD"]]
+    by_sku.columns = [header for header, _, _ in SKU_LAYOUT]
+    return by_account, by_sku
+
+
+def _write_table(workbook, worksheet, table, first_row, first_col=0):
+    for col, (header, values) in enumerate(table.items(), start=first_col):
+        worksheet.write(first_row, col, header, get_format(workbook, "header"))
+        write_general(worksheet, col, values, first_row + 1)
+
+
+def write_rollup(workbook, by_account, by_sku):
+    worksheet = workbook.add_worksheet(ROLLUP_SHEET)
+    for col, (_, width, style) in enumerate(SKU_LAYOUT):
+        worksheet.set_column(col, col, width, get_format(workbook, style))
+
+    underline_fmt = get_format(workbook, "underline")
+    for i, info in enumerate(["Report", "Date", read_file.cal.get_report_date_str()]):
+        worksheet.write(i, 0, info, underline_fmt)
+
+    first_row = 4
+    _write_table(workbook, worksheet, by_account, first_row, first_col=1)
+    total_row = first_row + 1 + len(by_account)
+    worksheet.write(total_row, 1, "Total", get_format(workbook, "italics_blue"))
+    # SKUs and the $ columns, below the table's columns C onwards
+    for col, total in enumerate(by_account.iloc[:, 1:].sum(min_count=1).tolist(), start=2):
+        if pd.notna(total):
+            worksheet.write_number(total_row, col, total, get_format(workbook, "dash" if col == 2 else "italics_blue_currency"))
+
+    sku_row = total_row + 3
+    _write_table(workbook, worksheet, by_sku, sku_row)
+    worksheet.freeze_panes(sku_row + 1, 0)
+
+
+def run_consolidated(manifest_path, workers=None, use_cache=True, metrics="formulas", ingest=False):
+    """Builds the consolidated workbook for the manifest. Returns False if any raw file failed."""
+    jobs = load_jobs(manifest_path)
+    check_sheet_names(jobs)
+    name = os.path.splitext(os.path.basename(manifest_path))[0]
+    read_file.load_environment()
+
+    print(f"Parsing {len(jobs)} raw files")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(read_file.cal,)) as pool:
+        parsed = list(pool.map(parse_job, jobs, [use_cache] * len(jobs), [ingest] * len(jobs)))
+
+    failed = [(job, error) for job, (_, error) in zip(jobs, parsed) if error]
+    for job, error in failed:
+        print(f"\n{job['name']} ({job['raw_file']}) failed:\n{error}")
+    if failed:
+        print(f"{len(failed)} of {len(jobs)} raw files failed, no workbook written")
+        return False
+    print(f"Parsed in {time.perf_counter() - start:.2f}s")
+
+    accounts = {job["name"]: (df, compute_metrics(df, read_file.cal)) for job, (df, _) in zip(jobs, parsed)}
+    workbook = read_file.new_workbook(read_file.output_filename(name), metrics)
+    write_rollup(workbook, *rollup(accounts))
+    for job in jobs:
+        df, results = accounts[job["name"]]
+        # formulas mode sheets don't take results, their totals cover the whole column like a normal datasheet
+        read_file.write_sheet(workbook, df, job["name"], job.get("logos", read_file.LOGOS), metrics,
+                              results=None if metrics == "formulas" else results)
+    workbook.close()
+
+    print(f"Wrote {read_file.output_filename(name)} with {len(jobs)} accounts in {time.perf_counter() - start:.2f}s")
+    return True
@@ -0,0 +1,147 @@
+"""
+Week-over-week delta reports.
+
+Each run keeps the cleaned extract as a snapshot of its report date
+(snapshots/<NAME>/<YYYY-MM-DD>.parquet, or SNAPSHOT_DIR in the .env). A run
+compares its extract with the newest snapshot dated before its report date,
+so rerunning a week compares it with the week before again, never with
+itself. The new extract is joined to the snapshot on the SKU column through a
+hash index, a hash of each matched row is compared, and only the SKUs that
+changed, were added or were removed are written. The full datasheet is only
+built as well when --full is given.
+
+    python3 read_file.py --delta [xlsx|csv] [--full]
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import read_file
+from parse_cache import join_objects, split_objects
+from report_spec import plan
+
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+
+CHANGE = "Change"
+
+SNAPSHOT_FILE = re.compile(r"\d{4}-\d{2}-\d{2}\.parquet")
+
+
+def snapshot_dir(name):
+    return os.path.join(os.getenv("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR), name)
+
+
+def snapshot_path(name, report_date):
+    return os.path.join(snapshot_dir(name), f"{report_date:%Y-%m-%d}.parquet")
+
+
+def previous_snapshot(name, report_date):
+    """Path of the newest snapshot of name dated before report_date, None if there isn't one."""
+    folder = snapshot_dir(name)
+    if not os.path.isdir(folder):
+        return None
+    before = f"{report_date:%Y-%m-%d}.parquet"
+    # ISO dates sort like the dates themselves
+    dated = sorted(file for file in os.listdir(folder) if SNAPSHOT_FILE.fullmatch(file) and file < before)
+    return os.path.join(folder, dated[-1]) if dated else None
+
+
+def load_snapshot(path):
+    return join_objects(pd.read_parquet(path))
+
+
+def save_snapshot(name, report_date, df):
+    path = snapshot_path(name, report_date)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    split_objects(df).to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def sku_column():
+    """Name of the report spec's sku column, the key snapshots are joined on."""
+    report = plan()
+    return report.columns[report.index("sku")]["name"]
+
+
+def _unique_skus(df, label):
+    duplicates = df[sku_column()].duplicated()
+    if duplicates.any():
+        print(f"Warning: {duplicates.sum()} repeated SKUs in {label}, comparing the first of each")
+        df = df[~duplicates]
+    return df.reset_index(drop=True)
+
+
+def _hashable(df):
+    # int32 and int64 hash negative numbers differently, snapshots from before the schema hold int64
+    return df.astype({column: np.int64 for column, dtype in df.dtypes.items() if dtype.kind in "iu"})
+
+
+def diff_snapshots(old, new):
+    """
+    Returns the rows of new that changed or were added and the rows of old
+    that were removed, with a Change column in front. Only columns both
+    snapshots have are compared, the month columns move on at a fiscal
+    month boundary.
+    """
+    old = _unique_skus(old, "last snapshot")
+    new = _unique_skus(new, "this extract")
+    common = [column for column in new.columns if column in old.columns]
+
+    # hash join: look every new SKU up in a hash index of the old ones
+    key = sku_column()
+    positions = pd.Index(old[key]).get_indexer(new[key])
+    matched = positions >= 0
+
+    old_hash = pd.util.hash_pandas_object(_hashable(old[common]), index=False).to_numpy()
+    new_hash = pd.util.hash_pandas_object(_hashable(new[common]), index=False).to_numpy()
+    changed = matched.copy()
+    changed[matched] = new_hash[matched] != old_hash[positions[matched]]
+
+    removed = np.ones(len(old), dtype=bool)
+    removed[positions[matched]] = False
+
+    parts = [
+        new[changed].assign(**{CHANGE: "Changed"}),
+        new[~matched].assign(**{CHANGE: "Added"}),
+        old[removed].assign(**{CHANGE: "Removed"}),
+    ]
+    delta = pd.concat(parts, ignore_index=True)
+    return delta[[CHANGE] + [column for column in delta.columns if column != CHANGE]]
+
+
+def delta_filename(name, format="xlsx"):
+    return read_file.output_filename(name).replace(".xlsx", f" changes.{format}")
+
+
+def write_delta(df, name=None, format="xlsx", report_date=None):
+    """
+    Writes what changed since the newest snapshot of name before report_date
+    (the calendar's report date when None), then keeps df as the snapshot of
+    report_date.
+    """
+    name = name or os.getenv("NAME")
+    report_date = report_date or read_file.cal.report_date
+    path = previous_snapshot(name, report_date)
+    if path is None:
+        print(f"No snapshot for {name} before {report_date:%m/%d/%Y} yet, every SKU counts as added")
+        old = df.iloc[:0]
+    else:
+        print(f"Comparing with the snapshot of {os.path.basename(path)[:-len('.parquet')]}")
+        old = load_snapshot(path)
+
+    delta = diff_snapshots(old, df)
+    counts = delta[CHANGE].value_counts()
+    print(f"{counts.get('Changed', 0)} changed, {counts.get('Added', 0)} added, {counts.get('Removed', 0)} removed "
+          f"out of {len(df)} SKUs")
+
+    output = delta_filename(name, format)
+    if format == "csv":
+        delta.to_csv(output, index=False)
+    else:
+        delta.to_excel(output, index=False, sheet_name=f"{name} changes"[:31])
+    print(f"Wrote {output}")
+
+    save_snapshot(name, report_date, df)
+    return delta
@@ -0,0 +1,86 @@
+"""
+Exports the datasheet's table as CSV, Parquet or JSON Lines for loading
+into other tools, next to or instead of the workbook.
+
+    python3 read_file.py --formats xlsx,parquet
+
+The table is the datasheet's columns in the same order and under the same
+headers: clean_spreadsheet's columns with the formula columns worked out
+by compute_metrics as real numbers, plus the history months when
+--history-months adds them. Number columns only hold numbers: text in
+one, and a cell Excel would show an error in, is left empty. Files are named like the workbook
+with their own extension, "A764Y 10-12-2025.parquet". Parquet needs
+pyarrow.
+"""
+import os
+
+import pandas as pd
+
+import read_file
+from metrics import compute_metrics
+from report_spec import plan
+
+
+def export_table(df, calendar, history=None):
+    """clean_spreadsheet's output with the formula columns as numbers, in datasheet column order."""
+    report = plan()
+    results = compute_metrics(df, calendar)
+    columns = {}
+    for col, dtype, (header, values) in zip(report.data_columns, report.dtypes, df.items()):
+        if dtype in ("int32", "float64") and values.dtype == object:
+            # the schema left text in a number column, the table keeps the numbers
+            values = pd.to_numeric(values, errors="coerce")
+        columns[col] = (header, values)
+    for col, header, _ in report.formulas:
+        # error cells are text, they come out empty
+        columns[col] = (header, pd.to_numeric(pd.Series(results["columns"][col], index=df.index), errors="coerce"))
+
+    table = pd.DataFrame({header: values for _, (header, values) in sorted(columns.items())})
+    if history is not None:
+        table = pd.concat([table, history], axis=1)
+    return table
+
+
+def write_csv(table, path):
+    table.to_csv(path, index=False)
+
+
+def write_jsonl(table, path):
+    table.to_json(path, orient="records", lines=True, double_precision=15)
+
+
+def write_parquet(table, path):
+    # Parquet columns hold one type, a column mixing numbers and text (Status Code) is written as text
+    columns = {}
+    for header, values in table.items():
+        if isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.dtype == object:
+            values = values.astype(object)
+        columns[header] = values.astype("string") if values.dtype == object else values
+    pd.DataFrame(columns).to_parquet(path, index=False)
+
+
+# output format -> writer, read_file.OUTPUT_FORMATS lists these after "xlsx"
+EXPORTERS = {
+    "csv": write_csv,
+    "parquet": write_parquet,
+    "jsonl": write_jsonl,
+}
+
+
+def export_path(name, output_format):
+    return f"{os.path.splitext(read_file.output_filename(name))[0]}.{output_format}"
+
+
+def export(df, name, formats, history=None):
+    """Writes df's table in each of formats."""
+    if "parquet" in formats:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow, install it with pip install pyarrow") from None
+
+    table = export_table(df, read_file.cal, history)
+    for output_format in formats:
+        path = export_path(name, output_format)
+        EXPORTERS[output_format](table, path)
+        print(f"Wrote {path}")
@@ -0,0 +1,225 @@
+"""
+Local history of every weekly extract, so older months aren't lost.
+
+Runs with --ingest (or --history-months past five) add the extract to a
+SQLite database (history.db next to the program, or HISTORY_DB in the
+.env):
+
+    reports        one row per ingested extract, the same file and report
+                   date is only ingested once
+    inventory      stock levels and costs per SKU per report, append only
+    monthly_units  units sold per SKU per fiscal month, keyed on SKU and
+                   the month's start date. The newest report wins, so the
+                   current month holds month-to-date until it closes.
+
+Units sold for a SKU over the 18 fiscal months up to a report date (the
+most recent Sunday by default) is one index range scan:
+
+    python3 history.py SKU [months] [MM/DD/YYYY]
+
+The datasheet can show months older than its five with --history-months.
+"""
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import read_file
+from column_writer import pandas_na, write_general
+from parse_cache import file_hash
+from report_spec import plan
+from styles import get_format
+
+DEFAULT_HISTORY_DB = "history.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    raw_hash TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL,
+    UNIQUE (name, report_date, raw_hash)
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    report_id INTEGER NOT NULL REFERENCES reports (id),
+    sku TEXT NOT NULL,
+    status_code TEXT,
+    units_avail INTEGER,
+    units_on_order INTEGER,
+    on_hand INTEGER,
+    unit_cost REAL,
+    ytd_units INTEGER
+);
+CREATE INDEX IF NOT EXISTS inventory_sku ON inventory (sku, report_id);
+CREATE TABLE IF NOT EXISTS monthly_units (
+    name TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    period TEXT NOT NULL,
+    label TEXT NOT NULL,
+    units INTEGER,
+    report_date TEXT NOT NULL,
+    PRIMARY KEY (name, sku, period)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS monthly_units_period ON monthly_units (name, period);
+"""
+
+# report spec ids of the month columns, 0 is this month's MTD
+MONTH_COLUMNS = {0: "mtd_units", -1: "month_1", -2: "month_2", -3: "month_3", -4: "month_4", -5: "month_5"}
+
+
+def _sql_number(value, na=None):
+    """value as a number, None for NULL, text that isn't a number is dropped."""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    if value is None or value is na or value != value:
+        return None
+    return value
+
+
+def _sql_numbers(values):
+    na = pandas_na()
+    return [_sql_number(value, na) for value in values]
+
+
+def _sql_text(values):
+    na = pandas_na()
+    return [None if value is None or value is na or value != value else str(value) for value in values]
+
+
+def connect(path=None):
+    # batch workers ingest at the same time, wait for each other's writes
+    conn = sqlite3.connect(path or os.getenv("HISTORY_DB", DEFAULT_HISTORY_DB), timeout=60)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def ingest(df, name, calendar, raw_path, conn=None):
+    """
+    Adds df (clean_spreadsheet's output for raw_path) to the history.
+    Returns False if this extract was already ingested for this report date.
+    """
+    return ingest_columns([values.tolist() for _, values in df.items()], name, calendar, raw_path, conn)
+
+
+def ingest_columns(columns, name, calendar, raw_path, conn=None):
+    """ingest for clean_spreadsheet's columns as lists of values."""
+    conn = conn or connect()
+    report = plan()
+    column = lambda id: columns[report.position(id)]  # noqa: E731
+    rows = len(columns[0])
+    report_date = calendar.report_date.strftime("%Y-%m-%d")
+    raw_hash = file_hash(raw_path).hexdigest()
+
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO reports (name, report_date, raw_hash, rows, ingested_at) VALUES (?, ?, ?, ?, ?)",
+            (name, report_date, raw_hash, rows, datetime.now().isoformat(timespec="seconds")))
+        if cursor.rowcount == 0:
+            print(f"{raw_path} is already in the history for {report_date}")
+            return False
+        report_id = cursor.lastrowid
+
+        skus = [str(sku) for sku in column("sku")]
+        conn.executemany("INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?, ?)", zip(
+            [report_id] * rows, skus, _sql_text(column("status")),
+            _sql_numbers(column("units_avail")), _sql_numbers(column("units_on_order")), _sql_numbers(column("on_hand")),
+            _sql_numbers(column("unit_cost")), _sql_numbers(column("ytd_units"))))
+
+        # months already closed get their final numbers, the newest report wins
+        for relative, (start, label) in calendar.get_relative_periods().items():
+            conn.executemany("""
+                INSERT INTO monthly_units VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name, sku, period) DO UPDATE SET units = excluded.units, label = excluded.label,
+                    report_date = excluded.report_date
+                WHERE excluded.report_date >= monthly_units.report_date
+            """, zip([name] * rows, skus, [start.strftime("%Y-%m-%d")] * rows, [label] * rows,
+                     _sql_numbers(column(MONTH_COLUMNS[relative])), [report_date] * rows))
+
+    print(f"Added {rows} SKUs to the history for {report_date}")
+    return True
+
+
+def units_history(sku, months=18, name=None, calendar=None, conn=None):
+    """
+    Units sold for sku over the months fiscal months up to calendar's report
+    date (read_file.cal's when None), newest first, as (period, label, units).
+    Months missing from the history have units None.
+    """
+    conn = conn or connect()
+    calendar = calendar or read_file.cal
+    periods = [(start.strftime("%Y-%m-%d"), label) for start, label in calendar.get_relative_periods(months - 1).values()]
+    stored = dict(conn.execute(
+        "SELECT period, units FROM monthly_units WHERE name = ? AND sku = ? AND period BETWEEN ? AND ?",
+        (name or os.getenv("NAME"), str(sku), periods[-1][0], periods[0][0])).fetchall())
+    return [(period, label, stored.get(period)) for period, label in periods]
+
+
+def _period_header(start, label):
+    # fiscal months can start in the month before, so date the header by the middle of the month
+    return f"{label} {(start + timedelta(days=14)):%y}"
+
+
+def history_columns(df, name, calendar, months, conn=None):
+    """
+    Units per SKU of df for the fiscal months before the five the datasheet
+    already shows, back to month -months. Columns are oldest last.
+    """
+    import pandas as pd
+    conn = conn or connect()
+    periods = [period for relative, period in calendar.get_relative_periods(months).items() if relative < -5]
+    if not periods:
+        return pd.DataFrame(index=df.index)
+
+    starts = [start.strftime("%Y-%m-%d") for start, _ in periods]
+    rows = conn.execute(
+        f"SELECT sku, period, units FROM monthly_units WHERE name = ? AND period IN ({', '.join('?' * len(starts))})",
+        [name] + starts).fetchall()
+    units = pd.DataFrame(rows, columns=["sku", "period", "units"]).pivot(index="sku", columns="period", values="units")
+
+    history = units.reindex(index=df.iloc[:, plan().position("sku")].astype(str), columns=starts)
+    history.index = df.index
+    history.columns = [_period_header(start, label) for start, label in periods]
+    return history
+
+
+def write_history_columns(workbook, worksheet, history, first_row, data_row=None):
+    """
+    Writes the history columns to the right of the datasheet, styled like
+    the month columns. Headers go above first_row and the values from
+    data_row down, first_row unless only later rows are written.
+    """
+    report = plan()
+    first_col = len(report.layout)
+    width, style, _ = report.layout[report.index("month_1")]
+    for offset, (header, values) in enumerate(history.items()):
+        col = first_col + offset
+        worksheet.write(first_row - 2, col, "", get_format(workbook, "header_top"))
+        worksheet.write(first_row - 1, col, header, get_format(workbook, "header_bottom"))
+        worksheet.set_column(col, col, width, get_format(workbook, style))
+        write_general(worksheet, col, values, first_row if data_row is None else data_row)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 history.py SKU [months] [MM/DD/YYYY]")
+        sys.exit(1)
+    read_file.load_environment()
+    months = int(sys.argv[2]) if len(sys.argv) > 2 else 18
+    if len(sys.argv) > 3:
+        read_file.cal.set_report_date(sys.argv[3])
+
+    for period, label, units in units_history(sys.argv[1], months):
+        print(f"{period}  {label:<4}{'' if units is None else units:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Derived metrics worked out in NumPy instead of left to Excel.
+
+compute_metrics evaluates every formula column of the report spec, and the
+totals and week counts add_extra_info writes above the table, for the
+whole sheet at once. Columns are looked up by their id in the spec, and
+only the default spec's formulas can be worked out here.
+It follows what Excel does with the cells pandas writes: blanks count as 0,
+text that reads as a number is used as one and any other text gives
+#VALUE!, which then carries through to the totals.
+
+write_equations uses the results in the "cached" metrics mode (formulas
+stay live but are saved with their results, so the file opens without a
+full recalculation) and in the "values" mode (plain numbers, no formulas).
+Both bound the totals to the rows that hold data instead of the whole
+column.
+"""
+import numpy as np
+import pandas as pd
+
+import read_file
+from report_spec import default_plan, plan
+
+METRIC_MODES = ["formulas", "cached", "values"]
+
+VALUE_ERROR = "#VALUE!"
+DIV_ERROR = "#DIV/0!"
+
+
+def _column(df, id):
+    """Values of the df column that is the spec's column id."""
+    return df.iloc[:, plan().position(id)]
+
+
+def check_formulas(report):
+    """Raises ValueError if report has a formula compute_metrics doesn't work out."""
+    known = default_plan().formula_texts
+    for id, formula in report.formula_texts.items():
+        if known.get(id) != formula:
+            raise ValueError(f"The report spec's {id!r} formula can only be worked out by Excel, use --metrics formulas "
+                             "and leave out --formats and --consolidate")
+
+
+def excel_numbers(values):
+    """
+    Returns (numbers, errors) for a column the way Excel reads it back:
+    numbers as they are, blanks as 0, numeric text converted and other text
+    (including pandas' "inf") flagged as #VALUE!.
+    """
+    blank = values.isna().to_numpy()
+    if values.dtype.kind in "iuf":
+        numbers = values.to_numpy(dtype=float, copy=True)
+    else:
+        blank = blank | (values == "").to_numpy()
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, copy=True)
+
+    errors = np.where(~blank & ~np.isfinite(numbers), VALUE_ERROR, None)
+    numbers[blank | ~np.isfinite(numbers)] = 0.0
+    return numbers, errors
+
+
+def _first_error(*errors):
+    """Error each cell shows, Excel reports the first one it runs into."""
+    result = np.full(len(errors[0]), None, dtype=object)
+    for error in reversed(errors):
+        result = np.where(error != None, error, result)  # noqa: E711
+    return result
+
+
+def _cells(numbers, errors):
+    """Numbers with error codes in place of the cells that error."""
+    cells = numbers.astype(object)
+    has_error = errors != None  # noqa: E711
+    cells[has_error] = errors[has_error]
+    return cells
+
+
+def _total(cells):
+    """SUM over a column of cells, the first error wins."""
+    for cell in cells:
+        if isinstance(cell, str):
+            return cell
+    return float(sum(cells))
+
+
+def compute_metrics(df, calendar):
+    """
+    Works out the formula columns for df (clean_spreadsheet's output) and
+    the cells add_extra_info writes. Returns a dict with "columns" (sheet
+    column index -> cells), "last_row" (last Excel row holding data) and the
+    header values.
+    """
+    report = plan()
+    check_formulas(report)
+    units_avail, units_avail_err = excel_numbers(_column(df, "units_avail"))
+    on_order, on_order_err = excel_numbers(_column(df, "units_on_order"))
+    on_hand, on_hand_err = excel_numbers(_column(df, "on_hand"))
+    cost, cost_err = excel_numbers(_column(df, "unit_cost"))
+    mtd, mtd_err = excel_numbers(_column(df, "mtd_units"))
+    last_month, last_month_err = excel_numbers(_column(df, "month_1"))
+    month_before, month_before_err = excel_numbers(_column(df, "month_2"))
+    ytd, ytd_err = excel_numbers(_column(df, "ytd_units"))
+
+    # what the Weeks in Month and Reporting Week cells work out from the dates add_extra_info writes
+    weeks_in_month = calendar.get_weeks_in_month()
+    reporting_week = calendar.get_reporting_week()
+
+    # Trending 2 Month RR, ROUNDDOWN of a whole number of days is a no-op
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trending = ((mtd / reporting_week) * weeks_in_month + last_month) / 2
+    div_err = np.full(len(df), DIV_ERROR if reporting_week == 0 else None, dtype=object)
+    trending_err = _first_error(mtd_err, div_err, last_month_err)
+
+    # WEEKS OH+OO, IF checks the run rate first
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weeks = np.where(trending == 0, 0.0, ((units_avail + on_order) / trending) * 4)
+    weeks_err = _first_error(trending_err, np.where(trending == 0, None, _first_error(units_avail_err, on_order_err)))
+
+    cells = {
+        "weeks_cover": _cells(weeks, weeks_err),
+        "on_hand_dollars": _cells(on_hand * cost, _first_error(on_hand_err, cost_err)),
+        "on_order_dollars": _cells(on_order * cost, _first_error(on_order_err, cost_err)),
+        "mtd_dollars": _cells(mtd * cost, _first_error(mtd_err, cost_err)),
+        "trending_rr": _cells(trending, trending_err),
+        "average_rr": _cells((last_month + month_before) / 2, _first_error(last_month_err, month_before_err)),
+        "ytd_dollars": _cells(ytd * cost, _first_error(ytd_err, cost_err)),
+    }
+    # only the formula columns the spec has, by sheet column
+    columns = {report.index(id): cells[id] for id in report.formula_texts}
+
+    total_on_hand = _total(cells["on_hand_dollars"])
+    total_on_order = _total(cells["on_order_dollars"])
+    total_mtd = _total(cells["mtd_dollars"])
+    both = _total([total_on_hand, total_on_order])
+    if isinstance(total_mtd, str):
+        run_rate = total_mtd
+    elif reporting_week == 0:
+        run_rate = DIV_ERROR
+    else:
+        run_rate = (total_mtd / reporting_week) * weeks_in_month
+
+    return {
+        "columns": columns,
+        "last_row": read_file.START_ROW + 1 + len(df),
+        "weeks_in_month": weeks_in_month,
+        "reporting_week": reporting_week,
+        "on_hand": total_on_hand,
+        "on_order": total_on_order,
+        "on_hand_and_order": both,
+        "mtd": total_mtd,
+        "run_rate": run_rate,
+    }
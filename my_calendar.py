@@ -3,6 +3,14 @@ from datetime import datetime, timedelta
 import os
 import json
 
+# fiscal months in a fiscal year, months before the calendar starts repeat its first year
+MONTHS_PER_YEAR = 12
+# label of the FISCAL_PERIODS entry giving the day after the calendar's last fiscal month
+END_LABEL = "End"
+
+BEFORE_CALENDAR = "The set report date is before the start of this fiscal year. Please either update the fiscal calendar or update the report date."
+AFTER_CALENDAR = "The set report date is after the end of the fiscal calendar. Please add the next fiscal year to FISCAL_PERIODS or update the report date."
+
 class My_Calendar:
     def __init__(self):
         # Set report date to most recent Sunday
@@ -20,8 +28,14 @@ class My_Calendar:
             (datetime(2025, 10, 26), "Nov"),
             (datetime(2025, 11, 23), "Dec")
         ]
+        # the day the calendar ends, None when its last fiscal year has 52 weeks
+        self.fiscal_end = None
+        self._index_periods()
 
+        self.reset_report_date()
 
+    def reset_report_date(self):
+        """Sets the report date back to the most recent Sunday."""
         today = datetime.today()
         days_since_sunday = (today.weekday() + 1) % 7  # weekday(): Mon=0, Sun=6
         last_sunday = today - timedelta(days=days_since_sunday)
@@ -29,39 +43,119 @@ class My_Calendar:
         self.report_date_str = self._format_date(last_sunday)
 
     def set_calendar(self, fiscal_periods_raw):
+        """
+        Loads FISCAL_PERIODS from JSON, either a list of ["YYYY-MM-DD", label]
+        pairs that can run over several fiscal years, or an object with one
+        such list per fiscal year: {"2025": [...], "2026": [...]}. A pair
+        labelled "End" gives the day after the last fiscal month, which a
+        53-week last year needs.
+        """
         fiscal_periods_list = json.loads(fiscal_periods_raw)
-        self.FISCAL_PERIODS = [(datetime.strptime(d, "%Y-%m-%d"), label) for d, label in fiscal_periods_list]
+        if isinstance(fiscal_periods_list, dict):
+            fiscal_periods_list = [period for year in fiscal_periods_list.values() for period in year]
+        fiscal_periods = sorted((datetime.strptime(d, "%Y-%m-%d"), label) for d, label in fiscal_periods_list)
+        if len({start for start, _ in fiscal_periods}) != len(fiscal_periods):
+            raise ValueError("FISCAL_PERIODS has two fiscal months starting on the same day.")
+        ends = [start for start, label in fiscal_periods if label == END_LABEL]
+        fiscal_periods = [(start, label) for start, label in fiscal_periods if label != END_LABEL]
+        if len(ends) > 1 or (ends and (not fiscal_periods or ends[0] <= fiscal_periods[-1][0])):
+            raise ValueError("FISCAL_PERIODS can have one \"End\", after the start of its last fiscal month.")
+        self.FISCAL_PERIODS = fiscal_periods
+        self.fiscal_end = ends[0] if ends else None
+        self._index_periods()
 
-    def get_relative_months(self):
-        starts = [d[0] for d in self.FISCAL_PERIODS]
-        idx = bisect.bisect_right(starts, self.report_date) - 1
+    def _index_periods(self):
+        """Sorted period starts, built once per calendar instead of on every lookup."""
+        self._starts = [start for start, _ in self.FISCAL_PERIODS]
+        # without an "End" the calendar's last fiscal year ends 52 weeks after it starts
+        self._end = self.fiscal_end or self._starts[max(len(self._starts) - MONTHS_PER_YEAR, 0)] + timedelta(weeks=52)
+        # NumPy copy for periods_for, made the first time it's needed so startup doesn't load NumPy
+        self._start_array = None
 
+    def _period_index(self, date):
+        """Index into FISCAL_PERIODS of the fiscal month holding date."""
+        idx = bisect.bisect_right(self._starts, date) - 1
         if idx < 0:
-            raise ValueError("The set report date is before the start of this fiscal year. Please either update the fiscal calendar or update the report date.")
+            raise ValueError(BEFORE_CALENDAR)
+        if date >= self._end:
+            raise ValueError(AFTER_CALENDAR)
+        return idx
+
+    def _back(self, idx):
+        """
+        FISCAL_PERIODS index and years back of period idx, which can be
+        negative. Months before the calendar are its first year repeated.
+        """
+        if idx >= 0:
+            return idx, 0
+        years_back, idx = divmod(idx, min(len(self.FISCAL_PERIODS), MONTHS_PER_YEAR))
+        return idx, years_back
+
+    def periods_for(self, dates):
+        """
+        Index into FISCAL_PERIODS of the fiscal month holding each of dates
+        (anything NumPy reads as datetime64), -1 for dates outside the
+        calendar. One search over the whole array instead of a lookup per
+        date.
+        """
+        import numpy as np
+        if self._start_array is None:
+            self._start_array = np.array(self._starts, dtype="datetime64[D]")
+
+        # period starts are midnight, so the day is enough
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        idx = np.searchsorted(self._start_array, dates, side="right") - 1
+        idx[np.isnat(dates) | (dates >= np.datetime64(self._end, "D"))] = -1
+        return idx
+
+    def get_relative_months(self):
+        idx = self._period_index(self.report_date)
 
         result = {}
         # Wrap around if going before the first month
         for i in range(1, 6):
-            relative_idx = (idx - i) % len(self.FISCAL_PERIODS)
+            relative_idx, _ = self._back(idx - i)
             result[-i] = self.FISCAL_PERIODS[relative_idx][1]
         return result
 
+    def get_relative_periods(self, count=5):
+        """
+        Start date and label of this fiscal month (0) and the count months
+        before it (-1, -2, ...). Months before the calendar starts are taken
+        as 52 weeks earlier per year back.
+        """
+        idx = self._period_index(self.report_date)
+
+        result = {}
+        for i in range(count + 1):
+            relative_idx, years_back = self._back(idx - i)
+            start, label = self.FISCAL_PERIODS[relative_idx]
+            result[-i] = (start + timedelta(weeks=52 * years_back), label)
+        return result
+
     def get_report_date_str(self) -> str:
         return self.report_date_str
 
     def get_next_fiscal_month(self):
-        starts = [d[0] for d in self.FISCAL_PERIODS]
-        idx = bisect.bisect_right(starts, self.report_date)
-        return self._format_date(self.FISCAL_PERIODS[idx][0])
+        idx = self._period_index(self.report_date) + 1
+        # the last month of the calendar runs to its end
+        next_month = self._starts[idx] if idx < len(self._starts) else self._end
+        return self._format_date(next_month)
 
     def get_this_fiscal_month(self):
+        return self._format_date(self._starts[self._period_index(self.report_date)])
 
-        starts = [d[0] for d in self.FISCAL_PERIODS]
-        idx = bisect.bisect_right(starts, self.report_date) - 1
-        if idx >= 0:
-            return self._format_date(self.FISCAL_PERIODS[idx][0])
-        else:
-            raise ValueError("The set report date is before the start of this fiscal year. Please either update the fiscal calendar or update the report date.")
+    def get_weeks_in_month(self):
+        """Weeks in the report date's fiscal month, the datasheet's "Weeks in Month"."""
+        idx = self._period_index(self.report_date)
+        end = self._starts[idx + 1] if idx + 1 < len(self._starts) else self._end
+        return (end - self._starts[idx]).days / 7
+
+    def get_reporting_week(self):
+        """Weeks from the start of the fiscal month to the report date, the datasheet's "Reporting Week"."""
+        start = self._starts[self._period_index(self.report_date)]
+        # the date alone, a report date from reset_report_date carries the time of day
+        return (self.report_date.date() - start.date()).days / 7
 
     def set_report_date(self, date: str):
         """
@@ -0,0 +1,214 @@
+"""
+Vectorized numeric conversion of raw extract tokens.
+
+parse_line_by_format tests every whitespace separated token against the
+NUMBER pattern and converts the ones that match with
+convert_accounting_number, one Python call per token. Here a whole column
+of tokens is laid out as one character stream and converted with NumPy:
+digits are weighted by their place and summed, so numbers and
+accounting-style negatives ('12-') land in int64/float64 arrays without
+becoming Python objects. Tokens that aren't numbers keep their text.
+
+    python3 benchmark.py --tokens [count]
+
+measures the cost per token of both ways.
+"""
+import numpy as np
+
+from read_file import NUMBER, convert_accounting_number
+
+# longest digit runs that convert exactly to an int64 / float64
+MAX_INT_DIGITS = 18
+MAX_FLOAT_DIGITS = 15
+POWERS_OF_TEN = 10 ** np.arange(MAX_INT_DIGITS + 1, dtype=np.int64)
+INT64_MIN, INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+# a sign or trailing minus and the digits, longer tokens are never converted exactly
+MAX_TOKEN_LENGTH = MAX_INT_DIGITS + 1
+# tokens are read in groups up to these lengths, so the odd long token doesn't widen the
+# character matrix of the many short ones (most of an extract's numbers are quantities)
+TOKEN_GROUPS = (4, 10, MAX_TOKEN_LENGTH)
+
+SPACE, PLUS, MINUS, DOT, ZERO, NINE = (ord(c) for c in " +-.09")
+ROW_END = ord("\n")
+
+# what a parsed cell holds. OBJECT cells keep their value as a Python object (str, huge ints)
+OBJECT, INT, FLOAT, MISSING = range(4)
+
+
+def as_bytes(chars):
+    """Turns a (rows, width) ASCII code matrix back into an array of bytes."""
+    if not chars.shape[1]:
+        return np.full(len(chars), b"")
+    return np.ascontiguousarray(chars).view(f"S{chars.shape[1]}").reshape(len(chars))
+
+
+def as_objects(chars):
+    """Turns a (rows, width) ASCII code matrix into an object array of str."""
+    return as_bytes(chars).astype(str).astype(object)
+
+
+def token_text(stream, starts, ends):
+    """Cuts the given tokens out of the character stream as an object array of str."""
+    if not len(starts):
+        return np.empty(0, dtype=object)
+    lengths = ends - starts
+    cols = np.arange(lengths.max())
+    chars = stream[np.minimum(starts[:, None] + cols, len(stream) - 1)]
+    chars[cols >= lengths[:, None]] = 0
+    return as_objects(chars)
+
+
+def _read_numbers(padded, starts, length):
+    """
+    Reads the tokens of the given starts and lengths (all at most
+    MAX_TOKEN_LENGTH) from the padded stream. Returns (numeric, exact,
+    is_float, values): which tokens are numbers, which of those convert
+    exactly, which are floats, and the exact ones' values as float64 for
+    floats and int64 otherwise, in one int64 array and one float64 array.
+    """
+    width = max(int(length.max(initial=0)), 1)
+    places = np.arange(width)[:, None]
+    # every token is read a full width from a window over the padded stream, the characters
+    # past its end belong to the next token and are masked out by body below
+    chars = np.ascontiguousarray(np.lib.stride_tricks.sliding_window_view(padded, width)[starts].T)
+    tokens = np.arange(len(starts))
+
+    leading = chars[0]
+    signed = (leading == PLUS) | (leading == MINUS)
+    trailing = (length > 0) & (chars[np.maximum(length - 1, 0), tokens] == MINUS)
+    body_length = length - signed - trailing
+    body = (places >= signed) & (places < length - trailing)
+
+    digit = (chars >= ZERO) & (chars <= NINE) & body
+    dot = (chars == DOT) & body
+    digits = digit.sum(axis=0)
+    dots = dot.sum(axis=0)
+
+    # the part between the optional sign and trailing minus must be \d+(\.\d+)?
+    numeric = (
+        (body_length > 0)
+        & (digits + dots == body_length)
+        & (dots <= 1)
+        & (chars[signed.astype(np.intp), tokens] != DOT)
+        & (chars[np.maximum(length - trailing - 1, 0), tokens] != DOT)
+        # '-5-' is left as text by convert_accounting_number
+        & ~(signed & trailing)
+    )
+    is_float = numeric & (dots == 1)
+    exact = numeric & (digits <= np.where(is_float, MAX_FLOAT_DIGITS, MAX_INT_DIGITS))
+
+    # the digits are read left to right, and the ones after the dot give
+    # the power of ten a float is divided by
+    mantissa = np.zeros(len(starts), dtype=np.int64)
+    decimals = np.zeros(len(starts), dtype=np.intp)
+    after_dot = np.zeros(len(starts), dtype=bool)
+    for place in range(width):
+        mantissa = np.where(digit[place], mantissa * 10 + (chars[place] - ZERO), mantissa)
+        decimals += digit[place] & after_dot
+        after_dot |= dot[place]
+
+    sign = np.where(trailing | (leading == MINUS), -1, 1)
+    ints = mantissa * sign
+    # a mantissa under 2**53 divided by an exact power of ten rounds the same as float()
+    floats = np.where(exact & is_float, mantissa / POWERS_OF_TEN[np.where(exact, decimals, 0)], 0) * sign
+    return numeric, exact, is_float, ints, floats
+
+
+def convert_tokens(stream, starts, ends, texts=None):
+    """
+    Vectorized convert_accounting_number over the tokens of a character
+    stream. Numeric and accounting-style negative tokens ('12-') are parsed
+    into int64/float64 straight from the digits, everything else is kept
+    as str, taken from texts (an object array of the tokens) when the
+    caller has them already.
+
+    Returns (kind, ints, floats, objects), one entry per token, where kind
+    says which of the three arrays holds the token's value.
+    """
+    count = len(starts)
+    kind = np.full(count, OBJECT, dtype=np.int8)
+    ints = np.zeros(count, dtype=np.int64)
+    floats = np.zeros(count, dtype=np.float64)
+    objects = np.empty(count, dtype=object)
+    if not count:
+        return kind, ints, floats, objects
+
+    lengths = ends - starts
+    padded = np.concatenate([stream, np.zeros(MAX_TOKEN_LENGTH, dtype=stream.dtype)])
+    converted = np.zeros(count, dtype=bool)
+    # text, and numbers too long to convert exactly, keep their Python value
+    unsure = lengths > MAX_TOKEN_LENGTH
+    # only tokens up to MAX_TOKEN_LENGTH can be numbers that convert exactly
+    shortest = 0
+    for longest in TOKEN_GROUPS:
+        group = np.flatnonzero((lengths > shortest) & (lengths <= longest))
+        shortest = longest
+        if not len(group):
+            continue
+        numeric, exact, is_float, group_ints, group_floats = _read_numbers(padded, starts[group], lengths[group])
+        ints_at = exact & ~is_float
+        floats_at = exact & is_float
+        kind[group[ints_at]] = INT
+        ints[group[ints_at]] = group_ints[ints_at]
+        kind[group[floats_at]] = FLOAT
+        floats[group[floats_at]] = group_floats[floats_at]
+        converted[group[exact]] = True
+        unsure[group[numeric & ~exact]] = True
+
+    rest = np.flatnonzero(~converted)
+    objects[rest] = token_text(stream, starts[rest], ends[rest]) if texts is None else texts[rest]
+    for i in np.flatnonzero(unsure):
+        objects[i] = convert_token(objects[i])
+
+    return kind, ints, floats, objects
+
+
+def set_cell(column, row, value):
+    """Writes one Python value, as parse_line_by_format produces it, into a converted column."""
+    kind, ints, floats, objects = column
+    if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+        kind[row], ints[row] = INT, value
+    elif type(value) is float:
+        kind[row], floats[row] = FLOAT, value
+    else:
+        kind[row], objects[row] = OBJECT, value
+
+
+def python_values(kind, ints, floats, objects):
+    """A converted column as an object array of the Python values, None where it's MISSING."""
+    values = objects.copy()
+    values[kind == INT] = ints[kind == INT].tolist()
+    values[kind == FLOAT] = floats[kind == FLOAT].tolist()
+    values[kind == MISSING] = None
+    return values
+
+
+def convert_token(token):
+    """What parse_line_by_format makes of one token."""
+    return convert_accounting_number(token) if NUMBER.fullmatch(token) else token
+
+
+def convert_column(tokens):
+    """
+    Converts a column of tokens (a list or array of str) in one pass, the
+    same way convert_token converts each one. Returns (kind, ints, floats,
+    objects) like convert_tokens.
+    """
+    tokens = list(tokens)
+    lengths = np.fromiter(map(len, tokens), dtype=np.intp, count=len(tokens))
+    ends = np.cumsum(lengths + 1) - 1
+    starts = ends - lengths
+    # a line break after every token keeps them apart in the stream
+    text = "\n".join(tokens) + "\n"
+    # every non-ASCII character becomes one '?', so the tokens stay in place
+    stream = np.frombuffer(text.encode("ascii", "replace"), dtype=np.uint8)
+    texts = np.empty(len(tokens), dtype=object)
+    texts[:] = tokens
+    converted = convert_tokens(stream, starts, ends, texts)
+    if text.isascii():
+        return converted
+
+    # tokens holding a '?', mostly the ones that had non-ASCII characters, are converted one at a time
+    for i in np.unique(np.searchsorted(ends, np.flatnonzero(stream == ord("?")))):
+        set_cell(converted, i, convert_token(tokens[i]))
+    return converted
@@ -0,0 +1,163 @@
+"""
+Renders the datasheet of a very large extract in several processes.
+
+    python3 read_file.py --write-workers N
+
+xlsxwriter writes one cell at a time on one core, so the rows are split
+into N ranges. The first range is written by this process into the
+workbook with the headers, summary cells and logos, the others by worker
+processes into workbooks of their own, each built with the same layout so
+every column format gets the same style index. Their rows are then
+spliced into the datasheet's sheet in order, which gives the same single
+sheet the serial write does: the summary formulas already total whole
+columns, and every row's formulas point at its own row. Strings in the
+spliced rows are stored in the cells instead of the shared string table,
+which Excel reads the same way.
+
+Ranges start on a multiple of ROW_BLOCK rows so the spans xlsxwriter
+works out for each block of rows come out as in one workbook. Extracts
+under MIN_PART_ROWS rows a process are written the usual way.
+"""
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import read_file
+from batch import init_worker
+from profiler import stage
+
+# fewest rows worth a process of its own, starting one costs about as much as writing these
+MIN_PART_ROWS = 10000
+
+# xlsxwriter works out the row spans in blocks of 16 rows
+ROW_BLOCK = 16
+
+SHEET_PATH = "xl/worksheets/sheet1.xml"
+SHARED_STRINGS_PATH = "xl/sharedStrings.xml"
+
+SHARED_STRING = re.compile(r'<si>(.*?)</si>', re.S)
+STRING_CELL = re.compile(r'<c r="([A-Z]+\d+)"( s="\d+")? t="s"><v>(\d+)</v></c>')
+DIMENSION = re.compile(r'<dimension ref="([A-Z]+\d+:[A-Z]+)\d+"/>')
+
+# bytes copied at a time into the finished workbook
+COPY_BYTES = 1024 * 1024
+
+
+def part_bounds(rows, parts, data_row=read_file.START_ROW + 1):
+    """(start, stop) of each part's rows of the DataFrame, later parts starting on a ROW_BLOCK sheet row."""
+    starts = [0]
+    for part in range(1, parts):
+        sheet_row = data_row + rows * part // parts
+        starts.append(min(rows, sheet_row + -sheet_row % ROW_BLOCK - data_row))
+    starts.append(rows)
+    return [(start, stop) for start, stop in zip(starts, starts[1:]) if stop > start]
+
+
+def part_count(rows, workers):
+    return max(1, min(workers, rows // MIN_PART_ROWS))
+
+
+def part_results(results, start, stop):
+    """compute_metrics' results with the columns cut down to one part, the totals are the whole sheet's."""
+    if results is None:
+        return None
+    return {**results, "columns": {col: values[start:stop] for col, values in results["columns"].items()}}
+
+
+def inline_strings(rows_xml, shared_strings):
+    """rows_xml with shared string cells turned into in-line strings, <si> contents go into <is> as they are."""
+    strings = SHARED_STRING.findall(shared_strings)
+    return STRING_CELL.sub(lambda cell: f'<c r="{cell[1]}"{cell[2] or ""} t="inlineStr"><is>{strings[int(cell[3])]}</is></c>', rows_xml)
+
+
+def render_part(df, name, metrics, history, results, data_row, folder, part):
+    """
+    Worker: writes df's rows into a workbook laid out like the datasheet
+    from sheet row data_row down, and saves its <row> elements from there
+    to a file in folder. Returns the file's path.
+    """
+    path = os.path.join(folder, f"part{part}.xlsx")
+    workbook = read_file.new_workbook(path, metrics)
+    # no logos, images don't take style indices and only the data rows are kept
+    read_file.write_sheet(workbook, df, name, {}, metrics, history, results, data_row)
+    workbook.close()
+
+    with zipfile.ZipFile(path) as archive:
+        sheet = archive.read(SHEET_PATH).decode("utf-8")
+        shared_strings = archive.read(SHARED_STRINGS_PATH).decode("utf-8") if SHARED_STRINGS_PATH in archive.namelist() else ""
+    os.remove(path)
+
+    # Excel rows are 1-indexed
+    rows_xml = sheet[sheet.index(f'<row r="{data_row + 1}"'):sheet.index("</sheetData>")]
+    fragment = os.path.join(folder, f"part{part}.xml")
+    with open(fragment, "w", encoding="utf-8") as file:
+        file.write(inline_strings(rows_xml, shared_strings))
+    return fragment
+
+
+def assemble(base_path, fragments, last_row, output_path):
+    """Copies the base workbook to output_path with fragments' rows added to the end of its sheet."""
+    with zipfile.ZipFile(base_path) as base, zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as output:
+        for info in base.infolist():
+            if info.filename != SHEET_PATH:
+                output.writestr(info, base.read(info.filename))
+                continue
+
+            sheet = base.read(SHEET_PATH).decode("utf-8")
+            head, tail = sheet.split("</sheetData>", 1)
+            # the dimension covers every part's rows
+            head = DIMENSION.sub(lambda dimension: f'<dimension ref="{dimension[1]}{last_row}"/>', head, count=1)
+            with output.open(info, "w", force_zip64=True) as entry:
+                entry.write(head.encode("utf-8"))
+                for fragment in fragments:
+                    with open(fragment, "rb") as file:
+                        shutil.copyfileobj(file, entry, COPY_BYTES)
+                entry.write(f"</sheetData>{tail}".encode("utf-8"))
+
+
+def write_parallel(df, name=None, logos=read_file.LOGOS, metrics="formulas", history=None, workers=2):
+    """
+    Writes the datasheet for df like write_equations, rendering its rows in
+    up to workers processes. Returns False, having written nothing, when
+    df is too small to be worth splitting.
+    """
+    name = name or os.getenv("NAME")
+    bounds = part_bounds(len(df), part_count(len(df), workers))
+    if len(bounds) < 2:
+        return False
+
+    results = None
+    if metrics != "formulas":
+        from metrics import compute_metrics
+        with stage("metrics", rows=len(df)):
+            results = compute_metrics(df, read_file.cal)
+
+    def part(start, stop):
+        rows = df.iloc[start:stop]
+        part_history = None if history is None else history.iloc[start:stop]
+        return rows, name, metrics, part_history, part_results(results, start, stop), read_file.START_ROW + 1 + start
+
+    print(f"Writing {len(df):,} rows in {len(bounds)} parts")
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(read_file.output_filename(name)))) as folder:
+        with ProcessPoolExecutor(max_workers=len(bounds) - 1, initializer=init_worker, initargs=(read_file.cal,)) as pool:
+            futures = [pool.submit(render_part, *part(start, stop), folder, number)
+                       for number, (start, stop) in enumerate(bounds[1:], start=1)]
+
+            # the first part goes in the workbook with everything above the data while the workers run
+            base_path = os.path.join(folder, "base.xlsx")
+            workbook = read_file.new_workbook(base_path, metrics)
+            rows, _, _, part_history, first_results, _ = part(*bounds[0])
+            read_file.write_sheet(workbook, rows, name, logos, metrics, part_history, first_results)
+            with stage("save", rows=len(rows)):
+                workbook.close()
+
+            with stage("parts", rows=len(df) - len(rows)):
+                fragments = [future.result() for future in futures]
+
+        with stage("assemble", rows=len(df)):
+            # Excel rows are 1-indexed
+            assemble(base_path, fragments, read_file.START_ROW + 1 + len(df), read_file.output_filename(name))
+    return True
@@ -0,0 +1,229 @@
+"""
+Cache of cleaned DataFrames so a rerun on the same extract skips parsing.
+
+Entries are Parquet files named after a hash of the raw file's contents, the
+parser version, the report spec and the fiscal calendar (the month columns
+are named from it). Once the cache folder grows past CACHE_MAX_MB the least recently used
+entries are deleted. pyarrow is optional, without it nothing is cached.
+Each entry keeps validate's reasons for the lines it left out in its
+Parquet metadata, so a cached rerun writes the same quarantine file.
+
+The cache lives in the CACHE_DIR folder (default "cache") next to the
+program and is bypassed with --no-cache or emptied with --clear-cache.
+pandas is only imported once something is read or written, so history
+can hash raw files with file_hash without loading it.
+"""
+import hashlib
+import json
+import os
+
+import read_file
+from profiler import stage
+from report_spec import plan
+
+DEFAULT_CACHE_DIR = "cache"
+DEFAULT_CACHE_MAX_MB = 500
+
+# raw file is hashed in blocks of this many bytes
+HASH_BLOCK = 1 << 20
+
+# Parquet metadata key holding the quarantined lines as [[line, reason], ...]
+QUARANTINE_KEY = b"quarantine"
+
+# suffixes for the extra columns a mixed object column is split into
+INT_SUFFIX = "#int"
+FLOAT_SUFFIX = "#float"
+
+
+def cache_dir():
+    return os.getenv("CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+def cache_max_bytes():
+    return int(float(os.getenv("CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest
+
+
+def cache_key(raw_path, calendar):
+    from columnar_parse import PARSER_VERSION
+    digest = file_hash(raw_path)
+    periods = [(start.strftime("%Y-%m-%d"), label) for start, label in calendar.FISCAL_PERIODS]
+    digest.update(json.dumps([PARSER_VERSION, plan().fingerprint, periods, calendar.get_relative_months()],
+                             sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def split_objects(df):
+    """
+    Parquet columns hold one type, but Status Code and Unit Cost mix numbers
+    and text. Each object column (or category of mixed values) is split into
+    a text column plus int and float columns, with nulls where a row holds
+    the other type.
+    """
+    import pandas as pd
+    table = {}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.dtype == object:
+            values = values.astype(object)
+        if values.dtype != object:
+            table[column] = values
+            continue
+
+        is_int = values.map(lambda value: isinstance(value, int))
+        is_float = values.map(lambda value: isinstance(value, float))
+        table[column] = values.where(~(is_int | is_float)).astype("string")
+        table[column + INT_SUFFIX] = values.where(is_int).astype("Int64")
+        table[column + FLOAT_SUFFIX] = values.where(is_float).astype("Float64")
+    return pd.DataFrame(table)
+
+
+def join_objects(table):
+    """Undoes split_objects, giving back the exact Python values and the schema's dtypes."""
+    import pandas as pd
+    from schema import apply_schema
+    df = {}
+    for column in table.columns:
+        if column.endswith(INT_SUFFIX) or column.endswith(FLOAT_SUFFIX):
+            continue
+        if column + INT_SUFFIX not in table.columns:
+            df[column] = table[column]
+            continue
+
+        text = table[column].tolist()
+        ints = table[column + INT_SUFFIX].tolist()
+        # missing values were stored as float NaN, astype brings them back as nan
+        floats = table[column + FLOAT_SUFFIX].astype(float).tolist()
+
+        merged = []
+        for value, integer, decimal in zip(text, ints, floats):
+            if value is not pd.NA:
+                merged.append(value)
+            elif integer is not pd.NA:
+                merged.append(integer)
+            else:
+                merged.append(decimal)
+        df[column] = pd.Series(merged, dtype=object)
+    # clean_spreadsheet's column labels come from a rename, so they're an object index
+    return apply_schema(pd.DataFrame(df, columns=pd.Index(list(df), dtype=object)))
+
+
+def load(key):
+    """The cached DataFrame and quarantine reasons for key, None when it isn't cached."""
+    path = os.path.join(cache_dir(), f"{key}.parquet")
+    if not os.path.exists(path):
+        return None
+
+    # touch it so eviction drops the least recently used entries first
+    os.utime(path)
+    import pandas as pd
+    import pyarrow.parquet as pq
+    lines = json.loads((pq.read_schema(path).metadata or {}).get(QUARANTINE_KEY, b"[]"))
+    reasons = pd.Series([reason for _, reason in lines], index=[line for line, _ in lines], dtype=object)
+    return join_objects(pd.read_parquet(path)), reasons
+
+
+def store(key, df, reasons):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(cache_dir(), exist_ok=True)
+    path = os.path.join(cache_dir(), f"{key}.parquet")
+    table = pa.Table.from_pandas(split_objects(df), preserve_index=False)
+    lines = json.dumps([[int(line), reason] for line, reason in reasons.items()]).encode()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), QUARANTINE_KEY: lines})
+    # write then rename so a batch worker never reads a half written entry
+    pq.write_table(table, f"{path}.{os.getpid()}.tmp")
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    evict()
+
+
+def evict(max_bytes=None):
+    """Deletes the least recently used entries until the cache fits in max_bytes."""
+    max_bytes = cache_max_bytes() if max_bytes is None else max_bytes
+    entries = []
+    for entry in os.scandir(cache_dir()):
+        if entry.name.endswith(".parquet"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # another worker already evicted it
+            pass
+        total -= size
+
+
+def clear_cache():
+    if not os.path.isdir(cache_dir()):
+        print(f"No cache to clear at {cache_dir()}")
+        return
+    removed = 0
+    for entry in os.scandir(cache_dir()):
+        if entry.name.endswith(".parquet"):
+            os.remove(entry.path)
+            removed += 1
+    print(f"Cleared {removed} cached files from {cache_dir()}")
+
+
+def cached_clean_spreadsheet(raw_path, use_cache=True, workers=None):
+    """
+    Returns clean_spreadsheet's output for raw_path, from the cache when
+    possible. workers is passed on to parse_file.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        if use_cache:
+            print("pyarrow not installed, parsing without the cache")
+        use_cache = False
+
+    from validate import write_quarantine
+    df, reasons = _cached_parse(raw_path, workers) if use_cache else _parse_and_clean(raw_path, workers)
+    # the quarantine file is named after the report date, the cache entry isn't
+    write_quarantine(raw_path, reasons)
+    if df.empty:
+        print(f"No lines of {os.path.basename(raw_path)} passed the checks, the datasheet has 0 rows")
+    return df
+
+
+def _cached_parse(raw_path, workers):
+    """_parse_and_clean's result for raw_path, from the cache or stored in it."""
+    with stage("cache load") as record:
+        key = cache_key(raw_path, read_file.cal)
+        cached = load(key)
+        record["rows"] = None if cached is None else len(cached[0])
+    if cached is not None:
+        print(f"Loaded {raw_path} from cache")
+        return cached
+
+    df, reasons = _parse_and_clean(raw_path, workers)
+    with stage("cache store", rows=len(df)):
+        store(key, df, reasons)
+    return df, reasons
+
+
+def _parse_and_clean(raw_path, workers):
+    """clean_spreadsheet's output for raw_path without the lines failing validate's checks, and their reasons."""
+    from columnar_parse import parse_file
+    from validate import split_invalid
+    with stage("parse") as record:
+        # only the fields the report spec reads
+        df = parse_file(raw_path, workers=workers, keep=plan().fields)
+        record["rows"] = len(df)
+    with stage("validate", rows=len(df)):
+        # bad lines never reach the cache
+        df, reasons = split_invalid(df)
+    with stage("clean", rows=len(df)):
+        return read_file.clean_spreadsheet(df), reasons
@@ -0,0 +1,214 @@
+"""
+Pipelined mode: reads, parses and writes the extract at the same time.
+
+    python3 read_file.py --pipeline [--workers N]
+
+--stream takes each chunk through reading, parsing, cleaning and writing
+before it reads the next, so the disk waits on the CPU and the other way
+round. Here the stages run side by side:
+
+    reader thread     reads chunks of STREAM_CHUNK_LINES lines
+    parser threads    parse, check and clean each chunk (streaming's
+                      clean_chunk), one per --workers (defaults to all
+                      cores), in worker processes when there's more than one
+    writer            the main thread, writes the cleaned chunks in file order
+                      to streaming's constant_memory workbook
+
+The stages hand chunks on through queues holding at most QUEUE_CHUNKS, a
+stage that gets ahead waits for the next one to catch up, so memory stays
+bounded like --stream. The workbook and quarantine file come out the same
+as --stream's.
+
+At the end it prints the rows and megabytes per second and how busy each
+stage was. Overlap is the stages' busy time added up over the wall time:
+1.0x is no better than one after another. Python code only runs in one
+thread at a time, so in one process the stages overlap where the work is
+outside Python (reading the file, NumPy in the parser). With --workers
+over 1 the parsing runs in other processes beside the writing.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import read_file
+from batch import init_worker
+from columnar_parse import read_line_chunks
+from profiler import stage
+from streaming import STREAM_CHUNK_LINES, clean_chunk, open_sheet, write_chunk
+from validate import write_quarantine
+
+# chunks each queue holds before the stage filling it waits
+QUEUE_CHUNKS = 4
+
+# seconds a stage waits on a queue before checking whether another stage failed
+POLL_SECONDS = 0.1
+
+# put on a queue when a stage has nothing more to hand on
+DONE = None
+
+
+class Pipeline:
+    """The queues, busy times and first error shared by a run's threads."""
+
+    def __init__(self, parsers):
+        self.lines = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.cleaned = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.parsers = parsers
+        self.busy = {"read": 0.0, "parse": 0.0, "write": 0.0}
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+        self.error = None
+
+    def add_busy(self, name, seconds):
+        with self.lock:
+            self.busy[name] += seconds
+
+    def fail(self, error):
+        with self.lock:
+            self.error = self.error or error
+        self.failed.set()
+
+    def put(self, chunks, item):
+        """Puts item on chunks, waiting while it's full. False if another stage failed first."""
+        while not self.failed.is_set():
+            try:
+                chunks.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, chunks):
+        """
+        The next item on chunks. Once the run is stopping, raises the failed
+        stage's error or gives DONE if the writer stopped it.
+        """
+        while not self.failed.is_set():
+            try:
+                return chunks.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                pass
+        if self.error is not None:
+            raise self.error
+        return DONE
+
+
+def read_stage(pipeline, raw_path, chunk_lines):
+    """Reader thread: puts (chunk number, first line, lines) on the lines queue."""
+    try:
+        first_line = 0
+        chunks = read_line_chunks(raw_path, chunk_lines)
+        for number in itertools.count():
+            start = time.perf_counter()
+            with stage("read") as record:
+                lines = next(chunks, None)
+                record["rows"] = len(lines) if lines else None
+            pipeline.add_busy("read", time.perf_counter() - start)
+            if lines is None or not pipeline.put(pipeline.lines, (number, first_line, lines)):
+                break
+            first_line += len(lines)
+        for _ in range(pipeline.parsers):
+            pipeline.put(pipeline.lines, DONE)
+    except BaseException as error:
+        pipeline.fail(error)
+
+
+def parse_stage(pipeline, pool):
+    """Parser thread: cleans chunks from the lines queue onto the cleaned queue until it gets DONE."""
+    try:
+        while True:
+            chunk = pipeline.get(pipeline.lines)
+            if chunk is DONE:
+                pipeline.put(pipeline.cleaned, DONE)
+                return
+            number, first_line, lines = chunk
+
+            start = time.perf_counter()
+            if pool is None:
+                df, reasons = clean_chunk(lines)
+            else:
+                # the worker's own parse, validate and clean stages aren't seen from here
+                with stage("parse workers", rows=len(lines)):
+                    df, reasons = pool.submit(clean_chunk, lines).result()
+            pipeline.add_busy("parse", time.perf_counter() - start)
+            if not pipeline.put(pipeline.cleaned, (number, first_line, df, reasons)):
+                return
+    except BaseException as error:
+        pipeline.fail(error)
+
+
+def cleaned_in_order(pipeline):
+    """The cleaned chunks as the parser threads finish them, put back in file order."""
+    # chunks finished ahead of one still being parsed, at most one per parser thread and queue slot
+    waiting = {}
+    expected = 0
+    finished = 0
+    while finished < pipeline.parsers:
+        chunk = pipeline.get(pipeline.cleaned)
+        if chunk is DONE:
+            finished += 1
+            continue
+        waiting[chunk[0]] = chunk
+        while expected in waiting:
+            yield waiting.pop(expected)
+            expected += 1
+
+
+def report(pipeline, rows, raw_bytes, seconds):
+    busy = pipeline.busy
+    overlap = sum(busy.values()) / seconds if seconds else 0
+    stages = ", ".join(f"{name} {busy_seconds:.1f}s ({busy_seconds / seconds:.0%})"
+                       for name, busy_seconds in busy.items()) if seconds else ""
+    print(f"Pipelined {rows:,} rows in {seconds:.1f}s, {rows / seconds:,.0f} rows/s and "
+          f"{raw_bytes / seconds / 1024 / 1024:.1f} MB/s")
+    print(f"Busy: {stages}, {overlap:.2f}x overlap")
+
+
+def write_pipelined(raw_path, output_path, sheet_name, workers=None, chunk_lines=STREAM_CHUNK_LINES, logos=read_file.LOGOS):
+    """
+    Builds the same workbook as streaming.write_streaming with reading,
+    parsing and writing running side by side, parsing in workers processes
+    when it's over 1 (None uses every core).
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    pipeline = Pipeline(parsers=workers)
+    workbook, worksheet, text_format = open_sheet(output_path, sheet_name, logos)
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(read_file.cal,))
+    threads = [threading.Thread(target=read_stage, args=(pipeline, raw_path, chunk_lines), daemon=True)]
+    threads += [threading.Thread(target=parse_stage, args=(pipeline, pool), daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    row = read_file.START_ROW + 1
+    quarantined = []
+    try:
+        for _, first_line, df, reasons in cleaned_in_order(pipeline):
+            start = time.perf_counter()
+            quarantined.append(reasons.set_axis(reasons.index + first_line))
+            with stage("write", rows=len(df)):
+                row = write_chunk(worksheet, df, row, text_format)
+            pipeline.add_busy("write", time.perf_counter() - start)
+    finally:
+        # a failed write stops the reader and parsers too
+        pipeline.failed.set()
+        for thread in threads:
+            thread.join()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    rows = row - read_file.START_ROW - 1
+    with stage("save", rows=rows):
+        start = time.perf_counter()
+        workbook.close()
+        pipeline.add_busy("write", time.perf_counter() - start)
+    write_quarantine(raw_path, pd.concat(quarantined) if quarantined else pd.Series(dtype=object))
+    report(pipeline, rows, os.path.getsize(raw_path), time.perf_counter() - started)
@@ -0,0 +1,177 @@
+"""
+Stage profiler behind --profile.
+
+Each step of a run is wrapped in a stage:
+
+    with stage("parse") as record:
+        df = parse_file(path)
+        record["rows"] = len(df)
+
+Nothing is measured until start() is called, so stages cost nothing on a
+normal run. Stages with the same name add up (streaming mode runs parse,
+clean and write once per chunk). report() prints wall time, rows/second
+and peak RSS per stage, plus the peak traced memory and new allocations
+per stage when tracemalloc is on, and can append the run to a JSON lines
+file to track timings from week to week. One stage can also be run under
+cProfile, its stats are dumped to profile-<stage>.prof.
+"""
+import contextlib
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# the run being profiled, None when profiling is off
+_run = None
+# pipeline mode runs stages in several threads at once
+_lock = threading.Lock()
+
+
+def peak_rss():
+    """Peak resident memory of this process so far in bytes, None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (field, ctypes.c_size_t) for field in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+def _traced_blocks():
+    return sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+
+
+def start(memory=False, cprofile=None):
+    """
+    Turns profiling on. memory traces allocations with tracemalloc (which
+    slows every stage down), cprofile names the stage to run under cProfile.
+    """
+    global _run
+    _run = {"started": time.perf_counter(), "at": datetime.now(), "stages": {}, "memory": memory,
+            "cprofile": cprofile, "profile": None}
+    if memory:
+        tracemalloc.start()
+
+
+def enabled():
+    return _run is not None
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """Measures the code inside as stage name, set record["rows"] if the row count is only known after."""
+    record = {"rows": rows}
+    if _run is None:
+        yield record
+        return
+
+    if _run["memory"]:
+        blocks = _traced_blocks()
+        tracemalloc.reset_peak()
+    profile = None
+    if name == _run["cprofile"]:
+        import cProfile
+        profile = _run["profile"] = _run["profile"] or cProfile.Profile()
+        profile.enable()
+
+    start_time = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start_time
+        if profile:
+            profile.disable()
+
+        with _lock:
+            total = _run["stages"].setdefault(name, {"seconds": 0.0, "rows": None, "calls": 0})
+            total["seconds"] += seconds
+            total["calls"] += 1
+            if record["rows"] is not None:
+                total["rows"] = (total["rows"] or 0) + record["rows"]
+            total["peak_rss"] = peak_rss()
+            if _run["memory"]:
+                total["peak_alloc"] = max(total.get("peak_alloc", 0), tracemalloc.get_traced_memory()[1])
+                total["new_blocks"] = total.get("new_blocks", 0) + _traced_blocks() - blocks
+
+
+def _megabytes(value):
+    return "-" if value is None else f"{value / 1024 / 1024:,.0f} MB"
+
+
+def summary():
+    """The run so far as a dict, the same shape report() appends to the JSON file."""
+    stages = []
+    for name, total in _run["stages"].items():
+        rows = total["rows"]
+        stages.append({
+            "name": name,
+            **total,
+            "rows_per_second": rows / total["seconds"] if rows and total["seconds"] else None,
+        })
+    return {
+        "at": _run["at"].isoformat(timespec="seconds"),
+        "seconds": time.perf_counter() - _run["started"],
+        "peak_rss": peak_rss(),
+        "stages": stages,
+    }
+
+
+def report(json_path=None, **info):
+    """
+    Prints the stage table. With json_path, appends the run (and any info,
+    like the report name) to that file as one line of JSON.
+    """
+    run = summary()
+    memory = _run["memory"]
+
+    print(f"\n{'Stage':<18}{'Time':>10}{'Share':>8}{'Rows':>12}{'Rows/s':>12}{'Peak RSS':>11}"
+          + (f"{'Peak alloc':>12}{'New blocks':>12}" if memory else ""))
+    for stage_run in run["stages"]:
+        rows = "-" if stage_run["rows"] is None else f"{stage_run['rows']:,}"
+        rate = "-" if stage_run["rows_per_second"] is None else f"{stage_run['rows_per_second']:,.0f}"
+        share = stage_run["seconds"] / run["seconds"] if run["seconds"] else 0
+        line = (f"{stage_run['name']:<18}{stage_run['seconds']:>9.2f}s{share:>8.1%}{rows:>12}{rate:>12}"
+                f"{_megabytes(stage_run['peak_rss']):>11}")
+        if memory:
+            line += f"{_megabytes(stage_run['peak_alloc']):>12}{stage_run['new_blocks']:>12,}"
+        print(line)
+    print(f"{'total':<18}{run['seconds']:>9.2f}s{'':>32}{_megabytes(run['peak_rss']):>11}")
+
+    if _run["cprofile"]:
+        if _run["profile"] is None:
+            print(f"No stage named {_run['cprofile']} ran, nothing to profile")
+        else:
+            path = f"profile-{_run['cprofile'].replace(' ', '-')}.prof"
+            _run["profile"].dump_stats(path)
+            print(f"\ncProfile of {_run['cprofile']} saved to {path}, the slowest calls:")
+            import pstats
+            pstats.Stats(_run["profile"]).sort_stats("cumulative").print_stats(15)
+
+    if json_path:
+        with open(json_path, "a") as file:
+            file.write(json.dumps({**info, **run}) + "\n")
+        print(f"Added this run to {json_path}")
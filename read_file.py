@@ -1,7 +1,11 @@
-import pandas as pd
-import numpy as np
-from dotenv import load_dotenv
+# pandas, numpy, xlsxwriter and dotenv are imported where they're used, so the menu
+# comes up straight away and small extracts are built without loading pandas at all
 from my_calendar import My_Calendar
+from styles import get_format, header_style, set_columns
+from profiler import stage
+import report_spec
+import argparse
+import multiprocessing
 import time
 import os
 import re
@@ -15,26 +19,29 @@ MAX_SHEET_LENGTH = 1048576
 
 cal = My_Calendar()
 
-# Index, Name, Formula
-FORMULAS = [
-    (7, "WEEKS OH+OO", "=IF(M{row_num}=0,0,((E{row_num}+F{row_num})/M{row_num}))*4"),
-    (9, "$ On Hand", "=G{row_num}*I{row_num}"),
-    (10, "$ On Order", "=F{row_num}*I{row_num}"),
-    (11, "$ MTD", "=O{row_num}*I{row_num}"),
-    (12, "Trending 2 Month RR", "=(((O{row_num}/(ROUNDDOWN(($A$13-$C$13),0)/7))*$F$13)+P{row_num})/2"),
-    (13, "Average Prev 2 Momth RR", "=(P{row_num}+Q{row_num})/2"),
-    (21, "YTD Sales", "=U{row_num}*I{row_num}")
-    ]
+# calculation engine id of current Excel, older ids make Excel recalculate everything on open
+EXCEL_CALC_ID = 191029
 
 # max length of item ids
 ID_LENGTH = 6
 
-def is_float(s):
-    try:
-        float(s)
-        return True
-    except ValueError:
-        return False
+# what a run can write, the workbook and export.EXPORTERS' table formats
+OUTPUT_FORMATS = ["xlsx", "csv", "parquet", "jsonl"]
+
+# Cell, logo image
+LOGOS = {
+    'A1': 'Logos/UAG.png',
+    'A7': 'Logos/Ingram Micro.png'
+}
+
+# fixed-width layout of the start of each line, and where the second description begins
+LINE_FORMAT = [ID_LENGTH, " "*8, LEN_DESC_1, "", 4, " ", 6]
+DESC_2_START = 148
+
+# plain numeric or accounting-style negative tokens, compiled once instead of on every call
+NUMBER = re.compile(r'[-+]?\d+(?:\.\d+)?-?')
+WHITESPACE = re.compile(r'\s+')
+TAIL_NOISE = re.compile(r'[*%`]')
 
 
 def convert_accounting_number(num_str):
@@ -57,16 +64,12 @@ def convert_accounting_number(num_str):
         return num_str
 
 
-def add_images(worksheet):
-    try:
-        worksheet.insert_image('A1', 'Logos/UAG.png')
-    except FileNotFoundError:
-        print("Warning: Logos/UAG.png not found, skipping image insert.")
-
-    try:
-        worksheet.insert_image('A7', 'Logos/Ingram Micro.png')
-    except FileNotFoundError:
-        print("Warning: Logos/Ingram Micro.png not found, skipping image insert.")
+def add_images(worksheet, logos=LOGOS):
+    for cell, path in logos.items():
+        try:
+            worksheet.insert_image(cell, path)
+        except FileNotFoundError:
+            print(f"Warning: {path} not found, skipping image insert.")
 
 
 def parse_line_by_format(line, format):
@@ -81,17 +84,18 @@ def parse_line_by_format(line, format):
             elif isinstance(part, str):
                 expected = part
                 actual = line[idx:idx + len(expected)]
-                # if actual != expected:
-                #     print(f"Expected delimiter '{expected}' but got '{actual}' at position '{idx}'")
+                if actual != expected and fields:
+                    # text running into a delimiter stays with the field before it, so validate sees the long field
+                    fields[-1] += actual.rstrip()
                 idx += len(expected)
             else:
                 raise TypeError("Format list must contain only integers and strings.")
             
         # split up until the next custom field
-        remaining = line[idx:148]
+        remaining = line[idx:DESC_2_START]
         remaining = remaining.replace("*", "")
 
-        extra_parts = re.split(r'\s+', remaining.strip())
+        extra_parts = WHITESPACE.split(remaining.strip())
 
         # Add remaining items until total fields == 13. This eliminates the extra un-used field
         while len(fields) < 13 and extra_parts:
@@ -99,8 +103,11 @@ def parse_line_by_format(line, format):
 
             # Remove the un-used ['N'] field if it is in the item
             if curr == "N":
+                if not extra_parts:
+                    # nothing after the flag, the line comes up short and validate quarantines it
+                    break
                 curr = extra_parts.pop(0)
-            elif re.fullmatch(r'[-+]?\d+(?:\.\d+)?-?', curr):
+            elif NUMBER.fullmatch(curr):
                 # plain numeric or accounting-style negative
                 curr = convert_accounting_number(curr)
             else:
@@ -109,7 +116,7 @@ def parse_line_by_format(line, format):
             fields.append(curr)
 
         # add the the next custom field
-        idx = 148
+        idx = DESC_2_START
         next = line[idx:idx + LEN_DESC_2]
         fields.append(next.strip())
         idx += LEN_DESC_2
@@ -117,13 +124,13 @@ def parse_line_by_format(line, format):
         # Get remaining items
         remaining = line[idx:]
         # clean up remaining data
-        remaining = re.sub(r'[*%`]', '', remaining)
-        extra_parts = re.split(r'\s+', remaining.strip())
+        remaining = TAIL_NOISE.sub('', remaining)
+        extra_parts = WHITESPACE.split(remaining.strip())
 
         # Add remaining items
         while extra_parts:
             curr = extra_parts.pop(0)
-            if re.fullmatch(r'[-+]?\d+(?:\.\d+)?-?', curr):
+            if NUMBER.fullmatch(curr):
                 # plain numeric or accounting-style negative
                 curr = convert_accounting_number(curr)
             else:
@@ -134,171 +141,61 @@ def parse_line_by_format(line, format):
         return fields
 
 
+def read_fields(path, format=LINE_FORMAT):
+    """Parses the raw file one line at a time with parse_line_by_format into lists of fields."""
+    rows = []
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            line = line.lstrip()
+            # stip and split based on spaces
+            row = parse_line_by_format(line, format)
+            rows.append(row)
+    return rows
+
+
+def read_rows(path, format=LINE_FORMAT):
+    """
+    read_fields as a DataFrame.
+    Kept as the reference for the columnar engine in columnar_parse.
+    """
+    import pandas as pd
+    return pd.DataFrame(read_fields(path, format))
+
+
 def define_formats(workbook, worksheet):
-    # individual formats
-    currency_format = workbook.add_format({'num_format': '$#,##0.00_-'})
-    dash_format = workbook.add_format({'num_format': '#,##0;-#,##0;" - "', 'align': 'center', 'valign': 'center'})
-    red_text = workbook.add_format({'font_color': 'red', 'align': 'center', 'valign': 'center'})
-
-    centered_format = workbook.add_format({
-        'align': 'center',
-        'valign': 'vcenter'
-    })
-    left_format = workbook.add_format({
-        'align': 'left',
-        'valign': 'vcenter',
-        'num_format': '@' 
-    })
-
-    # combined formats
-    currency_red = workbook.add_format({'num_format': '$#,##0.00', 'font_color': 'red'})
-    currency_blue = workbook.add_format({'num_format': '$#,##0.00', 'font_color': 'blue'})
-
-    dash_red = workbook.add_format({'num_format': '#,##0;-#,##0;" - "', 'font_color': 'red', 'align': 'center', 'valign': 'center'})
-    dash_blue = workbook.add_format({'num_format': '#,##0;-#,##0;" - "', 'font_color': 'blue', 'align': 'center', 'valign': 'center'})
-
-    # setting typography formatting
-    worksheet.set_column("A:A", 9.17, centered_format)
-    worksheet.set_column("B:B", 64.17, left_format)
-    worksheet.set_column("C:C", 14.17, left_format)
-    worksheet.set_column("D:D", 7.17, red_text)
-    worksheet.set_column("E:F", 8.17, dash_blue)
-    worksheet.set_column("G:G", 15.17, dash_blue)
-    worksheet.set_column("H:H", 11.17, dash_red)
-    worksheet.set_column("I:K", 15.17, currency_format)
-    worksheet.set_column("L:L", 15.17, currency_red)
-    worksheet.set_column("M:M", 15.17, dash_format)
-    worksheet.set_column("N:N", 15.17, dash_blue)
-    worksheet.set_column("O:T", 9.17, dash_format)
-    worksheet.set_column("U:U", 11.17, dash_red)
-    worksheet.set_column("V:V", 11.17, currency_blue)
+    # widths and number formats for every column come from the report spec
+    set_columns(workbook, worksheet, report_spec.plan().layout)
 
 
 def set_headers(workbook, worksheet):
-    months = cal.get_relative_months()
-
-    headers_row1 = [
-        "", "", "MFG.", "Status", "Units", "Units on", "Balance", "WEEKS", "", "", "", "", "Trending 2", "Average Prev", "MTD", "", "", "", "", "", "YTD Unit", "YTD"
-    ]
-    headers_row2 = [
-        "IM SKU#", "Product Description", "P/N", "Code", "Avail", "Order", "On Hand", "OH + OO", "Unit Cost",
-        "$ On Hand", "$ On Order", "$ MTD", "Month RR", "2 Month RR", "Unit Sales", f'{months[-1]}', f'{months[-2]}', f'{months[-3]}', f'{months[-4]}', f'{months[-5]}', "Sales", "Sales"
-    ]
-
-    top_header_fmt = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1, 
-        'border': 2,
-        'border_color': 'black'
-    })
-    bottom_header_fmt = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1,
-        'border': 2,
-        'border_color': 'black'
-    })
-    top_header_fmt_blue = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1, 
-        'border': 2,
-        'border_color': 'black',
-        'font_color': 'blue'
-    })
-    bottom_header_fmt_blue = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1,
-        'border': 2,
-        'border_color': 'black',
-        'font_color': 'blue'
-    })
-    top_header_fmt_red = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1, 
-        'border': 2,
-        'border_color': 'black',
-        'font_color': 'red'
-    })
-    bottom_header_fmt_red = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'underline': 1,
-        'border': 2,
-        'border_color': 'black',
-        'font_color': 'red'
-    })
-
-
-    # Remove border between top and bottom row
-    for fmt in [top_header_fmt, top_header_fmt_blue, top_header_fmt_red]:
-        fmt.set_bottom(0)
-    for fmt in [bottom_header_fmt, bottom_header_fmt_blue, bottom_header_fmt_red]:
-        fmt.set_top(0)
-
-    red_cols = [3, 7, 11, 20]
-    blue_cols = [4, 5, 6, 13, 21]
-
-    for i in range(len(headers_row1)):
-        if i in red_cols:
-            worksheet.write(START_ROW - 1, i, headers_row1[i], top_header_fmt_red)
-            worksheet.write(START_ROW, i, headers_row2[i], bottom_header_fmt_red)  
-        elif i in blue_cols:
-            worksheet.write(START_ROW - 1, i, headers_row1[i], top_header_fmt_blue)
-            worksheet.write(START_ROW, i, headers_row2[i], bottom_header_fmt_blue)
-        else:
-            worksheet.write(START_ROW - 1, i, headers_row1[i], top_header_fmt)  
-            worksheet.write(START_ROW, i, headers_row2[i], bottom_header_fmt)  
+    report = report_spec.plan()
+    headers = report.headers(cal.get_relative_months())
+
+    for i, ((top, bottom), (_, _, color)) in enumerate(zip(headers, report.layout)):
+        worksheet.write(START_ROW - 1, i, top, get_format(workbook, header_style(color, "top")))
+        worksheet.write(START_ROW, i, bottom, get_format(workbook, header_style(color, "bottom")))
+
+
+def write_metric(worksheet, row, col, formula, cell_format, value=None, metrics="formulas"):
+    """Writes a formula cell as a live formula, a formula saved with its result, or just the result."""
+    if metrics == "values":
+        worksheet.write(row, col, value, cell_format)
+    elif metrics == "cached":
+        worksheet.write_formula(row, col, formula, cell_format, value)
+    else:
+        worksheet.write(row, col, formula, cell_format)
 
 
-def add_extra_info(workbook, worksheet):
+def add_extra_info(workbook, worksheet, results=None, metrics="formulas"):
     # Styling
-    underline_fmt = workbook.add_format({
-        'align': 'center',
-        'valign': 'center',
-        'underline': 1
-    })
-    right_align_fmt = workbook.add_format({
-        'align': 'right',
-        'valign': 'right',
-        'font_color': 'black'
-    })
-    italics_blue_fmt = workbook.add_format({
-        'align': 'center',
-        'valign': 'center',
-        'italic': True,
-        'bold': True,
-        'font_color': 'blue'
-    })
-    italics_green_fmt = workbook.add_format({
-        'align': 'center',
-        'valign': 'center',
-        'italic': True,
-        'bold': True,
-        'font_color': '#32CD32'
-    })
-    italics_red_fmt = workbook.add_format({
-        'align': 'center',
-        'valign': 'center',
-        'italic': True,
-        'bold': True,
-        'font_color': 'red'
-    })
-    italics_blue_currency_fmt = workbook.add_format({
-        'align': 'center',
-        'valign': 'center',
-        'font_color': 'blue',
-        'num_format': '$#,##0.00_-'
-    })
+    underline_fmt = get_format(workbook, 'underline')
+    right_align_fmt = get_format(workbook, 'right_align')
+    italics_blue_fmt = get_format(workbook, 'italics_blue')
+    italics_green_fmt = get_format(workbook, 'italics_green')
+    italics_red_fmt = get_format(workbook, 'italics_red')
+    italics_blue_currency_fmt = get_format(workbook, 'italics_blue_currency')
 
     # Report Date
     date = cal.get_report_date_str()
@@ -315,117 +212,152 @@ def add_extra_info(workbook, worksheet):
     worksheet.write(START_ROW - 3, 2, next_month, right_align_fmt)
     worksheet.write(START_ROW - 2, 2, this_month, right_align_fmt)
 
+    # totals only need to cover the data once the results are known
+    results = results or {}
+    last_row = results.get("last_row", MAX_SHEET_LENGTH)
+    report = report_spec.plan()
+    on_hand, on_order, mtd = (report.letter(id) for id in ("on_hand_dollars", "on_order_dollars", "mtd_dollars"))
+
     # Weeks in Month
     worksheet.write(START_ROW - 2, 4, "Weeks in Month:", right_align_fmt)
-    worksheet.write(START_ROW - 2, 5, f"=(C{START_ROW - 2}-C{START_ROW - 1})/7", right_align_fmt)
+    write_metric(worksheet, START_ROW - 2, 5, f"=(C{START_ROW - 2}-C{START_ROW - 1})/7", right_align_fmt, results.get("weeks_in_month"), metrics)
 
     # Reporting Week
     worksheet.write(START_ROW - 2, 6, "Reporting Week:", right_align_fmt)
-    worksheet.write(START_ROW - 2, 7, f"=(A{START_ROW - 1}-C{START_ROW - 1})/7", right_align_fmt)
+    write_metric(worksheet, START_ROW - 2, 7, f"=(A{START_ROW - 1}-C{START_ROW - 1})/7", right_align_fmt, results.get("reporting_week"), metrics)
 
     # On Hand
     worksheet.write(START_ROW - 9, 6, "$-On Hand", italics_blue_fmt)
-    worksheet.write(START_ROW - 8, 6, f"=SUM(J{START_ROW + 2}:J{MAX_SHEET_LENGTH})", italics_blue_currency_fmt)
+    write_metric(worksheet, START_ROW - 8, 6, f"=SUM({on_hand}{START_ROW + 2}:{on_hand}{last_row})", italics_blue_currency_fmt, results.get("on_hand"), metrics)
 
     # On Order
     worksheet.write(START_ROW - 9, 8, "$-On Order", italics_blue_fmt)
-    worksheet.write(START_ROW - 8, 8, f"=SUM(K{START_ROW + 2}:K{MAX_SHEET_LENGTH})", italics_blue_currency_fmt)
+    write_metric(worksheet, START_ROW - 8, 8, f"=SUM({on_order}{START_ROW + 2}:{on_order}{last_row})", italics_blue_currency_fmt, results.get("on_order"), metrics)
 
     # OH + On Order
     worksheet.write(START_ROW - 9, 9, "$-OH + $-On Order", italics_blue_fmt)
-    worksheet.write(START_ROW - 8, 9, f"=G{START_ROW - 7}+I{START_ROW - 7}", italics_blue_currency_fmt)
+    write_metric(worksheet, START_ROW - 8, 9, f"=G{START_ROW - 7}+I{START_ROW - 7}", italics_blue_currency_fmt, results.get("on_hand_and_order"), metrics)
 
     # MTD
     worksheet.write(START_ROW - 9, 11, "$-MTD", italics_red_fmt)
-    worksheet.write(START_ROW - 8, 11, f"=SUM(L{START_ROW + 2}:L{MAX_SHEET_LENGTH})", italics_blue_currency_fmt)
+    write_metric(worksheet, START_ROW - 8, 11, f"=SUM({mtd}{START_ROW + 2}:{mtd}{last_row})", italics_blue_currency_fmt, results.get("mtd"), metrics)
 
     # RUN RATE
     worksheet.write(START_ROW - 10, 12, "$-EST MONTHLY", italics_green_fmt)
     worksheet.write(START_ROW - 9, 12, "RUN RATE", italics_blue_fmt)
-    worksheet.write(START_ROW - 8, 12, f"=(L{START_ROW - 7}/H{START_ROW - 1})*F{START_ROW - 1}", italics_blue_currency_fmt)
+    write_metric(worksheet, START_ROW - 8, 12, f"=(L{START_ROW - 7}/H{START_ROW - 1})*F{START_ROW - 1}", italics_blue_currency_fmt, results.get("run_rate"), metrics)
 
 
-def write_equations(df):
-    # creates the columns for the derived data we're going to add
-    for index, name, _ in FORMULAS:
-        df.insert(index, name, '')
+def output_filename(name=None):
+    name = name or os.getenv('NAME')
+    filename = f"{name} {cal.get_report_date_str().replace('/', '-')}.xlsx"
+    # OUTPUT_DIR in the .env collects the workbooks in one folder
+    output_dir = os.getenv("OUTPUT_DIR", "")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, filename)
 
-    df.iloc[:, 2] = df.iloc[:, 2].astype(str)
 
-    with pd.ExcelWriter(f"{os.getenv('NAME')} {cal.get_report_date_str().replace('/', '-')}.xlsx", engine="xlsxwriter") as writer:
-        workbook  = writer.book
-        df.to_excel(writer, index=False, sheet_name=os.getenv("NAME"), startrow = START_ROW)
+def new_workbook(path, metrics="formulas"):
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(path)
+    if metrics == "cached":
+        # the results are saved with the formulas, so Excel can skip the full recalculation when opening
+        workbook.calc_on_load = False
+        workbook.set_calc_mode("auto", calc_id=EXCEL_CALC_ID)
+    return workbook
 
-        worksheet = writer.sheets[os.getenv("NAME")]
 
+def write_sheet(workbook, df, name, logos=LOGOS, metrics="formulas", history=None, results=None, data_row=START_ROW + 1):
+    """
+    Adds the datasheet for df, clean_spreadsheet's output or its columns as
+    lists (small_extract builds small reports without pandas), to workbook
+    as sheet name. results are compute_metrics' results, worked out here
+    when the metrics mode needs them and they aren't given. df's first row
+    goes in sheet row data_row, parallel_write renders later rows of the
+    datasheet on their own.
+    """
+    from column_writer import row_count, write_columns
+    rows = row_count(df)
 
-        left_format = workbook.add_format({
-            'align': 'left',
-            'valign': 'vcenter',
-            'num_format': '@' 
-        })
-        
-        # Force ALL data rows in column C (index 2) to be written as text
-        # Pandas writes the header at row START_ROW, and data begins at row START_ROW + 1 (0-indexed)
-        for r, val in enumerate(df.iloc[:, 2], start=START_ROW + 1):
-            worksheet.write_string(r, 2, str(val), left_format)
+    if metrics != "formulas" and results is None:
+        from metrics import compute_metrics
+        with stage("metrics", rows=rows):
+            results = compute_metrics(df, cal)
 
-        for i in range(START_ROW, START_ROW + len(df)):
-            row_num = i + 2  # Excel rows are 1-indexed and row 1 is the header
+    worksheet = workbook.add_worksheet(name)
 
-            for index, _, formula_template in FORMULAS:
-                # turns formula into properly formated formula
-                formula = formula_template.format(row_num=row_num)
-                worksheet.write_formula(i + 1, index, formula)
+    # the data and the derived columns, one column at a time, data begins below the headers
+    write_columns(worksheet, df, data_row, results, metrics)
 
+    with stage("layout"):
         set_headers(workbook, worksheet)
         define_formats(workbook, worksheet)
-        add_extra_info(workbook, worksheet)
-        add_images(worksheet)
-
-
-def clean_spreadsheet(df):
-
-    # merge descriptions
-    df[1] = df[1] + ' ' + df[13]
-
-    months = cal.get_relative_months()
-
-    rename_map = {
-        0: 'IM SKU#',
-        1: 'Product Description',
-        15: 'MFG. P/N',
-        11: 'Status Code',
-        20: 'Units Avail',
-        23: 'Units on Order',
-        27: 'Balance On Hand',
-        5: 'Unit Cost',
-        30: 'MTD Unit Sales',
-        32: f'{months[-1]}',
-        33: f'{months[-2]}',
-        34: f'{months[-3]}',
-        35: f'{months[-4]}',
-        36: f'{months[-5]}',
-        31: 'YTD Unit Sales'
-    }
-
+        add_extra_info(workbook, worksheet, results, metrics)
+    with stage("images"):
+        add_images(worksheet, logos)
 
-    # Renaming relevant columns by label:
-    df = df.rename(columns=rename_map)
+    if history is not None:
+        # older months from the history store, to the right of the datasheet
+        from history import write_history_columns
+        with stage("history write", rows=rows):
+            write_history_columns(workbook, worksheet, history, START_ROW + 1, data_row)
+    return worksheet
 
-    # Drop unnecessary columns based on labels
-    df = df.drop(columns=[2,3,4,6,7,8,12,13,14,16,17,18,19,21,22,24,25,26,28,29])
 
-    # re-ordering remaining columns
-    desired_order = list(rename_map.values())
-    df = df[desired_order]
+def write_equations(df, name=None, logos=LOGOS, metrics="formulas", history=None, write_workers=1):
+    """
+    Writes the datasheet for df to its own workbook, see write_sheet. With
+    write_workers above 1 a large df is rendered in that many processes.
+    """
+    from column_writer import row_count
+    name = name or os.getenv("NAME")
+    if write_workers > 1:
+        from parallel_write import write_parallel
+        if write_parallel(df, name, logos, metrics, history, write_workers):
+            return
+    workbook = new_workbook(output_filename(name), metrics)
+    write_sheet(workbook, df, name, logos, metrics, history)
+    with stage("save", rows=row_count(df)):
+        workbook.close()
 
-    # making sure this is a string to prevent future issues
-    df["MFG. P/N"] = df["MFG. P/N"].astype(str)
 
-    return df
+def clean_spreadsheet(df):
+    """
+    The report spec's data columns from the parsed fields, named and in
+    sheet order, with the spec's dtypes applied.
+    """
+    import pandas as pd
+    report = report_spec.plan()
+
+    columns = {}
+    for name, sources, column_type in zip(report.data_names(cal.get_relative_months()), report.sources, report.writers):
+        if df.empty:
+            # every line was quarantined, the parsed columns have no type to join or convert
+            columns[name] = pd.Series([], dtype=object)
+            continue
+        values = df[sources[0]]
+        # merge descriptions
+        for source in sources[1:]:
+            values = values + ' ' + df[source]
+        if column_type == "text":
+            # making sure this is a string to prevent future issues
+            values = values.astype(str)
+        columns[name] = values
+    df = pd.DataFrame(columns, columns=pd.Index(list(columns), dtype=object))
+
+    # compact native dtypes instead of boxed objects from here on
+    from schema import apply_schema
+    return apply_schema(df)
+
+
+def load_environment():
+    """
+    Loads the .env next to the executable or script, moves into that
+    directory and sets up the fiscal calendar. Returns the directory.
+    """
+    from dotenv import load_dotenv
 
-def run_script():
     # Get the directory where the executable resides (not the temp bundle directory)
     if getattr(sys, 'frozen', False):
         # If bundled by PyInstaller, get the executable's directory
@@ -460,6 +392,19 @@ def run_script():
     else:
         cal.set_calendar(fiscal_periods_raw)
 
+    # REPORT_SPEC in the .env lays the datasheet out differently, checked now rather than halfway through a run
+    spec_path = os.getenv("REPORT_SPEC")
+    report_spec.use_spec(spec_path)
+    if spec_path:
+        print(f"Using report spec {spec_path}")
+
+    return base_path
+
+
+def run_script(stream=False, use_cache=True, metrics="formulas", delta=None, full=False, history_months=0, workers=None,
+               formats=("xlsx",), write_workers=1, exceptions=False, pipeline=False, ingest=False):
+    base_path = load_environment()
+
     # Get the raw file path - it should be relative to the executable's directory
     raw_file = os.getenv("RAW_FILE")
     if not raw_file:
@@ -471,19 +416,60 @@ def run_script():
         raise FileNotFoundError(f"Data file not found: {raw_file_path}")
 
     print("Current directory:", os.getcwd())
-    rows = []
-    format = [ID_LENGTH, " "*8, LEN_DESC_1, "", 4, " ", 6]
-    with open(os.getenv("RAW_FILE"), "r") as file:
-        for line in file:
-            if not line.strip():
-                continue
-            line = line.lstrip()
-            # stip and split based on spaces
-            row = parse_line_by_format(line, format)
-            rows.append(row)
-    df = pd.DataFrame(rows)
-    df = clean_spreadsheet(df)
-    write_equations(df)
+    if stream:
+        # parse, clean and write in chunks so memory stays flat on very large extracts
+        from streaming import write_streaming
+        write_streaming(os.getenv("RAW_FILE"), output_filename(), os.getenv("NAME"))
+        return
+    if pipeline:
+        # the same chunks as --stream, read, parsed and written side by side
+        from pipeline import write_pipelined
+        write_pipelined(os.getenv("RAW_FILE"), output_filename(), os.getenv("NAME"), workers)
+        return
+
+    # small extracts are built without loading pandas at all
+    if metrics == "formulas" and not delta and history_months <= 5 and list(formats) == ["xlsx"] and not exceptions:
+        from small_extract import build_small, is_small
+        if is_small(raw_file_path) and build_small(os.getenv("RAW_FILE"), ingest=ingest):
+            return
+
+    # imported here since columnar_parse reads the layout constants from this module
+    from parse_cache import cached_clean_spreadsheet
+    df = cached_clean_spreadsheet(os.getenv("RAW_FILE"), use_cache, workers)
+
+    if ingest or history_months > 5:
+        # keep the extract so months older than the datasheet's five aren't lost
+        from history import ingest as add_to_history
+        with stage("history", rows=len(df)):
+            add_to_history(df, os.getenv("NAME"), cal, os.getenv("RAW_FILE"))
+
+    if exceptions:
+        # stockout and overstock SKUs, ranked, without waiting for Excel to work out the formulas
+        from analytics import write_exceptions
+        with stage("exceptions", rows=len(df)):
+            write_exceptions(df, os.getenv("NAME"))
+
+    if delta:
+        # only what changed since the last run, the full datasheet only when asked for
+        from delta import write_delta
+        with stage("delta", rows=len(df)):
+            write_delta(df, format=delta)
+        if not full:
+            return
+
+    history = None
+    if history_months > 5:
+        from history import history_columns
+        with stage("history read", rows=len(df)):
+            history = history_columns(df, os.getenv("NAME"), cal, history_months)
+    if "xlsx" in formats:
+        write_equations(df, metrics=metrics, history=history, write_workers=write_workers)
+
+    exports = [output_format for output_format in formats if output_format != "xlsx"]
+    if exports:
+        from export import export
+        with stage("export", rows=len(df)):
+            export(df, os.getenv("NAME"), exports, history)
 
 
 def input_with_timeout(prompt, timeout=10, default="0"):
@@ -525,7 +511,95 @@ def input_with_timeout(prompt, timeout=10, default="0"):
             return default
 
 
+def output_formats(text):
+    """argparse type for --formats, a comma separated list of OUTPUT_FORMATS."""
+    formats = [output_format.strip().lower() for output_format in text.split(",") if output_format.strip()]
+    unknown = [output_format for output_format in formats if output_format not in OUTPUT_FORMATS]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"choose from {', '.join(OUTPUT_FORMATS)}, separated by commas")
+    # each format once, in the order given
+    return list(dict.fromkeys(formats))
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Builds the Ingram Micro datasheet from the raw extract.")
+    parser.add_argument("--stream", action="store_true", help="parse and write in chunks with bounded memory")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="like --stream, with reading, parsing and writing running side by side")
+    parser.add_argument("--batch", metavar="MANIFEST", help="build every datasheet listed in a JSON manifest in parallel")
+    parser.add_argument("--consolidate", metavar="MANIFEST",
+                        help="build one workbook with a sheet per raw file in a JSON manifest and a rollup sheet")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and build a datasheet for every raw file dropped into WATCH_DIR")
+    parser.add_argument("--serve", action="store_true",
+                        help="run a local HTTP service that builds the datasheet for an uploaded raw file")
+    parser.add_argument("--workers", type=int, help="number of worker processes for --batch, --consolidate, --serve and --pipeline, or for parsing a big raw file (defaults to all cores)")
+    parser.add_argument("--write-workers", type=int, default=1, metavar="N",
+                        help="render a large datasheet's rows in N processes and splice them into the one sheet")
+    parser.add_argument("--no-cache", action="store_true", help="parse the raw file even if it is cached")
+    parser.add_argument("--clear-cache", action="store_true", help="delete every cached parse and exit")
+    parser.add_argument("--metrics", choices=["formulas", "cached", "values"], default="formulas",
+                        help="write the derived columns as live formulas, formulas saved with their results, or plain values")
+    parser.add_argument("--formats", type=output_formats, default=["xlsx"], metavar="FORMATS",
+                        help=f"what to write, one or more of {','.join(OUTPUT_FORMATS)} (default xlsx)")
+    parser.add_argument("--exceptions", action="store_true",
+                        help="also write the SKUs at risk of a stockout or overstocked, ranked by the dollars involved, to a CSV")
+    parser.add_argument("--delta", nargs="?", const="xlsx", choices=["xlsx", "csv"],
+                        help="write only the SKUs that changed since the last run instead of the datasheet")
+    parser.add_argument("--full", action="store_true", help="with --delta, build the full datasheet as well")
+    parser.add_argument("--history-months", type=int, default=0, metavar="N",
+                        help="add unit sales from the history store back to N fiscal months ago")
+    parser.add_argument("--ingest", action="store_true",
+                        help="add the extract to the history store (runs with --history-months past 5 always do)")
+    parser.add_argument("--profile", action="store_true", help="print the time, rows/s and memory of every stage")
+    parser.add_argument("--profile-json", metavar="PATH", help="with --profile, append the stage timings to a JSON lines file")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, trace allocations per stage with tracemalloc (slows the run down)")
+    parser.add_argument("--cprofile", metavar="STAGE", help="with --profile, run one stage under cProfile and save its stats")
+    args = parser.parse_args()
+    args.profile = args.profile or bool(args.profile_json or args.profile_memory or args.cprofile)
+    if (args.stream or args.pipeline) and args.metrics != "formulas":
+        parser.error("--metrics only applies without --stream or --pipeline")
+    if (args.stream or args.pipeline) and args.delta:
+        parser.error("--delta only applies without --stream or --pipeline")
+    if (args.stream or args.pipeline) and args.formats != ["xlsx"]:
+        parser.error("--formats only applies without --stream or --pipeline")
+    if (args.stream or args.pipeline) and args.ingest:
+        parser.error("--ingest only applies without --stream or --pipeline")
+    if args.pipeline and (args.stream or args.batch or args.consolidate or args.watch or args.serve):
+        parser.error("--pipeline can't be combined with --stream, --batch, --consolidate, --watch or --serve")
+    if args.write_workers < 1:
+        parser.error("--write-workers needs at least 1")
+    if args.write_workers > 1 and (args.stream or args.pipeline or args.batch or args.consolidate or args.watch or args.serve):
+        parser.error("--write-workers only applies without --stream, --pipeline, --batch, --consolidate, --watch or --serve")
+    if args.exceptions and (args.stream or args.pipeline or args.batch or args.consolidate or args.watch or args.serve):
+        parser.error("--exceptions only applies without --stream, --pipeline, --batch, --consolidate, --watch or --serve")
+    if args.batch and args.profile:
+        parser.error("--profile only applies without --batch, which reports its own stage times")
+    if args.consolidate and (args.batch or args.stream or args.delta or args.profile or args.watch):
+        parser.error("--consolidate can't be combined with --batch, --stream, --delta, --profile or --watch")
+    if args.watch and (args.batch or args.stream or args.delta or args.profile):
+        parser.error("--watch can't be combined with --batch, --stream, --delta or --profile")
+    if args.serve and (args.batch or args.consolidate or args.watch or args.stream or args.delta or args.profile):
+        parser.error("--serve can't be combined with --batch, --consolidate, --watch, --stream, --delta or --profile")
+
+    if args.clear_cache:
+        from parse_cache import clear_cache
+        load_environment()
+        clear_cache()
+        return
+
+    if args.watch:
+        # runs unattended, every file is built for the most recent Sunday
+        from watch import watch
+        watch(use_cache=not args.no_cache, metrics=args.metrics, ingest=args.ingest)
+        return
+
+    if args.serve:
+        # every request brings its own report date, there is no menu
+        from server import serve
+        serve(workers=args.workers, use_cache=not args.no_cache, metrics=args.metrics, ingest=args.ingest)
+        return
 
     print(" Welcome! ") 
     print(" Choose one of the following commands: ")
@@ -545,9 +619,39 @@ def main():
     elif outcome != "0":
         print("Invalid input, please run program again and use valid input.")
         raise ValueError("Invalid input")
-    
-    run_script()
+
+    if args.batch:
+        from batch import run_batch
+        results = run_batch(args.batch, workers=args.workers, use_cache=not args.no_cache, metrics=args.metrics,
+                            formats=args.formats, ingest=args.ingest)
+        if any(not result["ok"] for result in results):
+            sys.exit(1)
+        return
+
+    if args.consolidate:
+        from consolidate import run_consolidated
+        if not run_consolidated(args.consolidate, workers=args.workers, use_cache=not args.no_cache, metrics=args.metrics,
+                                ingest=args.ingest):
+            sys.exit(1)
+        return
+
+    if args.profile:
+        import profiler
+        profiler.start(memory=args.profile_memory, cprofile=args.cprofile)
+
+    run_script(stream=args.stream, use_cache=not args.no_cache, metrics=args.metrics, delta=args.delta, full=args.full,
+               history_months=args.history_months, workers=args.workers, formats=args.formats,
+               write_workers=args.write_workers, exceptions=args.exceptions, pipeline=args.pipeline, ingest=args.ingest)
+
+    if args.profile:
+        profiler.report(args.profile_json, name=os.getenv("NAME"), raw_file=os.getenv("RAW_FILE"),
+                        report_date=cal.get_report_date_str(), argv=sys.argv[1:])
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # needed for --batch worker processes in the PyInstaller build
+    multiprocessing.freeze_support()
+
+    # run through the importable module so helper modules that import read_file share its calendar
+    import read_file
+    read_file.main()
\ No newline at end of file
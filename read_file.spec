@@ -5,7 +5,7 @@ a = Analysis(
     ['read_file.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('report_spec.json', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
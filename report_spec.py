@@ -0,0 +1,246 @@
+"""
+The datasheet's layout, read from a report spec instead of written into
+the code.
+
+The spec is a JSON file (or YAML, with PyYAML installed) listing the
+sheet's columns from A. Every column has an "id", its "name" in the cleaned
+table, its two "header" rows, a "width", a "style" from styles.STYLES and
+optionally a "header_color" (red or blue). A column either comes from the
+raw extract:
+
+    "source"   the parsed field it holds, counted from 0, or a list of
+               fields joined with spaces (the two descriptions)
+    "dtype"    what schema narrows it to: str, category, int32 or float64
+    "write"    how column_writer writes it: general, text, int or
+               currency, text columns are turned into text when cleaned
+
+or is worked out by Excel:
+
+    "formula"  the formula with other columns as {id}, "={on_hand}*{unit_cost}"
+               is =G15*I15 on row 15
+
+"{month-1}" to "{month-5}" in a name or header stand for the fiscal months
+before the report date's. The spec is compiled once per run into a
+ReportPlan with the sheet columns of each kind, the formula templates and
+the parsed fields the datasheet needs, so the parser only builds those.
+
+report_spec.json next to the program is the Ingram Micro datasheet,
+REPORT_SPEC in the .env points at another. Columns can be reordered,
+added, dropped or read from other fields without touching the code. The
+history and the totals above the table look columns up by REQUIRED_IDS,
+and --metrics cached/values, --formats and --consolidate only work out
+the formulas of the default spec.
+"""
+import json
+import os
+import re
+import sys
+
+DEFAULT_REPORT_SPEC = "report_spec.json"
+
+# columns the history and add_extra_info's totals read, every spec needs them
+REQUIRED_IDS = ["sku", "status", "units_avail", "units_on_order", "on_hand", "unit_cost", "mtd_units",
+                "month_1", "month_2", "month_3", "month_4", "month_5", "ytd_units",
+                "on_hand_dollars", "on_order_dollars", "mtd_dollars"]
+
+HEADER_COLORS = ["", "red", "blue"]
+
+ID = re.compile(r"[A-Za-z_]\w*")
+REFERENCE = re.compile(r"\{([A-Za-z_]\w*)\}")
+MONTH = re.compile(r"\{month-(\d+)\}")
+
+# the plan for this run, compiled on first use
+_plan = None
+# the bundled spec's plan, compute_metrics checks formulas against it
+_default_plan = None
+
+
+def default_spec_path():
+    # PyInstaller unpacks the bundled spec next to the modules
+    return os.path.join(getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))), DEFAULT_REPORT_SPEC)
+
+
+def column_letter(col):
+    """Excel's letters for sheet column col, counted from 0."""
+    letters = ""
+    col += 1
+    while col:
+        col, rest = divmod(col - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+def load_spec(path):
+    """The spec at path as a dict, YAML for .yaml and .yml files."""
+    with open(path, "r", encoding="utf-8") as file:
+        if os.path.splitext(path)[1].lower() not in (".yaml", ".yml"):
+            return json.load(file)
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("YAML report specs need PyYAML, install it with pip install pyyaml") from None
+        return yaml.safe_load(file)
+
+
+def _fill_months(text, months):
+    return MONTH.sub(lambda match: str(months[-int(match[1])]), text)
+
+
+def _template(formula, letters):
+    """formula with every {id} as its column letter and the row number, other braces escaped for str.format."""
+    parts = []
+    last = 0
+    for match in REFERENCE.finditer(formula):
+        if match[1] not in letters:
+            raise ValueError(f"Formula {formula!r} refers to {match[1]!r}, which isn't a column in the report spec")
+        parts += [formula[last:match.start()].replace("{", "{{").replace("}", "}}"), letters[match[1]] + "{row_num}"]
+        last = match.end()
+    parts.append(formula[last:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
+def _check_column(column, dtypes, writers, styles):
+    label = f"Report spec column {column.get('id', column.get('name'))!r}"
+    for key in ("id", "name", "header", "width", "style"):
+        if key not in column:
+            raise ValueError(f"{label} needs a {key!r}")
+    if not ID.fullmatch(str(column["id"])):
+        raise ValueError(f"{label}: ids are letters, digits and '_', starting with a letter")
+    if len(column["header"]) != 2:
+        raise ValueError(f"{label}: header is its two rows, [top, bottom]")
+    if column["style"] not in styles:
+        raise ValueError(f"{label}: style is one of {', '.join(styles)}")
+    if column.get("header_color", "") not in HEADER_COLORS:
+        raise ValueError(f"{label}: header_color is red or blue")
+    for text in [column["name"], *column["header"]]:
+        for match in MONTH.finditer(text):
+            if not 1 <= int(match[1]) <= 5:
+                raise ValueError(f"{label}: only {{month-1}} to {{month-5}} can be filled in")
+
+    if ("source" in column) == ("formula" in column):
+        raise ValueError(f"{label} needs either a 'source' or a 'formula'")
+    if "source" in column:
+        sources = column["source"] if isinstance(column["source"], list) else [column["source"]]
+        if not sources or not all(isinstance(source, int) and source >= 0 for source in sources):
+            raise ValueError(f"{label}: source is a field number from 0, or a list of them")
+        if column.get("dtype") not in dtypes:
+            raise ValueError(f"{label}: dtype is one of {', '.join(dtypes)}")
+        if column.get("write") not in writers:
+            raise ValueError(f"{label}: write is one of {', '.join(writers)}")
+        if len(sources) > 1 and column["dtype"] != "str":
+            raise ValueError(f"{label}: fields are joined as text, its dtype has to be str")
+
+
+class ReportPlan:
+    """
+    A compiled report spec. Sheet columns are counted from 0 in sheet
+    order, data columns (the ones with a source) are clean_spreadsheet's
+    columns in the same order.
+    """
+
+    def __init__(self, spec):
+        from column_writer import WRITERS
+        from schema import CONVERTERS
+        from styles import STYLES
+
+        columns = spec.get("columns") if isinstance(spec, dict) else None
+        if not columns:
+            raise ValueError("The report spec needs a list of columns")
+        for column in columns:
+            _check_column(column, list(CONVERTERS), list(WRITERS), list(STYLES))
+
+        self.ids = [column["id"] for column in columns]
+        duplicates = sorted({id for id in self.ids if self.ids.count(id) > 1})
+        if duplicates:
+            raise ValueError(f"Report spec columns need different ids, {', '.join(duplicates)} is used twice")
+        missing = [id for id in REQUIRED_IDS if id not in self.ids]
+        if missing:
+            raise ValueError(f"The report spec needs the columns {', '.join(missing)}")
+        names = [column["name"] for column in columns]
+        if len(set(names)) < len(names):
+            raise ValueError("Report spec columns need different names")
+
+        self.columns = columns
+        # width, style and header colour of every sheet column
+        self.layout = [(column["width"], column["style"], column.get("header_color", "")) for column in columns]
+        letters = {column["id"]: column_letter(col) for col, column in enumerate(columns)}
+
+        data = [(col, column) for col, column in enumerate(columns) if "source" in column]
+        self.data_columns = [col for col, _ in data]
+        self.sources = [column["source"] if isinstance(column["source"], list) else [column["source"]] for _, column in data]
+        self.dtypes = [column["dtype"] for _, column in data]
+        self.writers = [column["write"] for _, column in data]
+
+        # sheet column, name and row template of every formula column
+        self.formulas = [(col, column["name"], _template(column["formula"], letters))
+                         for col, column in enumerate(columns) if "formula" in column]
+        self.formula_texts = {column["id"]: column["formula"] for column in columns if "formula" in column}
+
+        # parsed fields the datasheet reads, a line with fewer is missing fields
+        self.fields = sorted({field for sources in self.sources for field in sources})
+        self.required_fields = self.fields[-1] + 1
+        # fields that have to hold numbers
+        self.number_fields = sorted({field for sources, dtype in zip(self.sources, self.dtypes)
+                                     if dtype in ("int32", "float64") for field in sources})
+        self.sku_field = self.sources[self.position("sku")][0]
+        self.fingerprint = json.dumps(columns, sort_keys=True)
+
+    def index(self, id):
+        """Sheet column of column id."""
+        if id not in self.ids:
+            raise ValueError(f"The report spec has no {id!r} column")
+        return self.ids.index(id)
+
+    def letter(self, id):
+        return column_letter(self.index(id))
+
+    def position(self, id):
+        """Column of clean_spreadsheet's output holding column id."""
+        col = self.index(id)
+        if col not in self.data_columns:
+            raise ValueError(f"The report spec's {id!r} column is a formula, not read from the extract")
+        return self.data_columns.index(col)
+
+    def names(self, months):
+        """Name of every sheet column, with the months filled in from get_relative_months."""
+        return [_fill_months(column["name"], months) for column in self.columns]
+
+    def data_names(self, months):
+        """Names of clean_spreadsheet's columns."""
+        names = self.names(months)
+        return [names[col] for col in self.data_columns]
+
+    def headers(self, months):
+        """(top, bottom) header of every sheet column."""
+        return [tuple(_fill_months(text, months) for text in column["header"]) for column in self.columns]
+
+
+def compile_spec(path):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Report spec {path} not found, REPORT_SPEC in the .env has to point at a spec file "
+                                f"(the default {DEFAULT_REPORT_SPEC} ships next to the program)")
+    try:
+        return ReportPlan(load_spec(path))
+    except (KeyError, TypeError, AttributeError) as error:
+        raise ValueError(f"{path} isn't laid out like a report spec: {error!r}") from None
+
+
+def use_spec(path=None):
+    """Compiles the spec at path (REPORT_SPEC's, default_spec_path when None) as this run's plan."""
+    global _plan
+    _plan = compile_spec(path or default_spec_path())
+    return _plan
+
+
+def plan():
+    """This run's ReportPlan, REPORT_SPEC's spec or the default."""
+    if _plan is None:
+        use_spec(os.getenv("REPORT_SPEC"))
+    return _plan
+
+
+def default_plan():
+    global _default_plan
+    if _default_plan is None:
+        _default_plan = compile_spec(default_spec_path())
+    return _default_plan
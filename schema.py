@@ -0,0 +1,117 @@
+"""
+Declared dtypes of the columns clean_spreadsheet returns.
+
+Parsed rows are mixed lists of str, int and float, so pandas infers wide
+int64 and boxed object columns. apply_schema narrows them to the dtype the
+report spec (report_spec.py) gives each column once, right after parsing,
+so every later step works on compact native columns:
+
+    str       SKU, description and part number as Arrow backed strings
+    category  Status Code, a few distinct codes repeated on every row
+    int32     unit counts
+    float64   Unit Cost
+
+A column is only converted when nothing is lost. A column holding text,
+blanks or values outside int32 keeps what it has, cell for cell, so a
+chunk of the file comes out the same as the whole file. Digit text stays
+text (the token after the 'N' flag is never converted by the parser).
+
+apply_schema_lists does the same for the columns as plain lists, for
+small_extract, which builds small reports without loading pandas. pandas
+and numpy are only imported by the DataFrame converters.
+"""
+import math
+
+from report_spec import plan
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+
+def _numbers(values):
+    """values as float64 if every one is a number, otherwise None."""
+    import numpy as np
+    if values.dtype.kind in "iuf":
+        return values.to_numpy(dtype=np.float64)
+    if values.dtype != object or not values.map(lambda value: type(value) in (int, float)).all():
+        return None
+    return values.to_numpy(dtype=np.float64)
+
+
+def _as_int32(values):
+    import numpy as np
+    import pandas as pd
+    if values.dtype.kind in "iu":
+        if len(values) and (values.min() < INT32_MIN or values.max() > INT32_MAX):
+            return values
+        return values.astype(np.int32)
+
+    numbers = _numbers(values)
+    if numbers is None or not np.isfinite(numbers).all() or (numbers != np.round(numbers)).any():
+        return values
+    if len(numbers) and (numbers.min() < INT32_MIN or numbers.max() > INT32_MAX):
+        return values
+    # the float64 round trip can't lose anything inside int32
+    return pd.Series(numbers.astype(np.int32), index=values.index, name=values.name)
+
+
+def _as_float64(values):
+    import pandas as pd
+    numbers = _numbers(values)
+    if numbers is None:
+        return values
+    return pd.Series(numbers, index=values.index, name=values.name)
+
+
+def _as_str(values):
+    if values.dtype == object and not values.map(lambda value: isinstance(value, str)).all():
+        return values
+    return values.astype("str")
+
+
+CONVERTERS = {
+    "str": _as_str,
+    "category": lambda values: values.astype("category"),
+    "int32": _as_int32,
+    "float64": _as_float64,
+}
+
+
+def apply_schema(df):
+    """Returns df (clean_spreadsheet's columns) with the spec's dtypes applied where it loses nothing."""
+    import pandas as pd
+    return pd.DataFrame(
+        {column: CONVERTERS[dtype](values) for dtype, (column, values) in zip(plan().dtypes, df.items())},
+        columns=df.columns,
+    )
+
+
+def _list_numbers(values):
+    """_numbers for a list of parsed values, as Python floats."""
+    if not all(type(value) in (int, float) for value in values):
+        return None
+    return [float(value) for value in values]
+
+
+def _list_int32(values):
+    numbers = _list_numbers(values)
+    if numbers is None or not all(
+            math.isfinite(number) and number.is_integer() and INT32_MIN <= number <= INT32_MAX for number in numbers):
+        return values
+    return [int(number) for number in numbers]
+
+
+def _list_float64(values):
+    numbers = _list_numbers(values)
+    return values if numbers is None else numbers
+
+
+# str and category columns hold the same values either way
+LIST_CONVERTERS = {
+    "int32": _list_int32,
+    "float64": _list_float64,
+}
+
+
+def apply_schema_lists(columns):
+    """apply_schema for clean_spreadsheet's columns as lists, the values come out as tolist() would give them."""
+    return [LIST_CONVERTERS.get(dtype, list)(values) for dtype, values in zip(plan().dtypes, columns)]
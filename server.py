@@ -0,0 +1,282 @@
+"""
+Serve mode: a local HTTP service that builds a datasheet for an uploaded
+raw extract and sends the workbook back.
+
+    python3 read_file.py --serve [--workers N]
+
+    curl --data-binary @A764Y.TXT -o "UAG 10-12-2025.xlsx" \\
+         "http://127.0.0.1:8765/datasheet?name=UAG&date=10/12/2025"
+
+POST /datasheet takes the raw extract as the request body and the account
+name, report date (defaults to the most recent Sunday) and metrics mode
+(defaults to --metrics) in the query string. GET /health reports how many
+datasheets are being built.
+
+The event loop only reads requests and writes responses. Parsing and
+writing run through batch.run_job in a pool of worker processes (--workers,
+defaults to all cores), with the calendar set up once and handed to every
+worker like --batch does. At most SERVE_MAX_JOBS requests are built or
+waiting at once, others get 503 and can retry. Uploads over SERVE_MAX_MB
+get 413.
+
+Every build gets a folder of its own in UPLOAD_DIR (default "uploads")
+for the upload, saved as "<name>.TXT", and the workbook, removed once the
+workbook is sent. The parse cache is keyed on the extract's contents, so
+the same extract uploaded again skips parsing and is only written, and the
+same request arriving while it is still being built waits for that build
+instead of starting another. Builds quarantine bad lines, and go into
+the history with --ingest, like --batch. It listens on SERVE_HOST:SERVE_PORT,
+127.0.0.1:8765 by default, so only this machine can reach it.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import read_file
+from batch import init_worker, run_job
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_UPLOAD_DIR = "uploads"
+DEFAULT_MAX_MB = 500
+
+# requests building or waiting for a worker per worker process
+JOBS_PER_WORKER = 2
+
+# a request line and headers longer than this are refused
+MAX_HEADER_BYTES = 64 * 1024
+# seconds a client gets to send its request
+READ_TIMEOUT = 300
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# names end up in file names
+SAFE_NAME = re.compile(r"[\w][\w .-]*")
+
+
+class RequestError(Exception):
+    """A request that gets an error response instead of a workbook."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def max_upload_bytes():
+    return int(float(os.getenv("SERVE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def build(raw_path, name, date, metrics, use_cache=True, ingest=False):
+    """
+    Worker: builds the datasheet for raw_path next to it and returns
+    run_job's result with the workbook's bytes, None if it failed.
+    """
+    # each worker builds one request at a time, so the calendar and OUTPUT_DIR are its own
+    read_file.cal.set_report_date(date)
+    os.environ["OUTPUT_DIR"] = os.path.dirname(raw_path)
+    result = run_job({"raw_file": raw_path, "name": name}, use_cache, metrics, ingest=ingest)
+    workbook = None
+    if result["ok"]:
+        with open(result["output"], "rb") as file:
+            workbook = file.read()
+        result["output"] = os.path.basename(result["output"])
+    return result, workbook
+
+
+def upload_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def save_upload(body, upload_dir, name):
+    """Writes body to a new folder in upload_dir as name.TXT. Returns its path."""
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(tempfile.mkdtemp(dir=upload_dir), f"{name}.TXT")
+    with open(path, "wb") as file:
+        file.write(body)
+    return path
+
+
+class Server:
+    def __init__(self, pool, max_jobs, use_cache=True, metrics="formulas", ingest=False):
+        self.pool = pool
+        self.max_jobs = max_jobs
+        self.use_cache = use_cache
+        self.metrics = metrics
+        self.ingest = ingest
+        self.upload_dir = os.getenv("UPLOAD_DIR", DEFAULT_UPLOAD_DIR)
+        # (upload hash, name, date, metrics) of each build not finished yet
+        self.builds = {}
+
+    def report_date(self, query):
+        """The report date asked for, checked against the fiscal calendar, or the most recent Sunday."""
+        calendar = copy.copy(read_file.cal)
+        date = query.get("date")
+        try:
+            if date:
+                calendar.set_report_date(date)
+            else:
+                calendar.reset_report_date()
+            calendar.get_relative_months()
+        except ValueError as error:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+        return calendar.get_report_date_str()
+
+    async def datasheet(self, query, body):
+        name = query.get("name", "")
+        if not SAFE_NAME.fullmatch(name):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "name is needed, using letters, numbers, spaces, '.', '-' or '_'")
+        metrics = query.get("metrics", self.metrics)
+        if metrics not in ("formulas", "cached", "values"):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "metrics is one of formulas, cached or values")
+        if not body.strip():
+            raise RequestError(HTTPStatus.BAD_REQUEST, "send the raw extract as the request body")
+        date = self.report_date(query)
+
+        # hashing a big upload takes a moment, so it's done off the event loop like the file writes
+        digest = await asyncio.get_running_loop().run_in_executor(None, upload_hash, body)
+        key = (digest, name, date, metrics)
+        if key not in self.builds:
+            if len(self.builds) >= self.max_jobs:
+                raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, f"{len(self.builds)} datasheets are being built, try again shortly")
+            self.builds[key] = asyncio.ensure_future(self.run(key, body))
+        # shielded so one client hanging up doesn't cancel the build others are waiting on
+        result, workbook = await asyncio.shield(self.builds[key])
+        if not result["ok"]:
+            raise RequestError(HTTPStatus.INTERNAL_SERVER_ERROR, result["error"].strip().splitlines()[-1])
+        return result, workbook
+
+    async def run(self, key, body):
+        _, name, date, metrics = key
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        raw_path = None
+        try:
+            raw_path = await loop.run_in_executor(None, save_upload, body, self.upload_dir, name)
+            result, workbook = await asyncio.wrap_future(
+                self.pool.submit(build, raw_path, name, date, metrics, self.use_cache, self.ingest))
+        finally:
+            del self.builds[key]
+            if raw_path:
+                await loop.run_in_executor(None, shutil.rmtree, os.path.dirname(raw_path), True)
+        status = f"{result['rows']:,} rows" if result["ok"] else "FAILED"
+        print(f"{name} {date}: {status} in {time.perf_counter() - start:.1f}s")
+        return result, workbook
+
+    def health(self):
+        return {"ok": True, "building": len(self.builds), "max_jobs": self.max_jobs}
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(read_head(reader), READ_TIMEOUT)
+                url = urlsplit(target)
+                # a repeated parameter takes its last value
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                if url.path == "/health" and method == "GET":
+                    await respond(writer, HTTPStatus.OK, json.dumps(self.health()).encode(), "application/json")
+                elif url.path == "/datasheet" and method == "POST":
+                    body = await asyncio.wait_for(read_body(reader, writer, headers), READ_TIMEOUT)
+                    result, workbook = await self.datasheet(query, body)
+                    await respond(writer, HTTPStatus.OK, workbook, XLSX_TYPE,
+                                  {"Content-Disposition": f'attachment; filename="{result["output"]}"',
+                                   "X-Rows": str(result["rows"])})
+                elif url.path in ("/health", "/datasheet"):
+                    raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} isn't supported on {url.path}")
+                else:
+                    raise RequestError(HTTPStatus.NOT_FOUND, f"{url.path} not found, try POST /datasheet or GET /health")
+            except RequestError as error:
+                headers = {"Retry-After": "30"} if error.status == HTTPStatus.SERVICE_UNAVAILABLE else {}
+                await respond(writer, error.status, f"{error}\n".encode(), "text/plain; charset=utf-8", headers)
+            except asyncio.TimeoutError:
+                await respond(writer, HTTPStatus.REQUEST_TIMEOUT, b"request took too long to arrive\n", "text/plain")
+            except ConnectionError:
+                raise
+            except Exception:
+                traceback.print_exc()
+                await respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, b"the server failed, see its output\n", "text/plain")
+        except ConnectionError:
+            # the client hung up, nothing left to tell it
+            pass
+        finally:
+            writer.close()
+
+
+async def read_head(reader):
+    """Method, target and headers (lowercase names) of the request reader is reading."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "request headers too large")
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("connection closed before the request was sent")
+
+    request_line, *lines = head.decode("latin-1").split("\r\n")
+    parts = request_line.split()
+    if len(parts) != 3:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "malformed request line")
+    headers = {}
+    for line in lines:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return parts[0].upper(), parts[1], headers
+
+
+async def read_body(reader, writer, headers):
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise RequestError(HTTPStatus.LENGTH_REQUIRED, "send the upload with a Content-Length")
+    try:
+        length = int(headers.get("content-length", ""))
+    except ValueError:
+        raise RequestError(HTTPStatus.LENGTH_REQUIRED, "send the upload with a Content-Length")
+    if length > max_upload_bytes():
+        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"uploads are limited to {max_upload_bytes() // (1024 * 1024)} MB")
+    if headers.get("expect", "").lower() == "100-continue":
+        # curl waits for this before sending a large upload
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        await writer.drain()
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("connection closed before the upload was sent")
+
+
+async def respond(writer, status, body, content_type, headers=None):
+    head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}", "Connection: close"]
+    head += [f"{key}: {value}" for key, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    writer.write(body)
+    await writer.drain()
+
+
+async def serve_forever(server, host, port):
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Serving datasheets on http://{host}:{port}, press Ctrl+C to stop")
+    async with listener:
+        await listener.serve_forever()
+
+
+def serve(workers=None, use_cache=True, metrics="formulas", ingest=False):
+    read_file.load_environment()
+    host = os.getenv("SERVE_HOST", DEFAULT_HOST)
+    port = int(os.getenv("SERVE_PORT", DEFAULT_PORT))
+    workers = workers or os.cpu_count() or 1
+    max_jobs = int(os.getenv("SERVE_MAX_JOBS", workers * JOBS_PER_WORKER))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(read_file.cal,)) as pool:
+        try:
+            asyncio.run(serve_forever(Server(pool, max_jobs, use_cache, metrics, ingest), host, port))
+        except KeyboardInterrupt:
+            print("Stopping once the datasheets being built are finished")
@@ -0,0 +1,86 @@
+"""
+Small extracts built without pandas.
+
+Loading pandas and numpy takes longer than parsing and writing a few
+thousand lines, so a raw file under SMALL_EXTRACT_MB (in the .env, default
+2) is parsed line by line with parse_line_by_format, cleaned into plain
+lists and written straight through xlsxwriter. The lists hold the same
+values clean_spreadsheet's DataFrame would, so the workbook and the
+history come out the same as on the pandas path.
+
+Only the plain run takes this path: the cached and values metrics,
+--delta, --history-months past five and --stream all need pandas, and so
+does an extract with a line validate would quarantine.
+Those are built the usual way. The parse cache isn't used, a small extract
+is parsed faster than pandas and pyarrow load. SMALL_EXTRACT_MB=0 always
+uses pandas.
+"""
+import os
+
+import read_file
+from profiler import stage
+from report_spec import plan
+from schema import apply_schema_lists
+from validate import row_problem, write_quarantine
+
+DEFAULT_SMALL_EXTRACT_MB = 2
+
+
+def is_small(raw_path):
+    return os.path.getsize(raw_path) < float(os.getenv("SMALL_EXTRACT_MB", DEFAULT_SMALL_EXTRACT_MB)) * 1024 * 1024
+
+
+def _inferred(values):
+    """values as pandas stores them in one column: ints next to floats and no text make a float64 column."""
+    if any(isinstance(value, float) for value in values) and not any(isinstance(value, str) for value in values):
+        return [float(value) for value in values]
+    return values
+
+
+def clean_rows(rows):
+    """
+    clean_spreadsheet's columns for read_fields' rows, as lists. None if
+    the rows need pandas' handling.
+    """
+    report = plan()
+    # fields joined into one column, pandas only joins them the same way when they're all text
+    joined = [field for sources in report.sources if len(sources) > 1 for field in sources]
+    if not rows or any(row_problem(row) or not all(isinstance(row[field], str) for field in joined) for row in rows):
+        return None
+
+    columns = []
+    for sources, column_type in zip(report.sources, report.writers):
+        if len(sources) > 1:
+            # merge descriptions
+            values = [" ".join(row[field] for field in sources) for row in rows]
+        else:
+            values = _inferred([row[sources[0]] for row in rows])
+        if column_type == "text":
+            values = [str(value) for value in values]
+        columns.append(values)
+    return apply_schema_lists(columns)
+
+
+def build_small(raw_path, name=None, logos=read_file.LOGOS, ingest=False):
+    """
+    Builds the datasheet for raw_path without pandas, adding it to the
+    history with ingest. Returns False, having done nothing, if it needs
+    pandas.
+    """
+    name = name or os.getenv("NAME")
+    with stage("parse") as record:
+        rows = read_file.read_fields(raw_path)
+        record["rows"] = len(rows)
+    with stage("clean", rows=len(rows)):
+        columns = clean_rows(rows)
+    if columns is None:
+        return False
+    # every line passed, so an older quarantine file for this extract and date is out of date
+    write_quarantine(raw_path, [])
+
+    if ingest:
+        from history import ingest_columns
+        with stage("history", rows=len(rows)):
+            ingest_columns(columns, name, read_file.cal, raw_path)
+    read_file.write_equations(columns, name, logos)
+    return True
@@ -0,0 +1,139 @@
+"""
+Streaming mode for very large extracts.
+
+Lines are read, parsed, cleaned and written to the worksheet in fixed-size
+chunks through xlsxwriter's constant_memory mode, so memory stays flat no
+matter how big the report is. Every cell is written the same way
+write_equations and pandas' to_excel write it, so the workbook matches the
+regular one cell for cell. Each chunk is checked by validate, the bad
+lines of the whole file are quarantined at the end.
+"""
+import pandas as pd
+import xlsxwriter
+
+import read_file
+from columnar_parse import parse_lines, read_line_chunks
+from profiler import stage
+from report_spec import plan
+from styles import get_format
+from validate import split_invalid, write_quarantine
+
+# lines parsed, cleaned and written per chunk
+STREAM_CHUNK_LINES = 5000
+
+
+class RowOrderedSheet:
+    """
+    Wraps a worksheet and holds back cell writes until flush(), then replays
+    them sorted by row. constant_memory mode drops any write to a row above
+    the one it is on, and the header helpers don't write in row order.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.cells = []
+
+    def write(self, row, col, *args):
+        self.cells.append((row, col, "write", args))
+
+    def write_string(self, row, col, *args):
+        self.cells.append((row, col, "write_string", args))
+
+    def write_formula(self, row, col, *args):
+        self.cells.append((row, col, "write_formula", args))
+
+    def __getattr__(self, name):
+        # set_column, insert_image, ... don't care about row order
+        return getattr(self.worksheet, name)
+
+    def flush(self):
+        for row, col, method, args in sorted(self.cells, key=lambda cell: cell[0]):
+            getattr(self.worksheet, method)(row, col, *args)
+        self.cells = []
+
+
+def _excel_value(value):
+    """Converts a value the way pandas does before handing it to xlsxwriter."""
+    if pd.isna(value):
+        return ""
+    if isinstance(value, float) and abs(value) == float("inf"):
+        return "inf" if value > 0 else "-inf"
+    return value
+
+
+def write_chunk(worksheet, df, first_row, text_format):
+    """Writes a cleaned chunk starting at sheet row first_row. Returns the next free row."""
+    report = plan()
+    # (sheet column, written as text) of every data column
+    columns = [(col, column_type == "text") for col, column_type in zip(report.data_columns, report.writers)]
+    for offset, values in enumerate(df.itertuples(index=False)):
+        row = first_row + offset
+        for (col, text), value in zip(columns, values):
+            if text:
+                # text columns (MFG. P/N) are always written as text
+                worksheet.write_string(row, col, str(value), text_format)
+            else:
+                # no format so the cell picks up the column format, like pandas leaves it
+                worksheet.write(row, col, _excel_value(value))
+
+        for index, _, formula_template in report.formulas:
+            worksheet.write_formula(row, index, formula_template.format(row_num=row + 1))
+
+    return first_row + len(df)
+
+
+def open_sheet(output_path, sheet_name, logos=read_file.LOGOS):
+    """
+    Starts a constant_memory workbook with everything above the data
+    written. Returns the workbook, its worksheet and the text format
+    write_chunk needs.
+    """
+    workbook = xlsxwriter.Workbook(output_path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet(sheet_name)
+
+    text_format = get_format(workbook, 'text')
+
+    # everything above the data has to reach the sheet first
+    header = RowOrderedSheet(worksheet)
+    with stage("layout"):
+        read_file.set_headers(workbook, header)
+        read_file.define_formats(workbook, header)
+        read_file.add_extra_info(workbook, header)
+    with stage("images"):
+        read_file.add_images(header, logos)
+    header.flush()
+    return workbook, worksheet, text_format
+
+
+def clean_chunk(lines):
+    """
+    Parses, checks and cleans one chunk of lines. Returns the cleaned
+    DataFrame and split_invalid's reasons, indexed by line in the chunk.
+    """
+    with stage("parse", rows=len(lines)):
+        # every field the spec reads, short lines leave theirs empty
+        df = parse_lines(lines, keep=plan().fields)
+    with stage("validate", rows=len(df)):
+        df, reasons = split_invalid(df)
+    with stage("clean", rows=len(df)):
+        return read_file.clean_spreadsheet(df), reasons
+
+
+def write_streaming(raw_path, output_path, sheet_name, chunk_lines=STREAM_CHUNK_LINES, logos=read_file.LOGOS):
+    workbook, worksheet, text_format = open_sheet(output_path, sheet_name, logos)
+
+    row = read_file.START_ROW + 1
+    # lines parsed so far, and the reasons for the ones quarantined
+    parsed = 0
+    quarantined = []
+    for lines in read_line_chunks(raw_path, chunk_lines):
+        df, reasons = clean_chunk(lines)
+        quarantined.append(reasons.set_axis(reasons.index + parsed))
+        parsed += len(lines)
+        with stage("write", rows=len(df)):
+            row = write_chunk(worksheet, df, row, text_format)
+        print(f"Wrote {row - read_file.START_ROW - 1} rows")
+
+    with stage("save", rows=row - read_file.START_ROW - 1):
+        workbook.close()
+    write_quarantine(raw_path, pd.concat(quarantined) if quarantined else pd.Series(dtype=object))
@@ -0,0 +1,81 @@
+"""
+Every cell style the datasheet uses, defined once and looked up by name.
+
+get_format creates the xlsxwriter Format for a style the first time a
+workbook asks for it, and styles with the same properties share one Format,
+so a workbook only holds the formats it actually uses. The width, data
+style and header colour of every sheet column come from the report spec
+(report_spec.py).
+"""
+import itertools
+import weakref
+
+DASH = '#,##0;-#,##0;" - "'
+CURRENCY = '$#,##0.00'
+
+HEADER = {
+    'bold': True,
+    'align': 'center',
+    'valign': 'vcenter',
+    'underline': 1,
+    'border': 2,
+    'border_color': 'black'
+}
+
+STYLES = {
+    # data columns
+    'centered': {'align': 'center', 'valign': 'vcenter'},
+    'text': {'align': 'left', 'valign': 'vcenter', 'num_format': '@'},
+    'red_text': {'font_color': 'red', 'align': 'center', 'valign': 'center'},
+    'currency': {'num_format': CURRENCY + '_-'},
+    'currency_red': {'num_format': CURRENCY, 'font_color': 'red'},
+    'currency_blue': {'num_format': CURRENCY, 'font_color': 'blue'},
+    'dash': {'num_format': DASH, 'align': 'center', 'valign': 'center'},
+    'dash_red': {'num_format': DASH, 'font_color': 'red', 'align': 'center', 'valign': 'center'},
+    'dash_blue': {'num_format': DASH, 'font_color': 'blue', 'align': 'center', 'valign': 'center'},
+
+    # two row headers, no border between the rows
+    'header_top': {**HEADER, 'bottom': 0},
+    'header_bottom': {**HEADER, 'top': 0},
+    'header_top_red': {**HEADER, 'font_color': 'red', 'bottom': 0},
+    'header_bottom_red': {**HEADER, 'font_color': 'red', 'top': 0},
+    'header_top_blue': {**HEADER, 'font_color': 'blue', 'bottom': 0},
+    'header_bottom_blue': {**HEADER, 'font_color': 'blue', 'top': 0},
+
+    # one row headers, the consolidated workbook's rollup sheet
+    'header': HEADER,
+
+    # report info above the headers
+    'underline': {'align': 'center', 'valign': 'center', 'underline': 1},
+    'right_align': {'align': 'right', 'valign': 'right', 'font_color': 'black'},
+    'italics_blue': {'align': 'center', 'valign': 'center', 'italic': True, 'bold': True, 'font_color': 'blue'},
+    'italics_green': {'align': 'center', 'valign': 'center', 'italic': True, 'bold': True, 'font_color': '#32CD32'},
+    'italics_red': {'align': 'center', 'valign': 'center', 'italic': True, 'bold': True, 'font_color': 'red'},
+    'italics_blue_currency': {'align': 'center', 'valign': 'center', 'font_color': 'blue', 'num_format': CURRENCY + '_-'},
+}
+
+# formats already created, per workbook
+_workbook_formats = weakref.WeakKeyDictionary()
+
+
+def get_format(workbook, name):
+    """Returns the Format for style name in workbook, creating it the first time."""
+    formats = _workbook_formats.setdefault(workbook, {})
+    # order matters, 'bottom' has to come after 'border'
+    key = tuple(STYLES[name].items())
+    if key not in formats:
+        formats[key] = workbook.add_format(STYLES[name])
+    return formats[key]
+
+
+def header_style(color, row):
+    """Style name for header row "top" or "bottom" of a column with header colour color ("" for black)."""
+    return f"header_{row}_{color}" if color else f"header_{row}"
+
+
+def set_columns(workbook, worksheet, layout):
+    """Applies layout, (width, style, header colour) per column from A, runs of identical columns are set together."""
+    runs = itertools.groupby(enumerate(layout), key=lambda column: column[1][:2])
+    for (width, style), columns in runs:
+        columns = [col for col, _ in columns]
+        worksheet.set_column(columns[0], columns[-1], width, get_format(workbook, style))
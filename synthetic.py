@@ -0,0 +1,66 @@
+"""
+Synthetic raw extracts in the fixed-width layout parse_line_by_format reads.
+
+Lines carry everything the parsers have to deal with: accounting-style
+negatives ('12-'), the stray 'N' flag among the leading numbers, '*', '%'
+and backtick noise, and the second description at column DESC_2_START
+followed by the trailing numbers. The same seed always gives the same file.
+
+    python3 synthetic.py ROWS [PATH]
+
+ROWS can be written as 1000, 10k or 1m. PATH defaults to synthetic-ROWS.TXT.
+"""
+import random
+import sys
+
+from read_file import ID_LENGTH, LEN_DESC_1, LEN_DESC_2, DESC_2_START
+
+
+def number(rng, decimals=False):
+    value = f"{rng.uniform(0, 5000):.2f}" if decimals else str(rng.randint(0, 900))
+    # accounting-style negatives are written with a trailing minus
+    return value + "-" if rng.random() < 0.1 else value
+
+
+def synthetic_line(rng):
+    sku = f"{rng.randint(0, 999999):0{ID_LENGTH}d}"
+    desc_1 = f"WIDGET {rng.randint(0, 99999)} BLACK*".ljust(LEN_DESC_1)[:LEN_DESC_1]
+    start = f"{sku}{' ' * 8}{desc_1}{'AB12'} {'C3D4E5'}"
+
+    head = [number(rng), number(rng, True), number(rng), number(rng), number(rng), number(rng), rng.choice(["A", "B", "CO"]), number(rng), number(rng)]
+    if rng.random() < 0.2:
+        head.insert(rng.randint(0, len(head)), "N")
+    start = f"{start} {' '.join(head)}".ljust(DESC_2_START)[:DESC_2_START]
+
+    desc_2 = f"CASE FOR MODEL {rng.randint(0, 999)}".ljust(LEN_DESC_2)
+    tail = [number(rng), f"MFG-{rng.randint(0, 99999)}"] + [number(rng) for _ in range(21)]
+    tail[5] += rng.choice(["", "*", "%", "`"])
+    return f"  {start}{desc_2}{' '.join(tail)}\n"
+
+
+def write_synthetic_file(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w") as file:
+        for _ in range(rows):
+            file.write(synthetic_line(rng))
+
+
+def parse_rows(text):
+    """Row count from text like 1000, 10k or 1m."""
+    text = text.lower().replace("_", "").replace(",", "")
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(text.rstrip("km")) * multiplier
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 synthetic.py ROWS [PATH]")
+        sys.exit(1)
+    rows = parse_rows(sys.argv[1])
+    path = sys.argv[2] if len(sys.argv) > 2 else f"synthetic-{rows}.TXT"
+    write_synthetic_file(path, rows)
+    print(f"Wrote {rows:,} rows to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the top of the repo, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import read_file  # noqa: E402
+
+# a week the default fiscal calendar covers
+REPORT_DATE = "10/12/2025"
+
+
+@pytest.fixture(autouse=True)
+def report_date():
+    read_file.cal.set_report_date(REPORT_DATE)
+    yield
+    read_file.cal.reset_report_date()
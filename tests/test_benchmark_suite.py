@@ -0,0 +1,28 @@
+from benchmarks.suite import TOLERANCE, compare
+from synthetic import parse_rows, write_synthetic_file
+
+
+def test_slower_stages_are_flagged():
+    baseline = {"100000": {"parse": 100000.0, "write": 10000.0}}
+    slower = 1 - TOLERANCE - 0.05
+    assert compare({"100000": {"parse": 100000.0 * slower, "write": 10000.0}}, baseline) == 1
+    assert compare({"100000": {"parse": 100000.0 * (1 - TOLERANCE / 2), "write": 20000.0}}, baseline) == 0
+
+
+def test_stages_too_quick_to_measure_and_new_ones_pass():
+    # 1,000 rows at 100,000 rows/s takes 10ms, under MIN_SECONDS
+    assert compare({"1000": {"parse": 100000.0}}, {"1000": {"parse": 1000000.0}}) == 0
+    assert compare({"1000": {"parse": 1.0}}, {}) == 0
+
+
+def test_synthetic_extracts_repeat_for_a_seed(tmp_path):
+    paths = [tmp_path / name for name in ("a.TXT", "b.TXT", "c.TXT")]
+    write_synthetic_file(paths[0], 200)
+    write_synthetic_file(paths[1], 200)
+    write_synthetic_file(paths[2], 200, seed=1)
+    assert paths[0].read_text() == paths[1].read_text() != paths[2].read_text()
+    assert len(paths[0].read_text().splitlines()) == 200
+
+
+def test_row_counts():
+    assert [parse_rows(text) for text in ["1000", "10k", "1M", "2_500"]] == [1000, 10000, 1000000, 2500]
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from my_calendar import My_Calendar
+
+# fiscal 2026 as a 53-week year, its December runs six weeks
+WEEKS = [4, 4, 5, 4, 4, 5, 4, 4, 5, 4, 4, 6]
+LABELS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def year_53(end=True):
+    start = datetime(2025, 12, 28)
+    periods = []
+    for weeks, label in zip(WEEKS, LABELS):
+        periods.append([start.strftime("%Y-%m-%d"), label])
+        start += timedelta(weeks=weeks)
+    if end:
+        periods.append([start.strftime("%Y-%m-%d"), "End"])
+    calendar = My_Calendar()
+    calendar.set_calendar(json.dumps({"2026": periods}))
+    return calendar
+
+
+def test_53_week_year_ends_on_its_end():
+    calendar = year_53()
+    assert [start for start, label in calendar.FISCAL_PERIODS if label == "End"] == []
+    # the 53rd week is still December
+    assert list(calendar.periods_for(["2026-12-27", "2027-01-02", "2027-01-03"])) == [11, 11, -1]
+
+    calendar.set_report_date("12/27/2026")
+    assert calendar.get_weeks_in_month() == 6
+    assert calendar.get_next_fiscal_month() == "1/3/2027"
+    calendar.set_report_date("1/3/2027")
+    with pytest.raises(ValueError):
+        calendar.get_this_fiscal_month()
+
+
+def test_last_year_without_an_end_has_52_weeks():
+    calendar = year_53(end=False)
+    assert list(calendar.periods_for(["2026-12-26", "2026-12-27"])) == [11, -1]
+    calendar.set_report_date("12/20/2026")
+    assert calendar.get_weeks_in_month() == 5
+
+
+def test_end_has_to_follow_the_last_month():
+    calendar = My_Calendar()
+    with pytest.raises(ValueError):
+        calendar.set_calendar(json.dumps([["2025-01-26", "Jan"], ["2025-01-25", "End"]]))
@@ -0,0 +1,60 @@
+"""
+The columnar engine has to give exactly what the line-by-line parser
+(read_file.read_rows) gives, on synthetic extracts and on the lines it
+hands back to parse_line_by_format.
+"""
+import random
+
+import pandas as pd
+import pytest
+
+import columnar_parse
+from columnar_parse import parse_file, parse_file_parallel, parse_lines
+from read_file import DESC_2_START, read_rows
+from report_spec import plan
+from synthetic import synthetic_line, write_synthetic_file
+
+ROWS = 3000
+
+
+@pytest.fixture(scope="module", params=[0, 1, 2])
+def extract(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp("extract") / f"synthetic-{request.param}.TXT"
+    write_synthetic_file(path, ROWS, seed=request.param)
+    return str(path)
+
+
+def test_matches_line_parser(extract):
+    pd.testing.assert_frame_equal(read_rows(extract), parse_file(extract, workers=1))
+
+
+def test_small_blocks_join_like_one(extract, monkeypatch):
+    monkeypatch.setattr(columnar_parse, "CHUNK_LINES", 700)
+    pd.testing.assert_frame_equal(read_rows(extract), parse_file(extract, workers=1))
+
+
+def test_parallel_matches_line_parser(extract, monkeypatch):
+    # small ranges so a few thousand lines still split across the workers
+    monkeypatch.setattr(columnar_parse, "MIN_RANGE_BYTES", 64 * 1024)
+    pd.testing.assert_frame_equal(read_rows(extract), parse_file_parallel(extract, workers=2))
+
+
+def test_kept_fields_match_line_parser(extract):
+    fields = plan().fields
+    pd.testing.assert_frame_equal(read_rows(extract)[fields], parse_file(extract, workers=1, keep=fields))
+
+
+def test_odd_lines_match_line_parser(tmp_path):
+    rng = random.Random(7)
+    lines = [synthetic_line(rng) for _ in range(20)]
+    # lines the bulk path hands to parse_line_by_format
+    lines[3] = lines[3][:DESC_2_START + 20] + "\n"
+    lines[7] = lines[7].replace("WIDGET", "WIDGÉT")
+    lines[11] = lines[11].rstrip() + " XYZ\n"
+    lines[15] = lines[15].rstrip().rsplit(" ", 3)[0] + "\n"
+    path = tmp_path / "odd.TXT"
+    path.write_text("".join(lines))
+
+    expected = read_rows(str(path))
+    pd.testing.assert_frame_equal(expected, parse_file(str(path), workers=1))
+    pd.testing.assert_frame_equal(expected, parse_lines([line.lstrip() for line in "".join(lines).splitlines()]))
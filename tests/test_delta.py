@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import delta
+import read_file
+from report_spec import plan
+from schema import apply_schema
+
+FILLERS = {"str": "TEXT", "category": "A", "int32": 0, "float64": 1.5}
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output"))
+    return tmp_path
+
+
+def extract(units):
+    """A cleaned extract laid out by the report spec, one SKU per entry of units."""
+    report = plan()
+    names = report.data_names(read_file.cal.get_relative_months())
+    df = {name: [FILLERS[dtype]] * len(units) for name, dtype in zip(names, report.dtypes)}
+    df[names[report.position("sku")]] = [f"{sku:06d}" for sku in range(len(units))]
+    df[names[report.position("units_avail")]] = units
+    return apply_schema(pd.DataFrame(df, columns=pd.Index(names, dtype=object)))
+
+
+def run_week(date, units):
+    read_file.cal.set_report_date(date)
+    return delta.write_delta(extract(units), name="TEST", format="csv")
+
+
+def test_first_run_counts_everything_as_added(folders):
+    changes = run_week("10/05/2025", [1, 2, 3])
+    assert list(changes[delta.CHANGE]) == ["Added"] * 3
+
+
+def test_rerunning_a_week_compares_with_the_week_before(folders):
+    run_week("10/05/2025", [1, 2, 3])
+    first = run_week("10/12/2025", [1, 5, 3, 4])
+    again = run_week("10/12/2025", [1, 5, 3, 4])
+
+    assert list(first[delta.CHANGE]) == ["Changed", "Added"]
+    pd.testing.assert_frame_equal(first, again)
+    written = pd.read_csv(delta.delta_filename("TEST", "csv"), dtype={delta.sku_column(): str})
+    assert list(written[delta.CHANGE]) == ["Changed", "Added"]
+
+
+def test_older_week_ignores_later_snapshots(folders):
+    run_week("10/05/2025", [1, 2])
+    run_week("10/19/2025", [9, 9])
+    changes = run_week("10/12/2025", [1, 3])
+    assert list(changes[delta.CHANGE]) == ["Changed"]
+    assert delta.previous_snapshot("TEST", datetime(2025, 10, 12)).endswith("2025-10-05.parquet")
+    assert delta.previous_snapshot("TEST", datetime(2025, 10, 5)) is None
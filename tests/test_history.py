@@ -0,0 +1,47 @@
+import random
+
+import history
+import read_file
+from batch import run_job
+from small_extract import build_small
+from synthetic import synthetic_line
+
+
+def store_months(conn, units):
+    """Adds units sold by SKU 123456 to the history, {relative month: units} for the current report date."""
+    periods = read_file.cal.get_relative_periods(max(-relative for relative in units))
+    conn.executemany("INSERT INTO monthly_units VALUES ('TEST', '123456', ?, ?, ?, '2025-01-01')",
+                     [(periods[relative][0].strftime("%Y-%m-%d"), periods[relative][1], count)
+                      for relative, count in units.items()])
+
+
+def test_months_up_to_the_report_date(tmp_path):
+    conn = history.connect(str(tmp_path / "history.db"))
+    store_months(conn, {0: 10, -1: 11, -3: 13})
+    read_file.cal.set_report_date("12/07/2025")
+    store_months(conn, {0: 99})
+    read_file.cal.set_report_date("10/12/2025")
+
+    months = history.units_history("123456", 4, name="TEST", conn=conn)
+    expected = read_file.cal.get_relative_periods(3)
+    assert [(period, label) for period, label, _ in months] == \
+        [(expected[-i][0].strftime("%Y-%m-%d"), expected[-i][1]) for i in range(4)]
+    # a later report stays out and the month nothing was stored for is blank
+    assert [units for _, _, units in months] == [10, 11, None, 13]
+
+
+def test_only_ingested_runs_add_to_the_history(tmp_path, monkeypatch):
+    monkeypatch.setenv("HISTORY_DB", str(tmp_path / "history.db"))
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output"))
+    raw = tmp_path / "EXTRACT.TXT"
+    rng = random.Random(6)
+    raw.write_text("".join(synthetic_line(rng) for _ in range(5)))
+
+    assert build_small(str(raw), "TEST", logos={})
+    assert run_job({"raw_file": str(raw), "name": "TEST", "logos": {}})["ok"]
+    assert not (tmp_path / "history.db").exists()
+
+    assert run_job({"raw_file": str(raw), "name": "TEST", "logos": {}}, ingest=True)["ok"]
+    conn = history.connect()
+    assert conn.execute("SELECT rows FROM reports").fetchall() == [(5,)]
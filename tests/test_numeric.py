@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from numeric import convert_column, convert_token, python_values
+from synthetic import synthetic_line
+
+EDGE_TOKENS = ["-5-", "+3", "12-", "1.", ".5", "1.2.3", "007", "0.50-", "1234567890123456789", "3.14159265358979323",
+               "99999999999999999999-", "123456789012345.5", "1234567890.12345-", "N", "MFG-1", "", "CO", "?", "1?",
+               "٣", "12é", "-", "+", "."]
+
+
+def typed(values):
+    return [(type(value), value) for value in values]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_column_matches_token_by_token(seed):
+    rng = random.Random(seed)
+    tokens = [token for _ in range(300) for token in synthetic_line(rng).split()]
+    tokens += EDGE_TOKENS
+    rng.shuffle(tokens)
+    assert typed(python_values(*convert_column(tokens))) == typed(convert_token(token) for token in tokens)
+
+
+def test_edge_tokens_alone():
+    assert typed(python_values(*convert_column(EDGE_TOKENS))) == typed(convert_token(token) for token in EDGE_TOKENS)
@@ -0,0 +1,68 @@
+import random
+
+import openpyxl
+import pytest
+
+import read_file
+from parse_cache import cached_clean_spreadsheet
+from schema import apply_schema_lists
+from small_extract import build_small
+from streaming import write_streaming
+from synthetic import synthetic_line
+
+
+def flag_cost(line, cost):
+    """line with an 'N' flag before its Unit Cost, which is then cost, kept as text by the parser."""
+    start, rest = line.split("C3D4E5 ", 1)
+    first, _, after = rest.split(" ", 2)
+    flagged = f"{start}C3D4E5 {first} N {cost} {after}"
+    # the fields before the second description are fixed width
+    desc_2 = flagged.index("CASE FOR MODEL")
+    extra = len(flagged) - len(line)
+    assert flagged[desc_2 - extra:desc_2].isspace()
+    return flagged[:desc_2 - extra] + flagged[desc_2:]
+
+
+@pytest.fixture
+def mixed(tmp_path, monkeypatch):
+    """A raw file mixing Unit Costs read as numbers, as digit text and as other text."""
+    monkeypatch.setenv("QUARANTINE_DIR", str(tmp_path / "quarantine"))
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output"))
+    rng = random.Random(5)
+    lines = []
+    while len(lines) < 40:
+        line = synthetic_line(rng)
+        if " N " not in line:
+            lines.append(line)
+    lines[4] = flag_cost(lines[4], "154.31")
+    lines[10] = flag_cost(lines[10], "4000.53")
+    lines[30] = flag_cost(lines[30], "1634.76-")
+    path = tmp_path / "EXTRACT.TXT"
+    path.write_text("".join(lines))
+    return str(path)
+
+
+def data_rows(path):
+    sheet = openpyxl.load_workbook(path).active
+    return [[cell.value for cell in row] for row in sheet.iter_rows(min_row=read_file.START_ROW + 2)]
+
+
+def test_digit_text_stays_text(mixed):
+    df = cached_clean_spreadsheet(mixed, workers=1)
+    assert df["Unit Cost"].tolist()[4] == "154.31"
+    assert df["Unit Cost"].tolist()[30] == "1634.76-"
+    assert apply_schema_lists([df[column].tolist() for column in df.columns]) == \
+        [df[column].tolist() for column in df.columns]
+
+
+def test_stream_matches_whole_file(mixed, tmp_path):
+    read_file.write_equations(cached_clean_spreadsheet(mixed, workers=1), "WHOLE", logos={})
+    streamed = str(tmp_path / "streamed.xlsx")
+    write_streaming(mixed, streamed, "WHOLE", chunk_lines=3, logos={})
+    whole = data_rows(read_file.output_filename("WHOLE"))
+    assert len(whole) == 40
+    assert data_rows(streamed) == whole
+
+    assert build_small(mixed, "SMALL", logos={})
+    assert data_rows(read_file.output_filename("SMALL")) == whole
@@ -0,0 +1,96 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+import read_file
+from columnar_parse import parse_file
+from parse_cache import cached_clean_spreadsheet
+from report_spec import plan
+from small_extract import build_small
+from streaming import write_streaming
+from synthetic import synthetic_line
+from validate import BAD_SKU, invalid_rows, quarantine_path, row_problem
+
+
+def sku_line(rng, sku):
+    line = synthetic_line(rng)
+    start = len(line) - len(line.lstrip())
+    return line[:start] + sku.ljust(read_file.ID_LENGTH) + line[start + read_file.ID_LENGTH:]
+
+
+@pytest.fixture
+def extract(tmp_path, monkeypatch):
+    """A raw file with a short SKU (fine), a blank one and a long one running into its delimiter."""
+    monkeypatch.setenv("QUARANTINE_DIR", str(tmp_path / "quarantine"))
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "output"))
+    monkeypatch.setenv("HISTORY_DB", str(tmp_path / "history.db"))
+    rng = random.Random(3)
+    lines = [synthetic_line(rng) for _ in range(10)]
+    lines[2] = sku_line(rng, "12345")
+    lines[5] = sku_line(rng, "")
+    lines[8] = "1" + lines[8].lstrip()
+    path = tmp_path / "EXTRACT.TXT"
+    path.write_text("".join(lines))
+    return str(path)
+
+
+def test_short_skus_are_kept(extract):
+    problems = [row_problem(row) for row in read_file.read_fields(extract)]
+    # a blank SKU shifts the line, it's quarantined either way
+    assert [line for line, problem in enumerate(problems) if problem] == [5, 8]
+    assert problems[8] == BAD_SKU
+    reasons = invalid_rows(parse_file(extract, workers=1))
+    assert dict(reasons.items()) == {5: problems[5], 8: BAD_SKU}
+
+
+def test_cached_rerun_writes_the_quarantine_file(extract):
+    first = cached_clean_spreadsheet(extract, workers=1)
+    path = quarantine_path(extract)
+    with open(path) as file:
+        written = file.read()
+    os.remove(path)
+
+    again = cached_clean_spreadsheet(extract, workers=1)
+    pd.testing.assert_frame_equal(first, again)
+    assert len(again) == 8
+    with open(path) as file:
+        assert file.read() == written
+
+
+def test_clean_rerun_removes_the_quarantine_file(extract, tmp_path):
+    cached_clean_spreadsheet(extract, workers=1)
+    assert os.path.exists(quarantine_path(extract))
+
+    rng = random.Random(4)
+    with open(extract, "w") as file:
+        file.writelines(synthetic_line(rng) for _ in range(10))
+    assert build_small(extract, "TEST", logos={})
+    assert not os.path.exists(quarantine_path(extract))
+
+
+@pytest.fixture
+def all_invalid(extract, tmp_path):
+    path = tmp_path / "GARBAGE.TXT"
+    path.write_text("garbage line\n" + "1" + open(extract).readline().lstrip())
+    return str(path)
+
+
+def test_all_invalid_extract_is_quarantined(all_invalid, capsys):
+    for _ in range(2):
+        # parsed, then loaded from the cache
+        df = cached_clean_spreadsheet(all_invalid, workers=1)
+        assert df.empty and list(df.columns) == plan().data_names(read_file.cal.get_relative_months())
+        assert "0 rows" in capsys.readouterr().out
+        with open(quarantine_path(all_invalid)) as file:
+            assert len(file.readlines()) == 3
+
+
+def test_all_invalid_extract_streams(all_invalid, tmp_path):
+    output = str(tmp_path / "streamed.xlsx")
+    write_streaming(all_invalid, output, "TEST", chunk_lines=1, logos={})
+    assert os.path.exists(output)
+    with open(quarantine_path(all_invalid)) as file:
+        assert len(file.readlines()) == 3
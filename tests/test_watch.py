@@ -0,0 +1,32 @@
+import queue
+import threading
+
+import watch
+
+
+def test_worker_outlives_a_failing_file(tmp_path, monkeypatch):
+    raw = [tmp_path / f"{name}.TXT" for name in ("BROKEN", "GOOD")]
+    for path in raw:
+        path.write_text("")
+    built = []
+
+    def build(path, watch_dir, use_cache, metrics, ingest):
+        if "BROKEN" in path:
+            raise OSError("disk full")
+        built.append(path)
+
+    monkeypatch.setattr(watch, "build", build)
+    monkeypatch.setattr(watch, "STOP_CHECK_SECONDS", 0.05)
+    jobs = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    thread = threading.Thread(target=watch.worker, args=(jobs, stop, str(tmp_path), True, "formulas", False))
+    thread.start()
+    for path in raw:
+        jobs.put_nowait(str(path))
+    jobs.join()
+    stop.set()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert built == [str(raw[1])]
+    assert (tmp_path / "failed" / "BROKEN.TXT").exists()
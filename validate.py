@@ -0,0 +1,135 @@
+"""
+Checks the parsed lines before they are cleaned and moves the ones that
+would come out wrong on the datasheet to a quarantine file.
+
+A line is quarantined when it
+
+    is missing fields     too short for the last field the report spec reads
+    has a bad SKU         empty or longer than ID_LENGTH characters, a longer
+                          SKU runs into the delimiter after it and
+                          parse_line_by_format keeps it, shorter ones are
+                          padded in the extract and fine
+    has text for a number text that isn't a number in a field the spec
+                          reads into an int32 or float64 column
+
+Numbers the parser leaves as text (the token after the 'N' flag, "12" or
+"4.50-") are fine. The checks run on whole columns of the parsed
+DataFrame, only the odd text cell is looked at on its own, so a clean
+extract costs a few column scans.
+
+Quarantined lines are left out of the datasheet, the history and the parse
+cache, and the run carries on. They are written to a tab separated file in
+QUARANTINE_DIR (default "quarantine") named after the raw file and report
+date, with the line number in the raw file, the reason and the line as it
+is. A run without bad lines removes an older file for the same extract and
+date. parse_cache keeps the reasons with a cached extract, so a cached
+rerun writes the same file.
+"""
+import csv
+import os
+
+import read_file
+from read_file import ID_LENGTH, NUMBER
+from report_spec import plan
+
+DEFAULT_QUARANTINE_DIR = "quarantine"
+
+MISSING_FIELDS = "missing fields"
+BAD_SKU = f"SKU is empty or longer than {ID_LENGTH} characters"
+TEXT_FOR_NUMBER = "text where a number belongs"
+
+
+def row_problem(row):
+    """Why one parsed line (read_fields' list) fails a check, None if it passes."""
+    report = plan()
+    if len(row) < report.required_fields:
+        return MISSING_FIELDS
+    if not 0 < len(row[report.sku_field]) <= ID_LENGTH:
+        return BAD_SKU
+    if any(isinstance(row[field], str) and not NUMBER.fullmatch(row[field]) for field in report.number_fields):
+        return TEXT_FOR_NUMBER
+    return None
+
+
+def _text_for_number(values):
+    """Mask of the cells of column values holding text that isn't a number."""
+    import numpy as np
+    if values.dtype.kind in "iuf":
+        return np.zeros(len(values), dtype=bool)
+    cells = values.to_numpy(dtype=object)
+    mask = np.fromiter((isinstance(cell, str) for cell in cells), dtype=bool, count=len(cells))
+    # only the text cells need a closer look
+    for i in np.flatnonzero(mask):
+        mask[i] = not NUMBER.fullmatch(cells[i])
+    return mask
+
+
+def invalid_rows(df):
+    """The reason every parsed row failing a check fails it, as a Series indexed like df."""
+    import numpy as np
+    import pandas as pd
+    report = plan()
+    # the parser may only have built the fields the spec reads
+    fields = df.reindex(columns=report.fields)
+    # rows are lists, a short one is filled in from the end
+    missing = fields[report.fields[-1]].isna().to_numpy()
+    lengths = fields[report.sku_field].astype(str).str.len().to_numpy()
+    bad_sku = (lengths == 0) | (lengths > ID_LENGTH)
+    text = np.zeros(len(df), dtype=bool)
+    for field in report.number_fields:
+        text |= _text_for_number(fields[field])
+
+    failed = missing | bad_sku | text
+    # the first check a row fails is its reason
+    reasons = np.select([missing, bad_sku], [MISSING_FIELDS, BAD_SKU], TEXT_FOR_NUMBER)
+    return pd.Series(reasons[failed], index=df.index[failed], dtype=object)
+
+
+def split_invalid(df):
+    """df without the rows failing a check, renumbered, and invalid_rows' reasons for those rows."""
+    reasons = invalid_rows(df)
+    if reasons.empty:
+        return df, reasons
+    return df.drop(index=reasons.index).reset_index(drop=True), reasons
+
+
+def quarantine_path(raw_path):
+    name = os.path.splitext(os.path.basename(raw_path))[0]
+    date = read_file.cal.get_report_date_str().replace("/", "-")
+    return os.path.join(os.getenv("QUARANTINE_DIR", DEFAULT_QUARANTINE_DIR), f"{name} {date}.tsv")
+
+
+def write_quarantine(raw_path, reasons):
+    """
+    Writes the lines of raw_path in reasons, {line: reason} with lines
+    counted like the parser does (blank lines skipped, from 0), to the
+    quarantine file. Returns its path, None when there was nothing to write.
+    """
+    path = quarantine_path(raw_path)
+    if not len(reasons):
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    reasons = dict(reasons.items())
+    found = []
+    # the bad lines are looked up again rather than kept through the parse
+    with open(raw_path, "r") as file:
+        index = -1
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            index += 1
+            if index in reasons:
+                found.append((number, reasons[index], line.rstrip("\n")))
+                if len(found) == len(reasons):
+                    break
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file, dialect="excel-tab")
+        writer.writerow(["line", "reason", "text"])
+        writer.writerows(found)
+    print(f"Quarantined {len(found)} lines of {os.path.basename(raw_path)} to {path}")
+    return path
+
@@ -0,0 +1,158 @@
+"""
+Watch mode: stays running and builds the datasheet for every raw extract
+dropped into a folder.
+
+    python3 read_file.py --watch
+
+pandas, numpy, pyarrow, xlsxwriter, the parse and write modules and the
+fiscal calendar are loaded once when it starts, not by the first file. The drop folder (WATCH_DIR in the .env,
+default "drop") is checked every few seconds, and a TXT file is picked up
+once its size has stopped changing so half-copied files are left alone.
+Files wait in a bounded queue for the worker, which builds the datasheet
+into OUTPUT_DIR (default "output") for the most recent Sunday and then
+moves the raw file into the drop folder's done or failed folder.
+
+A file named like RAW_FILE is built under NAME, any other file under its
+own name without the extension. Stop it with Ctrl+C, the file being built
+is finished first and the queued ones stay in the drop folder for the next
+start. A file that fails in a way the build doesn't catch is reported and
+the worker carries on with the next one.
+"""
+import os
+import queue
+import threading
+import time
+import traceback
+
+import read_file
+from batch import run_job
+
+DEFAULT_WATCH_DIR = "drop"
+DEFAULT_OUTPUT_DIR = "output"
+
+# seconds between looks at the drop folder
+POLL_SECONDS = 5
+# files waiting to be built, the folder isn't read further while it's full
+QUEUE_SIZE = 8
+# seconds the worker waits for a file before checking whether to stop
+STOP_CHECK_SECONDS = 1
+
+
+def job_for(path):
+    """The batch job that builds the datasheet for raw file path."""
+    filename = os.path.basename(path)
+    if filename == os.path.basename(os.getenv("RAW_FILE", "")):
+        name = os.getenv("NAME")
+    else:
+        name = os.path.splitext(filename)[0]
+    return {"raw_file": path, "name": name}
+
+
+def ready_files(folder, last_seen):
+    """
+    TXT files in folder that haven't changed since the last look. last_seen
+    maps each file to its (size, modified time) and is updated in place.
+    """
+    current = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(".txt"):
+                stat = entry.stat()
+                current[entry.path] = (stat.st_size, stat.st_mtime)
+
+    ready = [path for path, state in current.items() if last_seen.get(path) == state]
+    last_seen.clear()
+    last_seen.update(current)
+    return sorted(ready)
+
+
+def move_to(path, folder):
+    os.makedirs(folder, exist_ok=True)
+    os.replace(path, os.path.join(folder, os.path.basename(path)))
+
+
+def build(path, watch_dir, use_cache, metrics, ingest):
+    """Builds the datasheet for path and moves it into done or failed."""
+    # a new week may have started since the last file
+    read_file.cal.reset_report_date()
+    start = time.perf_counter()
+    result = run_job(job_for(path), use_cache, metrics, ingest=ingest)
+    elapsed = time.perf_counter() - start
+
+    if result["ok"]:
+        move_to(path, os.path.join(watch_dir, "done"))
+        print(f"Built {result['output']} ({result['rows']:,} rows, {elapsed:.1f}s)")
+    else:
+        move_to(path, os.path.join(watch_dir, "failed"))
+        print(f"Failed to build {os.path.basename(path)}:\n{result['error']}")
+
+
+def worker(jobs, stop, watch_dir, use_cache, metrics, ingest):
+    """Builds every file put on the jobs queue until stop is set."""
+    while not stop.is_set():
+        try:
+            path = jobs.get(timeout=STOP_CHECK_SECONDS)
+        except queue.Empty:
+            continue
+        try:
+            build(path, watch_dir, use_cache, metrics, ingest)
+        except Exception:
+            # the worker has to outlive any one file, or the queue fills up and the watch hangs
+            print(f"Failed to build {os.path.basename(path)}:\n{traceback.format_exc()}")
+            if os.path.exists(path):
+                try:
+                    move_to(path, os.path.join(watch_dir, "failed"))
+                except OSError as error:
+                    print(f"Couldn't move {os.path.basename(path)} to failed: {error}")
+        finally:
+            jobs.task_done()
+
+
+def load_modules():
+    """Imports what every build needs, which read_file only loads once it is used."""
+    import xlsxwriter  # noqa: F401
+
+    import column_writer  # noqa: F401
+    import columnar_parse  # noqa: F401
+    import schema  # noqa: F401
+    import validate  # noqa: F401
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        # the parse cache is skipped without it
+        pass
+
+
+def watch(use_cache=True, metrics="formulas", ingest=False, poll_seconds=POLL_SECONDS):
+    read_file.load_environment()
+    load_modules()
+    watch_dir = os.getenv("WATCH_DIR", DEFAULT_WATCH_DIR)
+    os.environ.setdefault("OUTPUT_DIR", DEFAULT_OUTPUT_DIR)
+    os.makedirs(watch_dir, exist_ok=True)
+
+    jobs = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    thread = threading.Thread(target=worker, args=(jobs, stop, watch_dir, use_cache, metrics, ingest), daemon=True)
+    thread.start()
+    print(f"Watching {os.path.abspath(watch_dir)} for raw files, press Ctrl+C to stop")
+
+    last_seen = {}
+    queued = set()
+    try:
+        while True:
+            for path in ready_files(watch_dir, last_seen):
+                if path not in queued:
+                    try:
+                        jobs.put_nowait(path)
+                    except queue.Full:
+                        # still ready on the next look, once the worker has caught up
+                        break
+                    queued.add(path)
+                    print(f"Queued {os.path.basename(path)}")
+            # files that were moved away can be queued again if they come back
+            queued &= set(last_seen)
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("Stopping once the current file is built")
+        stop.set()
+        thread.join()